@@ -0,0 +1,126 @@
+import math
+import torch
+
+
+class Autocorrelation(object):
+
+    def __init__(self, maxlag=100, c=5.):
+        """Online estimate of the integrated autocorrelation time.
+
+        The lagged products x_t x_{t-k} of an observable are accumulated
+        for each walker during the sampling. The integrated time is then
+
+        .. math::
+            \\tau = 1 + 2 \\sum_{k=1}^{M} \\rho(k)
+
+        where the window M is the smallest lag verifying M >= c tau(M)
+        (Sokal's automatic windowing).
+
+        Keyword Arguments:
+            maxlag {int} -- maximum lag considered (default: {100})
+            c {float} -- window constant (default: {5.})
+        """
+        self.maxlag = maxlag
+        self.c = c
+        self.reset(1)
+
+    def reset(self, nwalkers):
+        """Discard the accumulated data
+
+        Arguments:
+            nwalkers {int} -- number of walkers
+        """
+        self.nstep = 0
+        self.shift = None
+        self.sum = torch.zeros(nwalkers)
+        self.hist = torch.zeros(self.maxlag + 1, nwalkers)
+        self.prod = torch.zeros(self.maxlag + 1, nwalkers)
+
+    def update(self, x):
+        """Add the current value of the observable
+
+        Arguments:
+            x {torch.tensor} -- value of the observable for each walker [nwalkers]
+        """
+        x = x.detach().to('cpu').view(-1).type(self.sum.dtype)
+
+        # the covariances are shift invariant
+        # shifting improves the numerical accuracy
+        if self.shift is None:
+            self.shift = x.clone()
+        x = x - self.shift
+
+        self.hist = torch.roll(self.hist, 1, 0)
+        self.hist[0] = x
+        self.prod += x * self.hist
+        self.sum += x
+        self.nstep += 1
+
+    def autocovariance(self):
+        """Autocovariance of each walker
+
+        Returns:
+            torch.tensor -- autocovariance [nlag, nwalkers]
+        """
+        nlag = min(self.maxlag + 1, self.nstep)
+        count = self.nstep - torch.arange(nlag).type(self.sum.dtype)
+        mean = self.sum / self.nstep
+        return self.prod[:nlag] / count.view(-1, 1) - mean**2
+
+    def integrated_time(self, per_walker=False):
+        """Integrated autocorrelation time
+
+        Keyword Arguments:
+            per_walker {bool} -- return the time of each walker instead
+                                 of the one of the walker averaged
+                                 autocovariance (default: {False})
+
+        Returns:
+            float or torch.tensor -- integrated autocorrelation time
+        """
+        if self.nstep < 2:
+            tau = torch.ones(self.sum.shape[0] if per_walker else 1)
+            return tau if per_walker else tau.item()
+
+        cov = self.autocovariance()
+        if not per_walker:
+            cov = cov.mean(1, keepdim=True)
+
+        # frozen walkers have no correlation to measure
+        var = cov[0].clone()
+        var[var <= 0] = float('inf')
+        rho = cov / var
+
+        # tau(M) for M = 1 .. nlag-1
+        nlag = cov.shape[0]
+        tau = 1 + 2 * torch.cumsum(rho[1:], 0)
+        lag = torch.arange(1, nlag).type(tau.dtype).view(-1, 1)
+
+        # smallest window verifying M >= c tau(M)
+        window = lag >= self.c * tau
+        idx = torch.where(window.any(0), window.type(tau.dtype).argmax(0),
+                          torch.full_like(window[0], nlag - 2,
+                                          dtype=torch.long))
+        tau = tau.gather(0, idx.view(1, -1)).view(-1).clamp(min=1.)
+
+        return tau if per_walker else tau.item()
+
+    def get_ndecor(self):
+        """Number of steps between two stored positions
+
+        Returns:
+            int -- ceil of the integrated autocorrelation time
+        """
+        return max(1, int(math.ceil(self.integrated_time())))
+
+    def effective_sample_size(self, nsample):
+        """Effective number of independent samples
+
+        Arguments:
+            nsample {int} -- number of stored samples per walker
+
+        Returns:
+            float -- effective sample size of all the walkers
+        """
+        nwalkers = self.sum.shape[0]
+        return nwalkers * min(nsample, self.nstep / self.integrated_time())
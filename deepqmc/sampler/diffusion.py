@@ -0,0 +1,396 @@
+import numpy as np
+import torch
+from tqdm import tqdm
+from deepqmc.sampler.generalized_metropolis import GeneralizedMetropolis
+
+
+class Diffusion(GeneralizedMetropolis):
+
+    def __init__(self, nwalkers=100, nstep=1000, step_size=0.01,
+                 nelec=1, ndim=3,
+                 init={'type': 'uniform', 'min': -5, 'max': 5},
+                 wf=None, capacity=2., feedback=10.,
+                 move={'type': 'all-elec'},
+                 drift_limit=1., nbuffer=100):
+        """Fixed-node diffusion Monte Carlo with importance sampling
+
+        The trial wave function guides the drift-diffusion moves of the
+        walkers (see GeneralizedMetropolis) and each walker carries the
+        branching weight
+
+        .. math::
+            w = \\exp(-\\tau_{eff} (\\frac{E_L(x) + E_L(x')}{2} - E_T))
+
+        Moves crossing the nodes of the trial wave function are rejected.
+        The population is stored in tensors of fixed capacity together
+        with a mask of the alive walkers, so that branching and killing
+        are gather operations and the cost of a step does not depend on
+        the size of the population. The trial energy E_T is adjusted to
+        keep the total weight close to nwalkers.
+
+        Args:
+            nwalkers (int, optional): target number of walkers.
+                                      Defaults to 100.
+            nstep (int, optional): Number of steps. Defaults to 1000.
+            step_size (float, optional): time step tau. Defaults to 0.01.
+            nelec (int, optional): total number of electrons. Defaults to 1.
+            ndim (int, optional): total number of dimension. Defaults to 3.
+            init (dict, optional): method to init the positions of the walkers.
+                                   See Molecule.domain
+            wf (WaveFunction): trial/guiding wave function.
+            capacity (float, optional): maximum size of the population
+                                        relative to nwalkers. Defaults to 2.
+            feedback (float, optional): number of generations over which
+                                        the population is brought back to
+                                        nwalkers. Defaults to 10.
+            move (dict, optional): method to move the electrons,
+                                   'all-elec' or 'one-elec' (a random
+                                   electron per walker and step).
+                                   Defaults to {'type': 'all-elec'}.
+            drift_limit (float, optional): parameter a of the drift limiting.
+                                           Defaults to 1.
+            nbuffer (int, optional): number of moves for which the gaussian
+                                     noise is generated at once.
+                                     Defaults to 100.
+        """
+
+        if wf is None:
+            raise ValueError('Diffusion Monte Carlo requires a wave function')
+
+        self.target_walkers = nwalkers
+        self.capacity = int(capacity * nwalkers)
+        if self.capacity < nwalkers:
+            raise ValueError('capacity should be larger than 1')
+
+        # all the tensors of the population have the capacity as size
+        GeneralizedMetropolis.__init__(self, self.capacity, nstep,
+                                       step_size, nelec, ndim, init,
+                                       move, drift_limit, nbuffer, wf)
+        if self.movedict['type'] == 'all-elec-iter':
+            raise ValueError(
+                "Diffusion Monte Carlo supports 'all-elec' and 'one-elec' moves")
+        self.feedback = feedback
+
+        # statistics of the last run
+        self.energy = None
+        self.energy_error = None
+        self.energies = []
+        self.trial_energies = []
+        self.population = []
+
+    def generate(self, pdf=None, ntherm=100, ndecor=10, pos=None,
+                 with_tqdm=True):
+        """Propagate the population and accumulate the mixed estimator
+
+        .. math::
+            E_{mixed} = \\frac{\\sum_{t,i} w_i E_L(x_i)}{\\sum_{t,i} w_i}
+
+        over the steps following the equilibration.
+
+        Args:
+            pdf (callable, optional): unused, the trial wave function
+                                      defines the guiding density.
+            ntherm (int, optional): number of equilibration steps.
+                                    Defaults to 100.
+            ndecor (int, optional): number of steps between two stored
+                                    populations. Defaults to 10.
+            pos (torch.tensor, optional): position to start with, typically
+                                          a VMC sample. Defaults to None.
+            with_tqdm (bool, optional): tqdm progress bar. Defaults to True.
+
+        Returns:
+            torch.tensor: positions of the alive walkers of the
+                          stored populations
+        """
+
+        if self.cuda:
+            self.walkers.cuda = True
+            self.device = torch.device('cuda')
+
+        if ntherm < 0:
+            ntherm = self.nstep + ntherm
+        if not isinstance(ndecor, int):
+            raise ValueError('ndecor should be an integer for DMC')
+
+        with torch.no_grad():
+
+            self.walkers.initialize(pos=pos)
+            self._buffer = None
+            tau = self.step_size
+
+            # population of fixed capacity
+            xi, alive, weight = self._init_population(self.walkers.pos)
+            signi, log_psii, drifti, eloci = self.get_guiding(
+                xi, local_energy=True)
+            xi = xi.view(self.capacity, self.nelec, self.ndim)
+
+            e_est = self._weighted_mean(eloci, weight)
+            e_trial = e_est
+            e_sum, nsum = 0., 0
+
+            self.energies, self.trial_energies, self.population = [], [], []
+            self.autocorr.reset(1)
+            positions, rate, idecor = [], 0, 0
+
+            if with_tqdm:
+                rng = tqdm(range(self.nstep))
+            else:
+                rng = range(self.nstep)
+
+            for istep in rng:
+
+                # drift-diffusion move of all the walkers
+                index_elec, mask = self._get_moved_electrons(None)
+                vi = self._limit_drift(drifti, tau)
+                xf = self.move(xi, vi, tau, mask)
+
+                signf, log_psif, driftf, elocf = self.get_guiding(
+                    xf.view(self.capacity, -1),
+                    local_energy=self._single_pass)
+                vf = self._limit_drift(driftf, tau)
+
+                # accept/reject to reduce the time step error
+                # the moves crossing the nodes are rejected
+                Tif = self.trans(xf, xi, vi, tau, mask)
+                Tfi = self.trans(xi, xf, vf, tau, mask)
+                pmat = self._log_ratio(2 * log_psif + Tfi,
+                                       2 * log_psii + Tif)
+                index = self._accept(pmat) & (signf == signi) & alive
+
+                # effective time step
+                dr2 = (mask * (xf - xi)**2).sum((1, 2))
+                tau_eff = tau * self._ratio(dr2[index].sum(),
+                                            dr2[alive].sum())
+                rate += self._ratio(index.sum(), alive.sum())
+
+                # only the accepted walkers are updated
+                if elocf is not None:
+                    elocf = torch.where(index, elocf, eloci)
+                else:
+                    elocf = eloci.clone()
+                    if index.any():
+                        elocf[index] = self._local_energy(
+                            xf[index].view(-1, self.nelec * self.ndim))
+
+                xi[index] = xf[index]
+                log_psii[index] = log_psif[index]
+                signi[index] = signf[index]
+                drifti[index] = driftf[index]
+
+                # branching weights
+                ecut = 2. / tau**0.5
+                eavg = 0.5 * (self._limit_energy(eloci, e_est, ecut) +
+                              self._limit_energy(elocf, e_est, ecut))
+                weight = weight * torch.exp(-tau_eff * (eavg - e_trial))
+                weight = weight * alive.type(weight.dtype)
+                eloci = elocf
+
+                # mixed estimator before the branching
+                e_step = self._weighted_mean(eloci, weight)
+                if istep >= ntherm // 2:
+                    e_sum, nsum = e_sum + e_step, nsum + 1
+                    e_est = e_sum / nsum
+                else:
+                    e_est = e_step
+
+                if istep == ntherm:
+                    e_sum, nsum = e_step, 1
+                    e_est = e_step
+
+                if istep >= ntherm:
+                    self.energies.append(e_step)
+                    self.autocorr.update(torch.tensor([e_step]))
+
+                # population control
+                wtot = max(weight.sum().item(), 1E-12)
+                e_trial = e_est - \
+                    np.log(wtot / self.target_walkers) / (self.feedback * tau)
+                self.trial_energies.append(e_trial)
+
+                # branching/killing
+                (xi, signi, log_psii, drifti, eloci), alive, weight = \
+                    self._branch(weight, alive,
+                                 [xi, signi, log_psii, drifti, eloci])
+                self.population.append(int(alive.sum().item()))
+
+                if istep >= ntherm:
+                    if idecor % ndecor == 0:
+                        positions.append(
+                            xi[alive].view(-1, self.nelec * self.ndim).clone())
+                    idecor += 1
+
+            # restart from the final population
+            self.walkers.pos = xi[alive].view(-1, self.nelec * self.ndim)
+            self.walkers.log_pdf = 2 * log_psii[alive]
+
+        self._get_energy_error()
+        if with_tqdm:
+            print("Acceptance rate %1.3f %%" % (rate / self.nstep * 100))
+            print('Mixed energy : %f +/- %f' %
+                  (self.energy, self.energy_error))
+            print('Mean population : %1.1f' % np.mean(self.population))
+
+        if len(positions) == 0:
+            return self.walkers.pos
+        return torch.cat(positions)
+
+    def extrapolate(self, time_steps, ntherm=100, ndecor=10, pos=None,
+                    with_tqdm=False):
+        """Run a DMC simulation per time step and extrapolate the
+        mixed energy linearly to a zero time step.
+
+        Args:
+            time_steps (list): time steps of the runs
+            ntherm (int, optional): number of equilibration steps.
+                                    Defaults to 100.
+            ndecor (int, optional): number of steps between two stored
+                                    populations. Defaults to 10.
+            pos (torch.tensor, optional): position to start with.
+                                          Defaults to None.
+            with_tqdm (bool, optional): tqdm progress bar. Defaults to False.
+
+        Returns:
+            float, list, list: extrapolated energy, energies and errors
+                               of each run
+        """
+        tau0 = self.step_size
+        energies, errors = [], []
+        for tau in time_steps:
+            self.step_size = tau
+            self.generate(ntherm=ntherm, ndecor=ndecor,
+                          pos=pos, with_tqdm=with_tqdm)
+            energies.append(self.energy)
+            errors.append(self.energy_error)
+        self.step_size = tau0
+
+        w = 1. / np.maximum(np.array(errors), 1E-12)
+        _, e0 = np.polyfit(np.array(time_steps), np.array(energies), 1, w=w)
+        return e0, energies, errors
+
+    @property
+    def _single_pass(self):
+        """True if the local energy comes with the guiding function."""
+        return hasattr(self.wf, 'evaluate') and self.wf.kinetic == 'jacobi'
+
+    def get_guiding(self, x, local_energy=False):
+        """Sign, log|psi| and drift grad log|psi| of the trial wave function
+
+        When the wave function can evaluate everything in a single pass
+        the local energy is computed from the same forward pass.
+
+        Args:
+            x (torch.tensor): positions of the walkers [nwalkers, nelec*ndim]
+            local_energy (bool, optional): also return the local energy.
+                                           Defaults to False.
+
+        Returns:
+            torch.tensor: sign, log|psi|, drift [nwalkers, nelec, ndim]
+                          and local energies [nwalkers] or None
+        """
+        if local_energy and self._single_pass:
+            out = self.wf.evaluate(
+                x, want=['sign', 'log_psi', 'drift', 'local_energy'])
+            return out['sign'].view(-1), out['log_psi'].view(-1), \
+                out['drift'].view(-1, self.nelec, self.ndim), \
+                out['local_energy'].view(-1)
+
+        sign, log_psi, grad_log_psi = self.wf.log_psi_and_grad(
+            x, return_sign=True)
+        grad_log_psi = grad_log_psi.view(-1, self.nelec, self.ndim)
+        eloc = self._local_energy(x) if local_energy else None
+        return sign, log_psi, grad_log_psi, eloc
+
+    def _local_energy(self, x):
+        """Local energy of the walkers
+
+        Args:
+            x (torch.tensor): positions of the walkers [nwalkers, nelec*ndim]
+
+        Returns:
+            torch.tensor: local energies [nwalkers]
+        """
+        if self.wf.kinetic == 'jacobi':
+            return self.wf.local_energy(x).detach().view(-1)
+
+        with torch.enable_grad():
+            x = x.detach().requires_grad_(True)
+            return self.wf.local_energy(x).detach().view(-1)
+
+    def _init_population(self, pos):
+        """Fill the population with the initial positions
+
+        Args:
+            pos (torch.tensor): initial positions of the walkers
+
+        Returns:
+            torch.tensor: positions [capacity, nelec*ndim]
+            torch.tensor: mask of the alive walkers [capacity]
+            torch.tensor: weights of the walkers [capacity]
+        """
+        n0 = min(pos.shape[0], self.target_walkers)
+        slots = torch.arange(self.capacity, device=pos.device)
+        x = pos[-n0:][slots % n0].clone()
+        alive = slots < n0
+        return x, alive, alive.type(x.dtype)
+
+    def _branch(self, weight, alive, states):
+        """Replace each walker by int(w + u) copies of weight 1
+
+        The copies are gathered at the beginning of the population, the
+        empty slots hold copies of the alive walkers with a zero weight so
+        that all the slots remain valid configurations.
+
+        Args:
+            weight (torch.tensor): weights of the walkers [capacity]
+            alive (torch.tensor): mask of the alive walkers [capacity]
+            states (list): tensors of the population [capacity, ...]
+
+        Returns:
+            list: tensors of the new population
+            torch.tensor: mask of the alive walkers [capacity]
+            torch.tensor: weights of the walkers [capacity]
+        """
+        ncopy = torch.floor(weight + torch.rand_like(weight)).long()
+        ncopy[~alive] = 0
+
+        slots = torch.arange(self.capacity, device=weight.device)
+        src = torch.repeat_interleave(slots, ncopy)
+        nalive = src.shape[0]
+
+        if nalive == 0:
+            raise RuntimeError('The walker population died out')
+
+        # population overflow
+        if nalive > self.capacity:
+            src = src[torch.randperm(nalive, device=src.device)
+                      [:self.capacity]]
+            nalive = self.capacity
+
+        src = src[slots % nalive]
+        alive = slots < nalive
+        return [s[src] for s in states], alive, alive.type(weight.dtype)
+
+    def _get_energy_error(self):
+        """Mixed energy and its error from the autocorrelation time."""
+        if len(self.energies) == 0:
+            self.energy, self.energy_error = float('nan'), float('nan')
+            return
+        e = np.array(self.energies)
+        self.energy = e.mean()
+        tau_int = max(1., self.autocorr.integrated_time()) \
+            if len(e) > 1 else 1.
+        self.energy_error = np.sqrt(e.var() * tau_int / len(e))
+
+    @staticmethod
+    def _limit_energy(eloc, e_est, ecut):
+        """Limit the fluctuations of the local energy near the nodes."""
+        return e_est + (eloc - e_est).clamp(min=-ecut, max=ecut)
+
+    @staticmethod
+    def _weighted_mean(x, weight):
+        return ((weight * x).sum() / weight.sum()).item()
+
+    @staticmethod
+    def _ratio(a, b):
+        b = float(b)
+        return float(a) / b if b > 0 else 0.
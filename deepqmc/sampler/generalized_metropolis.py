@@ -1,26 +1,85 @@
 from deepqmc.sampler.sampler_base import SamplerBase
 from tqdm import tqdm
 import torch
-from torch.autograd import Variable, grad
-from torch.distributions import MultivariateNormal
-import numpy as np
 
 
 class GeneralizedMetropolis(SamplerBase):
 
+    # maximum number of random numbers in the noise buffer
+    buffer_size = 2**22
+
     def __init__(self, nwalkers=100, nstep=1000, step_size=3,
                  nelec=1, ndim=1,
-                 init={'type': 'uniform', 'min': -5, 'max': 5}):
-        """Metroplis Hasting sampler
+                 init={'type': 'uniform', 'min': -5, 'max': 5},
+                 move={'type': 'one-elec'},
+                 drift_limit=1., nbuffer=100,
+                 wf=None):
+        """Drift-diffusion Metropolis Hasting sampler
+
+        The electrons are moved following
+
+        .. math::
+            x' = x + \\tau \\bar{v}(x) + \\sqrt{\\tau} \\eta
+
+        with \\eta a gaussian noise and \\bar{v} the drift velocity
+        0.5 grad log(pdf) limited near the nodes and the nuclei:
+
+        .. math::
+            \\bar{v} = \\frac{-1 + \\sqrt{1 + 2 a v^2 \\tau}}{a v^2 \\tau} v
 
         Args:
-            walkers (walkers): a walker object
-            nstep (int, optional): [description]. Defaults to 1000.
-            step_size (int, optional): [description]. Defaults to 3.
+            nwalkers (int, optional): Number of walkers. Defaults to 100.
+            nstep (int, optional): Number of steps. Defaults to 1000.
+            step_size (int, optional): time step tau. Defaults to 3.
+            nelec (int, optional): total number of electrons. Defaults to 1.
+            ndim (int, optional): total number of dimension. Defaults to 1.
+            init (dict, optional): method to init the positions of the walkers.
+                                   See Molecule.domain
+            move (dict, optional): method to move the electrons.
+                                   'type' :
+                                        'one-elec': move a single electron
+                                                    per iteration
+                                        'all-elec': move all electrons at
+                                                    the same time
+                                        'all-elec-iter': move all electrons
+                                                        by iterating
+                                                        through single elec
+                                                        moves
+                                   Defaults to {'type': 'one-elec'}.
+            drift_limit (float, optional): parameter a of the drift limiting,
+                                           None to use the bare drift.
+                                           Defaults to 1.
+            nbuffer (int, optional): maximum number of moves for which the
+                                     gaussian noise is generated at once,
+                                     the buffer holds at most buffer_size
+                                     numbers. Defaults to 100.
+            wf (WaveFunction, optional): wave function. Defaults to None.
         """
 
         SamplerBase.__init__(self, nwalkers, nstep,
-                             step_size, nelec, ndim, init)
+                             step_size, nelec, ndim, init, move, wf)
+
+        if 'type' not in self.movedict.keys():
+            self.movedict['type'] = 'one-elec'
+
+        if self.movedict['type'] not in [
+                'one-elec', 'all-elec', 'all-elec-iter']:
+            raise ValueError(
+                " 'type' in move should be 'one-elec','all-elec','all-elec-iter'")
+
+        self._move_per_iter = 1
+        if self.movedict['type'] == 'all-elec-iter':
+            self.fixed_id_elec_list = range(self.nelec)
+            self._move_per_iter = self.nelec
+        else:
+            self.fixed_id_elec_list = [None]
+
+        self.drift_limit = drift_limit
+
+        # buffer of gaussian noise
+        self.nbuffer = nbuffer
+        self._buffer = None
+        self._ibuffer = 0
 
     def generate(self, pdf, ntherm=10, ndecor=100, pos=None,
                  with_tqdm=True):
@@ -30,8 +89,10 @@ class GeneralizedMetropolis(SamplerBase):
             pdf (callable): probability distribution function to be sampled
             ntherm (int, optional): number of step before thermalization.
                                     Defaults to 10.
-            ndecor (int, optional): number of steps for decorrelation.
-                                    Defaults to 50.
+            ndecor (int or str, optional): number of steps for decorrelation,
+                                           'auto' to use the integrated
+                                           autocorrelation time of the
+                                           log pdf. Defaults to 100.
             pos (torch.tensor, optional): position to start with.
                                           Defaults to None.
             with_tqdm (bool, optional): tqdm progress bar. Defaults to True.
@@ -39,21 +100,30 @@ class GeneralizedMetropolis(SamplerBase):
         Returns:
             torch.tensor: positions of the walkers
         """
+
+        if self.cuda:
+            self.walkers.cuda = True
+            self.device = torch.device('cuda')
+
         with torch.no_grad():
 
             if ntherm < 0:
                 ntherm = self.nstep + ntherm
 
             self.walkers.initialize(pos=pos)
+            self._buffer = None
 
+            # log pdf and drift in a single pass
+            log_pdf_and_grad = self.get_log_pdf_and_grad(pdf)
             xi = self.walkers.pos.clone()
-            xi.requires_grad = True
+            rhoi, drifti = self.get_drift(log_pdf_and_grad, xi)
 
-            rhoi = pdf(xi)
-            drifti = self.get_drift(pdf, xi)
+            # -> (Nwalkers, Nelec, Ndim)
+            xi = xi.view(self.nwalkers, self.nelec, self.ndim)
+            drifti = drifti.view(self.nwalkers, self.nelec, self.ndim)
 
-            rhoi[rhoi == 0] = 1E-16
-            pos, rate, idecor = [], 0, 0
+            rate, idecor = 0, 0
+            self._init_step_size()
 
             if with_tqdm:
                 rng = tqdm(range(self.nstep))
@@ -62,105 +132,203 @@ class GeneralizedMetropolis(SamplerBase):
 
             for istep in rng:
 
-                # new positions
-                xf = self.move(drifti)
+                # autocorrelation/storage
+                ndecor = self._update_decorrelation(istep, ntherm, ndecor)
+
+                for id_elec in self.fixed_id_elec_list:
+
+                    # electrons to move and their time step
+                    index_elec, mask = self._get_moved_electrons(id_elec)
+                    tau = self._get_time_step(index_elec)
 
-                # new function
-                rhof = pdf(xf)
-                driftf = self.get_drift(pdf, xf)
-                rhof[rhof == 0.] = 1E-16
+                    # new positions
+                    vi = self._limit_drift(drifti, tau)
+                    xf = self.move(xi, vi, tau, mask)
 
-                # transtions
-                Tif = self.trans(xi, xf, driftf)
-                Tfi = self.trans(xf, xi, drifti)
-                pmat = (Tif * rhof) / (Tfi * rhoi).double()
+                    # new function
+                    rhof, driftf = self.get_drift(
+                        log_pdf_and_grad, xf.view(self.nwalkers, -1))
+                    driftf = driftf.view(
+                        self.nwalkers, self.nelec, self.ndim)
+                    vf = self._limit_drift(driftf, tau)
 
-                # accept the moves
-                index = self._accept(pmat)
+                    # transitions
+                    Tif = self.trans(xf, xi, vi, tau, mask)
+                    Tfi = self.trans(xi, xf, vf, tau, mask)
+                    pmat = self._log_ratio(rhof + Tfi, rhoi + Tif)
 
-                # acceptance rate
-                rate += index.byte().sum().float() / self.nwalkers
+                    # accept the moves
+                    index = self._accept(pmat)
 
-                # update position/function value
-                xi[index, :] = xf[index, :]
-                rhoi[index] = rhof[index]
-                rhoi[rhoi == 0] = 1E-16
+                    # acceptance rate
+                    rate += index.byte().sum().float().to('cpu') / \
+                        (self.nwalkers * self._move_per_iter)
 
-                drifti[index, :] = driftf[index, :]
+                    # adapt the step size
+                    self._adapt_step_size(index, istep, ntherm, index_elec)
+
+                    # update position/function value
+                    xi[index] = xf[index]
+                    rhoi[index] = rhof[index]
+                    drifti[index] = driftf[index]
+
+                self.autocorr.update(rhoi)
 
                 if (istep >= ntherm):
                     if (idecor % ndecor == 0):
-                        pos.append(xi.clone().detach())
+                        self.storage.append(xi.view(self.nwalkers, -1))
                     idecor += 1
 
+            self.walkers.log_pdf = rhoi.detach().clone()
+            self._get_effective_sample_size(with_tqdm)
+
             if with_tqdm:
                 print(
                     "Acceptance rate %1.3f %%" %
                     (rate / self.nstep * 100))
+                self._print_step_size()
 
-            self.walkers.pos.data = xi.data
-        return torch.cat(pos)
+            self.walkers.pos = xi.view(self.nwalkers, -1)
+        return self.storage.get()
 
-    def move(self, drift):
-        """Move electron one at a time in a vectorized way.
+    def move(self, x, drift, tau, mask):
+        """Drift-diffusion move of the selected electrons.
 
         Args:
-            step_size (float): size of the MC moves
+            x (torch.tensor): positions of the walkers [nwalkers, nelec, ndim]
+            drift (torch.tensor): (limited) drift [nwalkers, nelec, ndim]
+            tau (float or torch.tensor): time step
+            mask (torch.tensor): electrons to move [nwalkers, nelec, 1]
 
         Returns:
             torch.tensor: new positions of the walkers
         """
+        return x + mask * (tau * drift + tau**0.5 * self._gaussian())
+
+    def trans(self, xf, xi, drifti, tau, mask):
+        """log of the transition probability from xi to xf
+
+        .. math::
+            \\log T(x_i \\rightarrow x_f) = - |x_f - x_i - \\tau v_i|^2 / 2\\tau
+
+        Args:
+            xf (torch.tensor): final positions [nwalkers, nelec, ndim]
+            xi (torch.tensor): initial positions [nwalkers, nelec, ndim]
+            drifti (torch.tensor): (limited) drift at xi [nwalkers, nelec, ndim]
+            tau (float or torch.tensor): time step
+            mask (torch.tensor): moved electrons [nwalkers, nelec, 1]
+
+        Returns:
+            torch.tensor: log of the transition probability [nwalkers]
+        """
+        a = mask * (xf - xi - tau * drifti)**2
+        return -(a / (2 * tau)).sum((1, 2))
+
+    def get_drift(self, log_pdf_and_grad, x):
+        """log pdf and drift velocity 0.5 grad log(pdf)
+
+        Args:
+            log_pdf_and_grad (callable): log pdf and its gradient
+            x (torch.tensor): positions of the walkers
+
+        Returns:
+            torch.tensor, torch.tensor: log pdf and drift
+        """
+        log_rho, grad_log_rho = log_pdf_and_grad(x)
+        return log_rho, 0.5 * grad_log_rho
+
+    def _limit_drift(self, drift, tau):
+        """Limit the drift of each electron (Umrigar et al. 1993)
+
+        Args:
+            drift (torch.tensor): drift [nwalkers, nelec, ndim]
+            tau (float or torch.tensor): time step
+
+        Returns:
+            torch.tensor: limited drift [nwalkers, nelec, ndim]
+        """
+        if self.drift_limit is None:
+            return drift
 
-        # clone and reshape data : Nwlaker, Nelec, Ndim
-        new_pos = self.walkers.pos.clone()
-        new_pos = new_pos.view(self.nwalkers,
-                               self.nelec, self.ndim)
+        # (-1 + sqrt(1+2x))/x written to be stable for small x
+        x = self.drift_limit * (drift**2).sum(-1, keepdim=True) * tau
+        return 2. / (1. + torch.sqrt(1. + 2. * x)) * drift
 
-        # get indexes
-        index = torch.LongTensor(self.nwalkers).random_(
-            0, self.nelec)
+    def _get_moved_electrons(self, id_elec):
+        """Select the electrons to move
 
-        new_pos[range(self.nwalkers), index,
-                :] += self._move(drift, index)
+        Args:
+            id_elec (int or None): index of the electron to move in all
+                                   walkers (all-elec-iter) or None
 
-        return new_pos.view(self.nwalkers, self.nelec * self.ndim)
+        Returns:
+            torch.LongTensor: index of the moved electron in each walker
+                              (None for all electron moves)
+            torch.tensor: mask of the moved electrons [nwalkers, nelec, 1]
+        """
+        if self.movedict['type'] == 'all-elec':
+            mask = torch.ones(1, self.nelec, 1, device=self.device)
+            return None, mask
 
-    def _move(self, drift, index):
+        if id_elec is None:
+            index = torch.randint(
+                0, self.nelec, (self.nwalkers,), device=self.device)
+        else:
+            index = torch.full((self.nwalkers,), id_elec,
+                               dtype=torch.long, device=self.device)
 
-        d = drift.view(self.nwalkers,
-                       self.nelec, self.ndim)
+        mask = torch.nn.functional.one_hot(
+            index, self.nelec).type(torch.get_default_dtype())
+        return index, mask.unsqueeze(-1)
 
-        mv = MultivariateNormal(torch.zeros(self.ndim), np.sqrt(
-            self.step_size) * torch.eye(self.ndim))
+    def _get_time_step(self, index):
+        """Time step of each walker/electron
 
-        return self.step_size * d[range(self.nwalkers), index, :] \
-            + mv.sample((self.nwalkers, 1)).squeeze()
+        Args:
+            index (torch.LongTensor or None): index of the moved electrons
 
-    def trans(self, xf, xi, drifti):
-        a = (xf - xi - drifti * self.step_size).norm(dim=1)
-        return torch.exp(- 0.5 * a / self.step_size)
+        Returns:
+            float or torch.tensor: time step broadcastable to
+                                   [nwalkers, nelec, 1]
+        """
+        tau = self._walker_step_size(index)
+        if not torch.is_tensor(tau):
+            return tau
+        if tau.shape[-1] == 1:
+            return tau.view(-1, 1, 1)
+        return tau.view(1, self.nelec, self.ndim)[..., :1]
 
-    def get_drift(self, pdf, x):
-        with torch.enable_grad():
+    def _gaussian(self):
+        """Get the gaussian noise of one move from the buffer
 
-            x.requires_grad = True
-            rho = pdf(x).view(-1, 1)
-            z = Variable(torch.ones_like(rho))
-            grad_rho = grad(rho, x,
-                            grad_outputs=z,
-                            only_inputs=True)[0]
-            return 0.5 * grad_rho / rho
+        Single electron moves only need the noise of the moved electron,
+        which is broadcast over the electrons and selected by the mask.
 
-    def _accept(self, P):
+        Returns:
+            torch.tensor: gaussian noise [nwalkers, nelec, ndim]
+                          or [nwalkers, 1, ndim] for single electron moves
+        """
+        if self._buffer is None or self._ibuffer >= self._buffer.shape[0]:
+            nelec = self.nelec if self.movedict['type'] == 'all-elec' else 1
+            size = self.nwalkers * nelec * self.ndim
+            nbuffer = max(1, min(self.nbuffer, self.buffer_size // size))
+            self._buffer = torch.randn(
+                nbuffer, self.nwalkers, nelec, self.ndim,
+                device=self.device)
+            self._ibuffer = 0
+
+        self._ibuffer += 1
+        return self._buffer[self._ibuffer - 1]
+
+    def _accept(self, logP):
         """accept the move or not
 
         Args:
-            P (torch.tensor): probability of each move
+            logP (torch.tensor): log of the probability of each move
 
         Returns:
             t0rch.tensor: the indx of the accepted moves
         """
-        P[P > 1] = 1.0
-        tau = torch.rand(self.walkers.nwalkers).double()
-        index = (P - tau >= 0).reshape(-1)
+        tau = torch.rand_like(logP)
+        index = (logP >= torch.log(tau)).reshape(-1)
         return index.type(torch.bool)
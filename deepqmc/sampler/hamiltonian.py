@@ -1,50 +1,59 @@
 import torch
 from tqdm import tqdm
-from torch.autograd import Variable
 from deepqmc.sampler.sampler_base import SamplerBase
+from deepqmc.sampler.step_size import DualAveraging
 
 
 class Hamiltonian(SamplerBase):
 
     def __init__(self, nwalkers=100, nstep=100, nelec=1, ndim=3,
-                 step_size=0.1, init={'min': -2, 'max': 2}, L=10):
+                 step_size=0.1, init={'min': -2, 'max': 2}, L=10,
+                 wf=None, adapt=False, mass_matrix='identity', target=0.65,
+                 max_traj_length=100):
         ''' HMC SAMPLER
+
+        With adapt=True the step size is tuned by dual averaging during the
+        thermalization toward the target acceptance probability and, with
+        mass_matrix='diag', a diagonal mass matrix is estimated from the
+        variance of the positions. By default the step size given and an
+        identity mass matrix are used as is. With L='auto' the
+        number of leapfrog steps of each trajectory is drawn from the
+        empirical distribution of the U-turn lengths measured during the
+        thermalization (eHMC, Wu et al. 2018).
+
         Args:
-            f (func) : function to sample
-            nstep (int) : number of mc step
             nwalkers (int) : number of walkers
-            eps (float) : size of the mc step
-            boudnary (float) : boudnary of the space
+            nstep (int) : number of mc step
+            nelec (int) : number of electrons
+            ndim (int) : number of dimension per electron
+            step_size (float) : size of the leapfrog step
+            init (dict) : method to initialize the walkers
+            L (int or str) : number of leapfrog steps or 'auto'
+            wf (WaveFunction) : wave function (optional)
+            adapt (bool) : adapt the step size (and the mass matrix)
+                           during the thermalization (default False)
+            mass_matrix (str) : 'diag' (adapted) or 'identity'
+                                (default 'identity')
+            target (float) : target acceptance probability
+            max_traj_length (int) : maximum number of steps to
+                                    detect the U-turns
         '''
 
         SamplerBase.__init__(self, nwalkers, nstep,
-                             step_size, nelec, ndim, init, None)
+                             step_size, nelec, ndim, init, None, wf)
         self.traj_length = L
+        self.max_traj_length = max_traj_length
 
-    @staticmethod
-    def get_grad(func, inp):
-        '''Compute the gradient of a function
-        wrt the value of its input
+        if mass_matrix not in ['diag', 'identity']:
+            raise ValueError("mass_matrix should be 'diag' or 'identity'")
+        self.mass_matrix = mass_matrix
+        self.inv_mass = None
 
-        Args:
-            func : function to get the gradient of
-            inp : input
-        Returns:
-            grad : gradient of the func wrt the input
-        '''
-
-        inp.requires_grad = True
-        val = func(inp)
-        z = Variable(torch.ones(val.shape))
-        val.backward(z)
-        fgrad = inp.grad.data
-        inp.grad.data.zero_()
-        inp.requires_grad = False
-        return fgrad
+        self.adapt = adapt
+        self.dual_averaging = DualAveraging(target=target)
 
-    @staticmethod
-    def log_func(func):
-        return lambda x: -torch.log(func(x))
+        # empirical distribution of the trajectory lengths
+        self.traj_lengths = None
 
     def generate(self, pdf, ntherm=10, ndecor=10,
                  with_tqdm=True, pos=None):
@@ -53,89 +62,264 @@ class Hamiltonian(SamplerBase):
             X (list) : positions of the walkers
         '''
 
+        if self.cuda:
+            self.walkers.cuda = True
+            self.device = torch.device('cuda')
+
+        if ntherm >= self.nstep:
+            raise ValueError('Thermalisation longer than trajectory')
+
         if ntherm < 0:
             ntherm = self.nstep + ntherm
 
-        self.walkers.initialize(pos=pos)
-        self.walkers.pos = self.walkers.pos.clone()
+        with torch.no_grad():
 
-        # get the logpdf function
-        logpdf = self.log_func(pdf)
+            self.walkers.initialize(pos=pos)
+            q = self.walkers.pos.clone()
 
-        pos = []
-        rate = 0
-        idecor = 0
+            # get the log pdf and its gradient
+            log_pdf_and_grad = self.get_log_pdf_and_grad(pdf)
 
-        if with_tqdm:
-            rng = tqdm(range(self.nstep))
-        else:
-            rng = range(self.nstep)
+            def U_and_grad(x):
+                log_pdf, grad_log_pdf = log_pdf_and_grad(x)
+                return -log_pdf, -grad_log_pdf
+
+            U, dU = U_and_grad(q)
+
+            # warm-up windows
+            mass_window = range(ntherm // 4, ntherm // 2)
+            uturn_window = range(ntherm // 2, ntherm)
+            if self.mass_matrix == 'identity' or not self.adapt:
+                uturn_window = range(0, ntherm)
+
+            if self.inv_mass is None or \
+                    self.inv_mass.shape[-1] != q.shape[1]:
+                self.inv_mass = q.new_ones(1, q.shape[1])
+            self.inv_mass = self.inv_mass.to(q.device)
+
+            lengths = []
+            rate, idecor = 0, 0
+            self._init_step_size()
+            if self._use_dual_averaging():
+                self.dual_averaging.initialize(self.step_size)
+
+            if with_tqdm:
+                rng = tqdm(range(self.nstep))
+            else:
+                rng = range(self.nstep)
+
+            for istep in rng:
+
+                # autocorrelation/storage
+                ndecor = self._update_decorrelation(istep, ntherm, ndecor)
+
+                # end of the warm-up
+                if istep == ntherm:
+                    if self._use_dual_averaging():
+                        self.step_size = \
+                            self.dual_averaging.get_final_step_size()
+                    if len(lengths) > 0:
+                        self.traj_lengths = torch.cat(lengths)
+
+                # number of leapfrog steps
+                uturn = self.traj_length == 'auto' and istep in uturn_window
+                L = self._get_traj_length(uturn)
+
+                # move the walkers
+                q, U, dU, accepted, accept_prob, nturn = self._step(
+                    U_and_grad, self._walker_step_size(), L,
+                    q, U, dU, self.inv_mass, uturn)
+                rate += accepted.sum().float() / accepted.shape[0]
+
+                if uturn:
+                    lengths.append(nturn)
+
+                # adaptation of the step size and mass matrix
+                if istep < ntherm:
+
+                    if self._use_dual_averaging():
+                        self.step_size = self.dual_averaging.update(
+                            accept_prob.mean().item())
+                    else:
+                        self._adapt_step_size(accepted, istep, ntherm)
 
-        for istep in rng:
+                    if self.adapt and self.mass_matrix == 'diag':
+                        self._adapt_mass_matrix(istep, q, mass_window)
 
-            # move the walkers
-            self.walkers.pos, _r = self._step(
-                logpdf, self.get_grad, self.step_size, self.traj_length,
-                self.walkers.pos)
-            rate += _r
+                # log pdf of the walkers
+                self.autocorr.update(-U)
 
-            # store
-            if (istep >= ntherm):
-                if (idecor % ndecor == 0):
-                    pos.append(self.walkers.pos.detach())
-                idecor += 1
+                # store
+                if (istep >= ntherm):
+                    if (idecor % ndecor == 0):
+                        self.storage.append(q)
+                    idecor += 1
+
+            self.walkers.pos = q
+            self.walkers.log_pdf = -U
 
         # print stats
-        print("Acceptance rate %1.3f %%" % (rate / self.nstep * 100))
-        return torch.cat(pos)
+        self._get_effective_sample_size(with_tqdm)
+        if with_tqdm:
+            print("Acceptance rate %1.3f %%" % (rate / self.nstep * 100))
+            if self._use_dual_averaging():
+                print('Step size : %1.3f' % self.step_size)
+            self._print_step_size()
+        return self.storage.get()
+
+    def get_snapshot(self):
+        """Get a snapshot of the sampler including the mass matrix
+        and the distribution of the trajectory lengths
+
+        Returns:
+            dict -- snapshot of the sampler
+        """
+        def _cpu(x):
+            return None if x is None else x.detach().to('cpu').clone()
+
+        snapshot = super(Hamiltonian, self).get_snapshot()
+        snapshot['inv_mass'] = _cpu(self.inv_mass)
+        snapshot['traj_lengths'] = _cpu(self.traj_lengths)
+        return snapshot
+
+    def load_snapshot(self, snapshot, restore_rng=True):
+        """Load a snapshot of the sampler
+
+        Arguments:
+            snapshot {dict or str} -- snapshot or name of the file
+
+        Keyword Arguments:
+            restore_rng {bool} -- restore the state of the random
+                                  number generators (default: {True})
+        """
+        if isinstance(snapshot, str):
+            snapshot = torch.load(snapshot)
+        super(Hamiltonian, self).load_snapshot(snapshot, restore_rng)
+        self.inv_mass = snapshot.get('inv_mass', None)
+        self.traj_lengths = snapshot.get('traj_lengths', None)
+
+    def _use_dual_averaging(self):
+        """Step size tuned by dual averaging, i.e. no other controller."""
+        return self.adapt and self.step_controller is None
+
+    def _get_traj_length(self, uturn):
+        """Number of leapfrog steps of the next trajectory
+
+        Args:
+            uturn (bool) : trajectory used to measure the U-turn lengths
+
+        Returns:
+            int : number of leapfrog steps
+        """
+        if uturn:
+            return self.max_traj_length
+
+        if self.traj_length != 'auto':
+            return self.traj_length
+
+        # default before any U-turn measurement
+        if self.traj_lengths is None:
+            return 10
+
+        i = torch.randint(len(self.traj_lengths), (1,))
+        return int(self.traj_lengths[i])
+
+    def _adapt_mass_matrix(self, istep, q, window):
+        """Estimate the inverse mass matrix from the variance of the positions
+
+        Args:
+            istep (int) : current step
+            q (torch.tensor) : positions of the walkers
+            window (range) : steps used to estimate the variance
+        """
+        if istep not in window:
+            return
+
+        if istep == window[0]:
+            self._nmass = 0
+            self._mean_mass = q.new_zeros(1, q.shape[1])
+            self._m2_mass = q.new_zeros(1, q.shape[1])
+
+        # batched welford update
+        n, nb = self._nmass, q.shape[0]
+        mean_b = q.mean(0, keepdim=True)
+        m2_b = ((q - mean_b)**2).sum(0, keepdim=True)
+        delta = mean_b - self._mean_mass
+        self._mean_mass += delta * nb / (n + nb)
+        self._m2_mass += m2_b + delta**2 * n * nb / (n + nb)
+        self._nmass = n + nb
+
+        # regularized variance (as in Stan)
+        if istep == window[-1] and self._nmass > 1:
+            n = self._nmass
+            var = self._m2_mass / (n - 1)
+            self.inv_mass = (n / (n + 5.)) * var + 1E-3 * (5. / (n + 5.))
+
+            # restart the step size adaptation
+            if self._use_dual_averaging():
+                self.dual_averaging.initialize(self.step_size)
 
     @staticmethod
-    def _step(U, get_grad, epsilon, L, qinit):
+    def _step(U_and_grad, epsilon, L, qinit, Uinit, dUinit,
+              inv_mass, uturn=False):
         '''Propagates all the walkers over on traj
         Args:
-            pdf (callable): the target dist
-            get_grad (callable) : get the value of the target dist gradient
-            epsilon (float) : step size
+            U_and_grad (callable): potential energy (-log pdf) and its
+                                   gradient in a single call
+            epsilon (float or tensor) : step size (global or per walker)
             L (int) : number of steps in the traj
             qinit (array) : initial positon of the walkers
+            Uinit (array) : potential energy at qinit
+            dUinit (array) : gradient of the potential energy at qinit
+            inv_mass (array) : diagonal of the inverse mass matrix
+            uturn (bool) : record the first U-turn of each walker
         Returns:
             q : new positions of the walkers
-            rate : accept rate
+            U, dU : potential energy and gradient at the new positions
+            accepted : mask of the accepted moves
+            accept_prob : acceptance probabilities
+            nturn : number of steps before the first U-turn
         '''
 
-        # init the momentum
-        q = qinit.clone()
-        p = torch.randn(q.shape)
+        # init the momentum p ~ N(0, M)
+        p = torch.randn_like(qinit) / torch.sqrt(inv_mass)
 
         # initial energy terms
-        Einit = U(q) + 0.5 * (p**2).sum(1)
+        Einit = Uinit + 0.5 * (inv_mass * p**2).sum(1)
 
-        # half step in momentum space
-        p -= 0.5 * epsilon * get_grad(U, q)
+        q, U, dU = qinit, Uinit, dUinit
+        nturn = torch.zeros(qinit.shape[0], dtype=torch.long,
+                            device=qinit.device)
 
-        # full steps in q and p space
-        for iL in range(L - 1):
-            q = q + epsilon * p
-            p -= 0.5 * epsilon * get_grad(U, q)
+        for iL in range(L):
 
-        # last full step in pos space
-        q = q + epsilon * p
+            # leapfrog step
+            p = p - 0.5 * epsilon * dU
+            q = q + epsilon * inv_mass * p
+            U, dU = U_and_grad(q)
+            p = p - 0.5 * epsilon * dU
 
-        # half step in momentum space
-        p -= 0.5 * epsilon * get_grad(U, q)
+            # first U-turn of each walker
+            if uturn:
+                turned = ((q - qinit) * inv_mass * p).sum(1) < 0
+                nturn[turned & (nturn == 0)] = iL + 1
+                if (nturn > 0).all():
+                    break
 
-        # negate momentum
-        p = -p
+        if uturn:
+            nturn[nturn == 0] = L
 
         # current energy term
-        Enew = U(q) + 0.5 * (p**2).sum(1)
+        Enew = U + 0.5 * (inv_mass * p**2).sum(1)
 
-        # metropolix accept/reject
-        eps = torch.rand(Enew.shape)
-        cond = (torch.exp(Einit - Enew) < eps).view(-1)
-        q[cond] = qinit[cond]
+        # metropolis accept/reject
+        logP = Einit - Enew
+        logP[torch.isnan(logP)] = -float('inf')
+        accept_prob = torch.exp(logP.clamp(max=0.))
+        accepted = (torch.log(torch.rand_like(logP)) < logP).view(-1)
 
-        # comute the accept rate
-        rate = cond.sum().float() / cond.shape[0]
+        q = torch.where(accepted.view(-1, 1), q, qinit)
+        U = torch.where(accepted, U, Uinit)
+        dU = torch.where(accepted.view(-1, 1), dU, dUinit)
 
-        return q, rate
+        return q, U, dU, accepted, accept_prob, nturn
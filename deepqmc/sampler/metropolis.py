@@ -1,8 +1,9 @@
 from deepqmc.sampler.sampler_base import SamplerBase
+from deepqmc.wavefunction.fast_update import FastUpdate
 from tqdm import tqdm
 import torch
-from torch.distributions import MultivariateNormal
 from time import time
+import math
 
 
 class Metropolis(SamplerBase):
@@ -46,12 +47,21 @@ class Metropolis(SamplerBase):
                                                         through single elec
                                                         moves
                                     'proba' : 'uniform', 'normal'
+                                    'update' : 'full': recompute the wave
+                                                       function after
+                                                       each move
+                                               'fast': update the slater
+                                                       inverses after single
+                                                       electron moves
+                                                       (requires wf)
                                     Defaults to {'type': 'one-elec',
                                                  'proba': 'uniform'}.
+            wf (Orbital, optional): wave function, needed for the fast
+                                    update. Defaults to None.
         """
 
         SamplerBase.__init__(self, nwalkers, nstep,
-                             step_size, nelec, ndim, init, move)
+                             step_size, nelec, ndim, init, move, wf)
 
         if 'type' not in self.movedict.keys():
             print('Metroplis : Set 1 electron move by default')
@@ -61,12 +71,6 @@ class Metropolis(SamplerBase):
             print('Metroplis : Set uniform trial move probability')
             self.movedict['proba'] = 'uniform'
 
-        if self.movedict['proba'] == 'normal':
-            _sigma = self.step_size / \
-                (2 * torch.sqrt(2 * torch.log(torch.tensor(2.))))
-            self.multiVariate = MultivariateNormal(
-                torch.zeros(self.ndim), _sigma * torch.eye(self.ndim))
-
         self._move_per_iter = 1
         if self.movedict['type'] not in [
                 'one-elec', 'all-elec', 'all-elec-iter']:
@@ -79,6 +83,18 @@ class Metropolis(SamplerBase):
         else:
             self.fixed_id_elec_list = [None]
 
+        if 'update' not in self.movedict.keys():
+            self.movedict['update'] = 'full'
+
+        self.fast_update = None
+        if self.movedict['update'] == 'fast':
+            if self.movedict['type'] == 'all-elec':
+                raise ValueError(
+                    "Fast update requires 'one-elec' or 'all-elec-iter' moves")
+            if wf is None:
+                raise ValueError('Fast update requires the wave function')
+            self.fast_update = FastUpdate(wf)
+
     def generate(self, pdf, ntherm=10, ndecor=100, pos=None,
                  with_tqdm=True):
         """Generate a series of point using MC sampling
@@ -87,8 +103,10 @@ class Metropolis(SamplerBase):
             pdf (callable): probability distribution function to be sampled
             ntherm (int, optional): number of step before thermalization.
                                     Defaults to 10.
-            ndecor (int, optional): number of steps for decorrelation.
-                                    Defaults to 50.
+            ndecor (int or str, optional): number of steps for decorrelation,
+                                           'auto' to use the integrated
+                                           autocorrelation time of the
+                                           log pdf. Defaults to 100.
             pos (torch.tensor, optional): position to start with.
                                           Defaults to None.
             with_tqdm (bool, optional): tqdm progress bar. Defaults to True.
@@ -97,12 +115,6 @@ class Metropolis(SamplerBase):
             torch.tensor: positions of the walkers
         """
 
-        _type_ = torch.get_default_dtype()
-        if _type_ == torch.float32:
-            eps = 1E-7
-        elif _type_ == torch.float64:
-            eps = 1E-16
-
         if self.cuda:
             self.walkers.cuda = True
             self.device = torch.device('cuda')
@@ -117,10 +129,14 @@ class Metropolis(SamplerBase):
 
             self.walkers.initialize(pos=pos)
 
-            fx = pdf(self.walkers.pos)
+            log_pdf = self.get_log_pdf(pdf)
+            if self.fast_update is not None:
+                fx = self.fast_update.initialize(self.walkers.pos)
+            else:
+                fx = log_pdf(self.walkers.pos)
 
-            fx[fx == 0] = eps
-            pos, rate, idecor = [], 0, 0
+            rate, idecor = 0, 0
+            self._init_step_size()
 
             if with_tqdm:
                 rng = tqdm(range(self.nstep))
@@ -129,17 +145,22 @@ class Metropolis(SamplerBase):
 
             for istep in rng:
 
+                # autocorrelation/storage
+                ndecor = self._update_decorrelation(istep, ntherm, ndecor)
+
                 for id_elec in self.fixed_id_elec_list:
 
                     t0 = time()
                     # new positions
-                    Xn = self.move(pdf, id_elec)
+                    Xn, index_elec = self.move(pdf, id_elec)
 
                     # new function
                     t0_pdf = time()
-                    fxn = pdf(Xn)
-                    fxn[fxn == 0.] = eps
-                    df = fxn / fx
+                    if self.fast_update is not None:
+                        fxn = self.fast_update.propose(Xn, index_elec)
+                    else:
+                        fxn = log_pdf(Xn)
+                    df = self._log_ratio(fxn, fx)
 
                     # accept the moves
                     index = self._accept(df)
@@ -148,22 +169,33 @@ class Metropolis(SamplerBase):
                     rate += index.byte().sum().float().to('cpu') / \
                         (self.nwalkers * self._move_per_iter)
 
+                    # adapt the step size
+                    self._adapt_step_size(index, istep, ntherm, index_elec)
+
                     # update position/function value
                     self.walkers.pos[index, :] = Xn[index, :]
                     fx[index] = fxn[index]
-                    fx[fx == 0] = eps
+
+                    if self.fast_update is not None:
+                        self.fast_update.accept(index)
+
+                self.autocorr.update(fx)
 
                 if (istep >= ntherm):
                     if (idecor % ndecor == 0):
-                        pos.append(self.walkers.pos.to('cpu').clone())
+                        self.storage.append(self.walkers.pos)
                     idecor += 1
 
+            self.walkers.log_pdf = fx.detach().clone()
+            self._get_effective_sample_size(with_tqdm)
+
             if with_tqdm:
                 print(
                     "Acceptance rate %1.3f %%" %
                     (rate / self.nstep * 100))
+                self._print_step_size()
 
-        return torch.cat(pos)
+        return self.storage.get()
 
     def move(self, pdf, id_elec):
         """Move electron one at a time in a vectorized way.
@@ -174,9 +206,15 @@ class Metropolis(SamplerBase):
 
         Returns:
             torch.tensor: new positions of the walkers
+            torch.LongTensor: index of the moved electron in each walker
+                              (None for all electron moves)
         """
         if self.nelec == 1 or self.movedict['type'] == 'all-elec':
-            return self.walkers.pos + self._move(self.nelec)
+            index = None
+            if self.nelec == 1:
+                index = torch.zeros(
+                    self.nwalkers, dtype=torch.long, device=self.device)
+            return self.walkers.pos + self._move(self.nelec, index), index
 
         else:
 
@@ -193,47 +231,54 @@ class Metropolis(SamplerBase):
                 index = torch.LongTensor(self.nwalkers).fill_(id_elec)
 
             # change selected data
+            index = index.to(self.device)
             new_pos[range(self.nwalkers), index,
-                    :] += self._move(1)
+                    :] += self._move(1, index)
 
-            return new_pos.view(self.nwalkers, self.nelec * self.ndim)
+            return new_pos.view(self.nwalkers, self.nelec * self.ndim), index
 
-    def _move(self, num_elec):
+    def _move(self, num_elec, index=None):
         """Return a random array of length size between
         [-step_size,step_size]
 
         Args:
-            step_size (float): boundary of the array
-            size (int): number of points in the array
+            num_elec (int): number of electrons to move
+            index (torch.LongTensor, optional): index of the moved electron
+                                                in each walker, None for
+                                                all electron moves.
+                                                Defaults to None.
 
         Returns:
             torch.tensor: random array
         """
+        step_size = self._walker_step_size(index if num_elec == 1 else None)
+
         if self.movedict['proba'] == 'uniform':
             d = torch.rand(
                 (self.nwalkers, num_elec, self.ndim), device=self.device).view(
                 self.nwalkers, num_elec * self.ndim)
-            return self.step_size * (2. * d - 1.)
+            return step_size * (2. * d - 1.)
 
         elif self.movedict['proba'] == 'normal':
-            displacement = self.multiVariate.sample(
-                (self.nwalkers, num_elec)).to(self.device)
-            return displacement.view(
+            # variance of the gaussian from the FWHM
+            sigma = step_size / (2 * math.sqrt(2 * math.log(2.)))
+            d = torch.randn(
+                (self.nwalkers, num_elec, self.ndim), device=self.device).view(
                 self.nwalkers, num_elec * self.ndim)
+            return sigma**0.5 * d
 
-    def _accept(self, P):
+    def _accept(self, logP):
         """accept the move or not
 
         Args:
-            P (torch.tensor): probability of each move
+            logP (torch.tensor): log of the probability of each move
 
         Returns:
             t0rch.tensor: the indx of the accepted moves
         """
 
-        P[P > 1] = 1.0
-        tau = torch.rand_like(P)
-        index = (P - tau >= 0).reshape(-1)
+        tau = torch.rand_like(logP)
+        index = (logP >= torch.log(tau)).reshape(-1)
         return index.type(torch.bool)
 
 
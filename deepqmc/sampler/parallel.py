@@ -0,0 +1,278 @@
+import os
+import copy
+import numpy as np
+import torch
+import torch.multiprocessing as mp
+from deepqmc.sampler.sampler_base import SamplerBase
+
+
+def _worker(rank, sampler, seed, dtype, tasks, results):
+    """Loop of a worker process
+
+    Each worker holds its own copy of the sampler and of the wave function.
+    The parameters are read from shared memory and the final positions and
+    log pdf of the shard are written in shared memory.
+
+    Arguments:
+        rank {int} -- index of the worker
+        sampler {SamplerBase} -- copy of the sampler
+        seed {int} -- seed of the random number generator
+        dtype {torch.dtype} -- default dtype
+        tasks {Queue} -- tasks sent by the main process
+        results {Queue} -- results sent to the main process
+    """
+
+    # one thread per worker to avoid oversubscription
+    torch.set_num_threads(1)
+    torch.set_default_dtype(dtype)
+    torch.manual_seed(seed + rank)
+
+    while True:
+
+        task = tasks.get()
+        if task is None:
+            break
+
+        try:
+            state, pos, log_pdf, shard, settings = task
+
+            sampler.wf.load_state_dict(state)
+            for key in ['nstep', 'step_size']:
+                setattr(sampler, key, settings[key])
+
+            nwalkers = shard.stop - shard.start
+            sampler.nwalkers = nwalkers
+            sampler.walkers.nwalkers = nwalkers
+            sampler.walkers.resume = False
+
+            samples = sampler.generate(sampler.wf.pdf,
+                                       ntherm=settings['ntherm'],
+                                       ndecor=settings['ndecor'],
+                                       pos=pos[shard].clone(),
+                                       with_tqdm=False)
+
+            # final state of the shard
+            pos[shard] = sampler.walkers.pos
+            if sampler.walkers.log_pdf is not None:
+                log_pdf[shard] = sampler.walkers.log_pdf
+
+            step_size = sampler.step_size
+            if torch.is_tensor(step_size):
+                step_size = step_size.detach().clone()
+
+            results.put((rank, {'samples': samples.clone(),
+                                'step_size': step_size,
+                                'tau': sampler.tau,
+                                'ess': sampler.ess}))
+
+        except Exception as error:
+            results.put((rank, error))
+
+
+class ParallelSampler(SamplerBase):
+
+    def __init__(self, sampler, nprocs=None, start_method='spawn'):
+        """Shard the walkers of a sampler across local worker processes
+
+        Each worker process holds a copy of the sampler and of the wave
+        function and samples its own shard of walkers. The positions and
+        log pdf of the walkers are exchanged via shared memory tensors and
+        the parameters of the wave function are copied in shared memory
+        before each sampling, i.e. after each optimizer step.
+
+        The workers always sample the density of their wave function and
+        run on cpu with a single thread each. The processes are spawned by
+        default: forking a process that already ran multi-threaded torch
+        operations can hang. 'fork' starts faster and remains available,
+        'spawn' and 'forkserver' require the main script to be protected
+        by if __name__ == '__main__'.
+
+        Arguments:
+            sampler {SamplerBase} -- sampler to distribute
+
+        Keyword Arguments:
+            nprocs {int} -- number of worker processes,
+                            None for the number of cores (default: {None})
+            start_method {str} -- start method of the processes,
+                                  'spawn', 'forkserver' or 'fork' (default: {'spawn'})
+        """
+
+        SamplerBase.__init__(self, sampler.nwalkers, sampler.nstep,
+                             sampler.step_size, sampler.nelec,
+                             sampler.ndim, sampler.walkers.init_domain,
+                             sampler.movedict, sampler.wf)
+        self.sampler = sampler
+
+        if nprocs is None:
+            nprocs = os.cpu_count()
+        self.nprocs = max(1, min(nprocs, sampler.nwalkers))
+        self.start_method = start_method
+
+        self._procs = None
+        self._tasks = None
+        self._results = None
+        self._state = None
+        self._pos = None
+        self._log_pdf = None
+
+    @property
+    def adaptive_step(self):
+        """True if the workers adapt the step size."""
+        return self.sampler.adaptive_step
+
+    def generate(self, pdf=None, ntherm=10, ndecor=100, pos=None,
+                 with_tqdm=True):
+        """Sample the density of the wave function with all the workers
+
+        Arguments:
+            pdf {callable} -- unused, the workers sample the density of
+                              their copy of the wave function
+
+        Keyword Arguments:
+            ntherm {int} -- number of step before thermalization (default: {10})
+            ndecor {int or str} -- number of steps for decorrelation (default: {100})
+            pos {torch.tensor} -- position to start with (default: {None})
+            with_tqdm {bool} -- print the statistics (default: {True})
+
+        Returns:
+            torch.tensor -- positions of the walkers [nblock*nwalkers, nelec*ndim]
+        """
+
+        if self.cuda:
+            raise ValueError('ParallelSampler only runs on cpu')
+
+        if self._procs is None:
+            self.start()
+
+        self.broadcast_parameters()
+
+        self.walkers.nwalkers = self.nwalkers
+        self.walkers.initialize(pos=pos)
+        pos = self.walkers.pos
+
+        # shared memory positions
+        if self._pos is None or self._pos.shape != pos.shape:
+            self._pos = pos.detach().clone().share_memory_()
+            self._log_pdf = torch.zeros(pos.shape[0]).share_memory_()
+        else:
+            self._pos.copy_(pos)
+
+        shards = self._get_shards(pos.shape[0])
+        for rank, shard in enumerate(shards):
+            settings = {'nstep': self.nstep,
+                        'step_size': self._shard_step_size(shard),
+                        'ntherm': ntherm,
+                        'ndecor': ndecor}
+            self._tasks[rank].put((self._state, self._pos, self._log_pdf,
+                                   shard, settings))
+
+        out = [None] * len(shards)
+        for _ in shards:
+            rank, res = self._results.get()
+            if isinstance(res, Exception):
+                raise res
+            out[rank] = res
+
+        self.walkers.pos = self._pos.clone()
+        self.walkers.log_pdf = self._log_pdf.clone()
+        self._gather_step_size([o['step_size'] for o in out])
+
+        self.tau = np.mean([o['tau'] for o in out])
+        self.ess = np.sum([o['ess'] for o in out])
+        if with_tqdm:
+            print('Autocorrelation time %1.3f' % self.tau)
+            print('Effective sample size %d' % self.ess)
+
+        return self._gather_samples(
+            [o['samples'] for o in out], shards)
+
+    def start(self):
+        """Start the worker processes."""
+
+        ctx = mp.get_context(self.start_method)
+        self._tasks = [ctx.SimpleQueue() for _ in range(self.nprocs)]
+        self._results = ctx.SimpleQueue()
+
+        self.broadcast_parameters()
+
+        seed = int(torch.randint(2**30, (1,)))
+        self._procs = []
+        for rank in range(self.nprocs):
+            self.sampler.wf = self.wf
+            sampler = copy.deepcopy(self.sampler)
+            p = ctx.Process(target=_worker,
+                            args=(rank, sampler, seed,
+                                  torch.get_default_dtype(),
+                                  self._tasks[rank], self._results),
+                            daemon=True)
+            p.start()
+            self._procs.append(p)
+
+    def close(self):
+        """Stop the worker processes."""
+        if getattr(self, '_procs', None) is None:
+            return
+        for q in self._tasks:
+            q.put(None)
+        for p in self._procs:
+            p.join()
+        self._procs = None
+
+    def __del__(self):
+        self.close()
+
+    def broadcast_parameters(self):
+        """Copy the state of the wave function in shared memory."""
+        state = self.wf.state_dict()
+        if self._state is None or self._state.keys() != state.keys():
+            self._state = {k: v.detach().to('cpu').clone().share_memory_()
+                           for k, v in state.items()}
+        else:
+            for k, v in state.items():
+                self._state[k].copy_(v)
+
+    def _get_shards(self, nwalkers):
+        """Contiguous slices of walkers of each worker
+
+        Arguments:
+            nwalkers {int} -- total number of walkers
+
+        Returns:
+            list -- slices of the walkers of each worker
+        """
+        bounds = np.linspace(0, nwalkers, min(self.nprocs, nwalkers) + 1)
+        bounds = bounds.astype(int)
+        return [slice(i, j) for i, j in zip(bounds[:-1], bounds[1:])]
+
+    def _shard_step_size(self, shard):
+        """Step size of the walkers of a shard."""
+        step = self.step_size
+        if torch.is_tensor(step) and step.dim() == 2 and \
+                step.shape[0] == self.walkers.pos.shape[0]:
+            return step[shard].clone()
+        return step
+
+    def _gather_step_size(self, steps):
+        """Combine the step sizes adapted by the workers."""
+        if not torch.is_tensor(steps[0]):
+            self.step_size = float(np.mean(steps))
+        elif steps[0].dim() == 2:
+            self.step_size = torch.cat(steps)
+        else:
+            self.step_size = torch.stack(steps).mean(0)
+
+    def _gather_samples(self, samples, shards):
+        """Interleave the samples of the workers as in a serial run
+
+        Arguments:
+            samples {list} -- samples of each worker [nblock*nw_shard, ndim]
+            shards {list} -- slices of the walkers of each worker
+
+        Returns:
+            torch.tensor -- samples [nblock*nwalkers, ndim]
+        """
+        nw = [s.stop - s.start for s in shards]
+        nblock = min(len(s) // n for s, n in zip(samples, nw))
+        ndim = samples[0].shape[-1]
+        blocks = [s.view(-1, n, ndim)[-nblock:] for s, n in zip(samples, nw)]
+        return torch.cat(blocks, 1).view(-1, ndim)
@@ -0,0 +1,146 @@
+import os
+import torch
+import numpy as np
+
+
+class SampleStorage(object):
+
+    def __init__(self):
+        """Preallocated in-memory storage of the sampled positions.
+
+        The storage is allocated once per trajectory from the number of
+        stored steps and filled as the sampling progresses.
+        """
+        self.data = None
+        self.nsample = 0
+        self.on_disk = False
+
+    def allocate(self, nblock, nwalkers, ndim):
+        """Allocate the storage
+
+        Arguments:
+            nblock {int} -- number of stored steps
+            nwalkers {int} -- number of walkers
+            ndim {int} -- number of coordinates per walker
+        """
+        self.data = torch.zeros(nblock * nwalkers, ndim)
+        self.nsample = 0
+
+    def append(self, pos):
+        """Store the current positions of the walkers
+
+        Arguments:
+            pos {torch.tensor} -- positions of the walkers [nwalkers, ndim]
+        """
+        n = pos.shape[0]
+        self.data[self.nsample:self.nsample + n] = pos.detach().to('cpu')
+        self.nsample += n
+
+    def get(self):
+        """Return the stored positions
+
+        Returns:
+            torch.tensor -- positions [nsample, ndim]
+        """
+        if self.nsample < self.data.shape[0]:
+            return self.data[:self.nsample].clone()
+        return self.data
+
+
+class NumpyStorage(SampleStorage):
+
+    def __init__(self, filename='samples.npy', chunk=10):
+        """Storage of the sampled positions in a memory mapped .npy file.
+
+        The positions are buffered and written to disk in chunks. The
+        returned tensor is backed by the memory map so that the data is
+        only read when needed. Once its positions have been returned, a
+        file is never overwritten: the following trajectories are stored in
+        new files named after filename with an increasing index
+        (samples.npy, samples_1.npy, ...). The current file is given by
+        the path attribute.
+
+        Keyword Arguments:
+            filename {str} -- name of the .npy file (default: {'samples.npy'})
+            chunk {int} -- number of stored steps per write (default: {10})
+        """
+        super(NumpyStorage, self).__init__()
+        self.filename = filename
+        self.path = filename
+        self.nfile = 0
+        self.in_use = False
+        self.chunk = chunk
+        self.buffer = []
+        self.nbuffer = 0
+        self.on_disk = True
+
+    def allocate(self, nblock, nwalkers, ndim):
+        """Create the memory mapped file
+
+        Arguments:
+            nblock {int} -- number of stored steps
+            nwalkers {int} -- number of walkers
+            ndim {int} -- number of coordinates per walker
+        """
+        dtype = {torch.float32: np.float32,
+                 torch.float64: np.float64}[torch.get_default_dtype()]
+
+        # the tensors returned by get are backed by the current file
+        if self.in_use:
+            self.nfile += 1
+            root, ext = os.path.splitext(self.filename)
+            self.path = '%s_%d%s' % (root, self.nfile, ext)
+            self.in_use = False
+
+        self.data = None
+        self.data = np.lib.format.open_memmap(
+            self.path, mode='w+', dtype=dtype,
+            shape=(nblock * nwalkers, ndim))
+
+        self.buffer = []
+        self.nbuffer = 0
+        self.nsample = 0
+
+    def append(self, pos):
+        """Buffer the current positions and write them when the chunk is full
+
+        Arguments:
+            pos {torch.tensor} -- positions of the walkers [nwalkers, ndim]
+        """
+        self.buffer.append(pos.detach().to('cpu').numpy().copy())
+        self.nbuffer += pos.shape[0]
+        if len(self.buffer) >= self.chunk:
+            self._flush()
+
+    def get(self):
+        """Return the stored positions
+
+        Returns:
+            torch.tensor -- positions [nsample, ndim] backed by the file
+        """
+        self._flush()
+        self.in_use = True
+        return torch.from_numpy(self.data[:self.nsample])
+
+    def _flush(self):
+        """Write the buffered positions to disk."""
+        if self.nbuffer == 0:
+            return
+        self.data[self.nsample:self.nsample + self.nbuffer] = \
+            np.concatenate(self.buffer)
+        self.data.flush()
+        self.nsample += self.nbuffer
+        self.buffer = []
+        self.nbuffer = 0
+
+
+def load_samples(filename):
+    """Load positions stored by NumpyStorage without reading the file
+
+    Arguments:
+        filename {str} -- name of the .npy file
+
+    Returns:
+        torch.tensor -- positions [nsample, ndim] backed by the file
+    """
+    return torch.from_numpy(np.load(filename, mmap_mode='c'))
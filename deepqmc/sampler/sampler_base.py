@@ -1,10 +1,14 @@
 import torch
 from deepqmc.sampler.walkers import Walkers
+from deepqmc.sampler.sample_storage import SampleStorage
+from deepqmc.sampler.step_size import StepSizeController
+from deepqmc.sampler.autocorrelation import Autocorrelation
 
 
 class SamplerBase(object):
 
-    def __init__(self, nwalkers, nstep, step_size, nelec, ndim, init, move):
+    def __init__(self, nwalkers, nstep, step_size,
+                 nelec, ndim, init, move, wf=None):
         """Base class for the sampler.
 
         Arguments:
@@ -15,6 +19,9 @@ class SamplerBase(object):
             ndim {int} -- number of dimension per elec
             init {dict} -- method/data to initialize th walkers
             move {dict} -- method/data to perform the move
+
+        Keyword Arguments:
+            wf {WaveFunction} -- wave function to sample (default: {None})
         """
 
         self.nwalkers = nwalkers
@@ -23,11 +30,286 @@ class SamplerBase(object):
         self.nstep = nstep
         self.step_size = step_size
         self.movedict = move
+        self.wf = wf
         self.cuda = False
         self.device = torch.device('cpu')
 
         self.walkers = Walkers(
             nwalkers=nwalkers, nelec=nelec, ndim=ndim, init=init)
 
+        # storage of the sampled positions
+        # see sample_storage.py
+        self.storage = SampleStorage()
+
+        # adaptation of the step size during the thermalization
+        # see set_adaptive_step
+        self.step_controller = None
+
+        # online estimate of the autocorrelation time
+        # see autocorrelation.py
+        self.autocorr = Autocorrelation()
+        self.tau = None
+        self.ess = None
+
     def generate(self, pdf):
         raise NotImplementedError()
+
+    def get_snapshot(self):
+        """Get a snapshot of the sampler
+
+        The snapshot contains the positions of the walkers,
+        the step size and the state of the random number generators so
+        that a new run can resume from an equilibrated population.
+
+        Returns:
+            dict -- snapshot of the sampler
+        """
+        step_size = self.step_size
+        if torch.is_tensor(step_size):
+            step_size = step_size.detach().to('cpu').clone()
+
+        snapshot = {'walkers': self.walkers.get_snapshot(),
+                    'step_size': step_size,
+                    'rng_state': torch.get_rng_state()}
+        if torch.cuda.is_available():
+            snapshot['cuda_rng_state'] = torch.cuda.get_rng_state_all()
+        return snapshot
+
+    def save_snapshot(self, filename):
+        """Save a snapshot of the sampler
+
+        Arguments:
+            filename {str} -- name of the file
+        """
+        torch.save(self.get_snapshot(), filename)
+
+    def load_snapshot(self, snapshot, restore_rng=True):
+        """Load a snapshot of the sampler
+
+        The next call to generate without positions
+        starts from the walkers of the snapshot.
+
+        Arguments:
+            snapshot {dict or str} -- snapshot or name of the file
+
+        Keyword Arguments:
+            restore_rng {bool} -- restore the state of the random
+                                  number generators (default: {True})
+        """
+        if isinstance(snapshot, str):
+            snapshot = torch.load(snapshot)
+
+        self.walkers.load_snapshot(snapshot['walkers'])
+        self.step_size = snapshot['step_size']
+
+        if restore_rng:
+            torch.set_rng_state(snapshot['rng_state'])
+            if 'cuda_rng_state' in snapshot and torch.cuda.is_available():
+                torch.cuda.set_rng_state_all(snapshot['cuda_rng_state'])
+
+    def set_adaptive_step(self, target=0.5, mode='global', gain=1.):
+        """Tune the step size during the thermalization
+
+        The step size is adapted toward the target acceptance rate during
+        the ntherm first steps of each trajectory and then frozen.
+        The final value is kept in self.step_size and reused as the
+        starting point of the next trajectory.
+
+        Keyword Arguments:
+            target {float} -- target acceptance rate (default: {0.5})
+            mode {str} -- 'global', 'walker' or 'electron' (default: {'global'})
+            gain {float} -- initial gain of the adaptation (default: {1.})
+
+        Raises:
+            ValueError: if mode is 'electron' without single electron moves
+        """
+        if mode == 'electron':
+            move = self.movedict or {}
+            if move.get('type', None) not in ['one-elec', 'all-elec-iter']:
+                raise ValueError(
+                    'Step size per electron requires single electron moves')
+
+        self.step_controller = StepSizeController(
+            target=target, mode=mode, gain=gain)
+
+    @property
+    def adaptive_step(self):
+        """True if the step size is adapted during the thermalization."""
+        return self.step_controller is not None
+
+    def _init_step_size(self):
+        """Initialize the adaptation of the step size."""
+        if self.step_controller is not None:
+            self.step_size = self.step_controller.initialize(
+                self.step_size, self.walkers.nwalkers, self.nelec)
+
+    def _adapt_step_size(self, accepted, istep, ntherm, index=None):
+        """Update the step size if still in the thermalization
+
+        Arguments:
+            accepted {torch.tensor} -- boolean mask of the accepted moves [nwalkers]
+            istep {int} -- current step
+            ntherm {int} -- number of thermalization steps
+
+        Keyword Arguments:
+            index {torch.LongTensor} -- index of the moved electrons (default: {None})
+        """
+        if self.step_controller is not None and istep < ntherm:
+            self.step_size = self.step_controller.update(accepted, index)
+
+    def _walker_step_size(self, index=None):
+        """Get the step size of each walker
+
+        A per walker step size is stored as a tensor [nwalkers, 1] and a
+        per electron step size as a tensor [nelec].
+
+        Keyword Arguments:
+            index {torch.LongTensor} -- index of the moved electron in each walker,
+                                        None for all electron moves (default: {None})
+
+        Returns:
+            float or torch.tensor -- step size [nwalkers, 1] or [1, nelec*ndim]
+        """
+        step = self.step_size
+        if not torch.is_tensor(step):
+            return step
+
+        if step.dim() == 2:
+            if step.shape[0] != self.walkers.nwalkers:
+                return step.mean().item()
+            return step.to(self.device)
+
+        if index is None:
+            return step.repeat_interleave(self.ndim).view(1, -1).to(self.device)
+        return step.to(self.device)[index].view(-1, 1)
+
+    def _print_step_size(self):
+        """Print the step size obtained at the end of the adaptation."""
+        if self.step_controller is None:
+            return
+        if torch.is_tensor(self.step_size):
+            print('Step size : mean %1.3f min %1.3f max %1.3f' %
+                  (self.step_size.mean(), self.step_size.min(),
+                   self.step_size.max()))
+        else:
+            print('Step size : %1.3f' % self.step_size)
+
+    def _init_storage(self, ntherm, ndecor):
+        """Allocate the storage of the sampled positions
+
+        Arguments:
+            ntherm {int} -- number of thermalization steps
+            ndecor {int} -- number of steps between two stored positions
+        """
+        self.nblock = len(range(ntherm, self.nstep, ndecor))
+        self.storage.allocate(self.nblock, self.walkers.nwalkers,
+                              self.nelec * self.ndim)
+
+    def _update_decorrelation(self, istep, ntherm, ndecor):
+        """Handle the autocorrelation estimate at the start of a step
+
+        The estimate is restarted in the middle of the thermalization to
+        discard the initial transient. At the end of the thermalization
+        ndecor is chosen from the autocorrelation time if ndecor='auto',
+        the storage is allocated and the estimate is restarted to measure
+        the effective sample size of the production steps.
+
+        Arguments:
+            istep {int} -- current step
+            ntherm {int} -- number of thermalization steps
+            ndecor {int or str} -- number of steps between two stored
+                                   positions or 'auto'
+
+        Returns:
+            int or str -- number of steps between two stored positions
+        """
+        if istep == ntherm // 2:
+            self.autocorr.reset(self.walkers.nwalkers)
+
+        if istep == ntherm:
+            if ndecor == 'auto':
+                ndecor = self.autocorr.get_ndecor()
+            self._init_storage(ntherm, ndecor)
+            self.autocorr.reset(self.walkers.nwalkers)
+
+        return ndecor
+
+    def _get_effective_sample_size(self, with_tqdm=True):
+        """Compute the autocorrelation time and effective sample size
+        of the production steps
+
+        Keyword Arguments:
+            with_tqdm {bool} -- print the values (default: {True})
+        """
+        self.tau = self.autocorr.integrated_time()
+        self.ess = self.autocorr.effective_sample_size(self.nblock)
+        if with_tqdm:
+            print('Autocorrelation time %1.3f' % self.tau)
+            print('Effective sample size %d / %d' %
+                  (self.ess, self.nblock * self.walkers.nwalkers))
+
+    def get_log_pdf(self, pdf):
+        """Get a callable returning the log of the pdf
+
+        If pdf is the density of the wave function attached to the sampler,
+        the log domain evaluation of the wave function is used.
+
+        Arguments:
+            pdf {callable} -- probability distribution function
+
+        Returns:
+            callable -- log of the probability distribution function
+        """
+        if self.wf is not None and pdf == self.wf.pdf:
+            return self.wf.log_pdf
+        return lambda x: torch.log(pdf(x))
+
+    def get_log_pdf_and_grad(self, pdf):
+        """Get a callable returning the log of the pdf and its gradient
+
+        If pdf is the density of the wave function attached to the sampler,
+        both quantities are obtained in a single pass of the wave function.
+        Otherwise the gradient is computed with autograd.
+
+        Arguments:
+            pdf {callable} -- probability distribution function
+
+        Returns:
+            callable -- x -> log pdf [nbatch], grad log pdf [nbatch, nelec*ndim]
+        """
+        if self.wf is not None and pdf == self.wf.pdf:
+
+            def log_pdf_and_grad(x):
+                with torch.no_grad():
+                    log_psi, grad_log_psi = self.wf.log_psi_and_grad(x)
+                return 2 * log_psi, 2 * grad_log_psi
+
+        else:
+            log_pdf = self.get_log_pdf(pdf)
+
+            def log_pdf_and_grad(x):
+                with torch.enable_grad():
+                    x = x.detach().requires_grad_(True)
+                    val = log_pdf(x).view(-1)
+                    grad_val = torch.autograd.grad(
+                        val, x, grad_outputs=torch.ones_like(val))[0]
+                return val.detach(), grad_val.detach()
+
+        return log_pdf_and_grad
+
+    @staticmethod
+    def _log_ratio(log_fxn, log_fx):
+        """Log of the ratio of the pdf values.
+
+        Moves between two points of zero density are accepted.
+
+        Arguments:
+            log_fxn {torch.tensor} -- log pdf at the new positions
+            log_fx {torch.tensor} -- log pdf at the old positions
+
+        Returns:
+            torch.tensor -- log of fxn/fx
+        """
+        log_ratio = log_fxn - log_fx
+        log_ratio[torch.isinf(log_fxn) & torch.isinf(log_fx)] = 0.
+        return log_ratio
@@ -0,0 +1,190 @@
+import math
+import torch
+
+
+class StepSizeController(object):
+
+    def __init__(self, target=0.5, mode='global', gain=1., decay=0.6):
+        """Tune the step size of a sampler toward a target acceptance rate.
+
+        The log of the step size follows a Robbins-Monro iteration :
+
+        .. math::
+            \\log s_{t+1} = \\log s_t + \\gamma_t (a_t - a^*)
+            \\gamma_t = g / (t+1)^{\\kappa}
+
+        with a_t the acceptance of the last move. The adaptation is only
+        meant to be used during the thermalization, the step size is then
+        frozen to preserve detailed balance.
+
+        Keyword Arguments:
+            target {float} -- target acceptance rate (default: {0.5})
+            mode {str} -- 'global' : one step size for all walkers
+                          'walker' : one step size per walker
+                          'electron' : one step size per electron
+                          (default: {'global'})
+            gain {float} -- initial gain of the iteration (default: {1.})
+            decay {float} -- decay exponent of the gain (default: {0.6})
+        """
+
+        if mode not in ['global', 'walker', 'electron']:
+            raise ValueError(
+                "mode should be 'global', 'walker' or 'electron'")
+
+        self.target = target
+        self.mode = mode
+        self.gain = gain
+        self.decay = decay
+
+        self.log_step = None
+        self.niter = 0
+
+    def initialize(self, step_size, nwalkers, nelec):
+        """Initialize the log step size
+
+        Arguments:
+            step_size {float or torch.tensor} -- current step size
+            nwalkers {int} -- number of walkers
+            nelec {int} -- number of electrons
+
+        Returns:
+            float or torch.tensor -- step size
+        """
+
+        self.niter = 0
+        shape = {'global': None,
+                 'walker': (nwalkers, 1),
+                 'electron': (nelec,)}[self.mode]
+
+        if torch.is_tensor(step_size) and shape is not None \
+                and step_size.shape == shape:
+            self.log_step = torch.log(step_size.clone())
+
+        else:
+            if torch.is_tensor(step_size):
+                step_size = step_size.mean().item()
+            if shape is None:
+                self.log_step = math.log(step_size)
+            else:
+                self.log_step = math.log(step_size) * torch.ones(shape)
+
+        return self.get_step_size()
+
+    def update(self, accepted, index=None):
+        """Update the step size from the accepted moves
+
+        Arguments:
+            accepted {torch.tensor} -- boolean mask of the accepted moves [nwalkers]
+
+        Keyword Arguments:
+            index {torch.LongTensor} -- index of the moved electron in each walker
+                                        (needed for mode='electron') (default: {None})
+
+        Returns:
+            float or torch.tensor -- new step size
+        """
+
+        gamma = self.gain / (self.niter + 1)**self.decay
+        acc = accepted.to('cpu').type(torch.get_default_dtype())
+
+        if self.mode == 'global':
+            self.log_step += gamma * (acc.mean().item() - self.target)
+
+        elif self.mode == 'walker':
+            self.log_step += gamma * (acc.view(-1, 1) - self.target)
+
+        elif self.mode == 'electron':
+
+            if index is None:
+                raise ValueError(
+                    'Step size per electron requires single electron moves')
+
+            index = index.to('cpu')
+            count = torch.zeros_like(self.log_step).index_add_(
+                0, index, torch.ones_like(acc))
+            nacc = torch.zeros_like(self.log_step).index_add_(
+                0, index, acc)
+
+            moved = count > 0
+            self.log_step[moved] += gamma * \
+                (nacc[moved] / count[moved] - self.target)
+
+        self.niter += 1
+        return self.get_step_size()
+
+    def get_step_size(self):
+        """Get the current step size
+
+        Returns:
+            float or torch.tensor -- step size
+        """
+        if self.mode == 'global':
+            return math.exp(self.log_step)
+        return torch.exp(self.log_step)
+
+
+class DualAveraging(object):
+
+    def __init__(self, target=0.65, gamma=0.05, t0=10, kappa=0.75):
+        """Dual averaging of the step size (Hoffman & Gelman 2014).
+
+        .. math::
+            \\bar{H}_t = (1 - \\frac{1}{t+t_0}) \\bar{H}_{t-1}
+                        + \\frac{1}{t+t_0} (\\delta - \\alpha_t)
+            \\log s_t = \\mu - \\frac{\\sqrt{t}}{\\gamma} \\bar{H}_t
+            \\log \\bar{s}_t = t^{-\\kappa} \\log s_t
+                              + (1 - t^{-\\kappa}) \\log \\bar{s}_{t-1}
+
+        The averaged step size \\bar{s} is used once the adaptation is over.
+
+        Keyword Arguments:
+            target {float} -- target acceptance probability (default: {0.65})
+            gamma {float} -- shrinkage of the step size toward mu (default: {0.05})
+            t0 {int} -- stabilization of the first iterations (default: {10})
+            kappa {float} -- decay of the averaging weights (default: {0.75})
+        """
+        self.target = target
+        self.gamma = gamma
+        self.t0 = t0
+        self.kappa = kappa
+        self.initialize(1.)
+
+    def initialize(self, step_size):
+        """Restart the adaptation from a step size
+
+        Arguments:
+            step_size {float} -- initial step size
+        """
+        self.mu = math.log(10. * step_size)
+        self.hbar = 0.
+        self.log_step = math.log(step_size)
+        self.log_step_bar = math.log(step_size)
+        self.niter = 0
+
+    def update(self, accept_prob):
+        """Update the step size
+
+        Arguments:
+            accept_prob {float} -- mean acceptance probability of the last move
+
+        Returns:
+            float -- new step size
+        """
+        self.niter += 1
+        eta = 1. / (self.niter + self.t0)
+        self.hbar = (1. - eta) * self.hbar + \
+            eta * (self.target - accept_prob)
+        self.log_step = self.mu - math.sqrt(self.niter) / \
+            self.gamma * self.hbar
+        w = self.niter**(-self.kappa)
+        self.log_step_bar = w * self.log_step + \
+            (1. - w) * self.log_step_bar
+        return math.exp(self.log_step)
+
+    def get_final_step_size(self):
+        """Averaged step size to use after the adaptation
+
+        Returns:
+            float -- step size
+        """
+        return math.exp(self.log_step_bar)
@@ -24,6 +24,12 @@ class Walkers(object):
         self.pos = None
         self.status = None
 
+        # log pdf of the current positions
+        self.log_pdf = None
+
+        # restart from a snapshot
+        self.resume = False
+
         self.cuda = False
         self.device = torch.device('cpu')
 
@@ -42,6 +48,9 @@ class Walkers(object):
         if self.cuda:
             self.device = torch.device('cuda')
 
+        if pos is None and self.resume:
+            pos = self._resume_positions()
+
         if pos is not None:
             if len(pos) > self.nwalkers:
                 pos = pos[-self.nwalkers:, :]
@@ -64,6 +73,45 @@ class Walkers(object):
             else:
                 raise ValueError('Init walkers not recognized')
 
+    def get_snapshot(self):
+        """Get a snapshot of the walkers
+
+        The log pdf is not saved, it depends on the parameters of the
+        wave function and is recomputed when the sampling resumes.
+
+        Returns:
+            dict -- positions of the walkers
+        """
+        pos = None if self.pos is None else self.pos.detach().to('cpu').clone()
+        return {'pos': pos}
+
+    def load_snapshot(self, snapshot):
+        """Load a snapshot of the walkers
+
+        The next initialization without positions starts
+        from the positions of the snapshot.
+
+        Arguments:
+            snapshot {dict} -- snapshot obtained with get_snapshot()
+        """
+        self.pos = snapshot['pos']
+        self.log_pdf = None
+        self.resume = self.pos is not None
+
+    def _resume_positions(self):
+        """Positions of the snapshot, duplicating random walkers
+        if the snapshot contains less walkers than needed.
+
+        Returns:
+            torch.tensor -- positions of the walkers
+        """
+        self.resume = False
+        pos = self.pos.type(torch.get_default_dtype())
+        if len(pos) < self.nwalkers:
+            idx = torch.randint(len(pos), (self.nwalkers - len(pos),))
+            pos = torch.cat((pos, pos[idx]))
+        return pos.to(device=self.device)
+
     def _init_center(self):
         """Initialize the walkers at the center of the molecule
 
@@ -107,38 +155,52 @@ class Walkers(object):
     def _init_atomic(self):
         """Initialize the walkers around the atoms
 
+        The electrons of all the walkers are randomly assigned to the atoms
+        at once and displaced with a gaussian noise whose width depends on
+        the shell of the electron (1/Z for the first electron of an atom,
+        2/(Z-2) for the next four and 3/(Z-10) for the others).
+
         Returns:
             torch.tensor -- positions of the walkers
         """
-        pos = torch.zeros(self.nwalkers, self.nelec * self.ndim)
-        idx_ref, nelec_tot = [], 0
-
-        nelec_placed, natom = [], 0
-        for iat, nelec in enumerate(self.init_domain['atom_nelec']):
-            idx_ref += [iat] * nelec
-            nelec_tot += nelec
-            natom += 1
-
-        for iw in range(self.nwalkers):
-
-            nelec_placed = [0] * natom
-            idx = torch.tensor(idx_ref)
-            idx = idx[torch.randperm(nelec_tot)]
-            xyz = torch.tensor(
-                self.init_domain['atom_coords'])[
-                idx, :]
-
-            for ielec in range(nelec_tot):
-                _idx = idx[ielec]
-                if nelec_placed[_idx] == 0:
-                    s = 1. / self.init_domain['atom_num'][_idx]
-                elif nelec_placed[_idx] < 5:
-                    s = 2. / (self.init_domain['atom_num'][_idx] - 2)
-                else:
-                    s = 3. / (self.init_domain['atom_num'][_idx] - 10)
-                xyz[ielec,
-                    :] += np.random.normal(scale=s, size=(1, 3))
-                nelec_placed[_idx] += 1
-
-            pos[iw, :] = xyz.view(-1)
-        return pos
+        dtype = torch.get_default_dtype()
+
+        atom_coords = torch.as_tensor(
+            np.array(self.init_domain['atom_coords']), dtype=dtype,
+            device=self.device)
+        atom_num = torch.as_tensor(
+            np.array(self.init_domain['atom_num']), dtype=dtype,
+            device=self.device)
+        atom_nelec = torch.as_tensor(
+            self.init_domain['atom_nelec'], device=self.device)
+        natom = len(atom_nelec)
+
+        # index of the atom of each electron
+        # in a random order for each walker
+        # -> (Nwalkers, Nelec)
+        idx_ref = torch.repeat_interleave(
+            torch.arange(natom, device=self.device), atom_nelec)
+        perm = torch.argsort(torch.rand(
+            self.nwalkers, len(idx_ref), device=self.device), dim=1)
+        idx = idx_ref[perm]
+
+        # number of electrons placed on the same atom before each electron
+        # -> (Nwalkers, Nelec)
+        onehot = (idx.unsqueeze(-1) == torch.arange(
+            natom, device=self.device)).long()
+        rank = (torch.cumsum(onehot, 1) - onehot).gather(
+            -1, idx.unsqueeze(-1)).squeeze(-1)
+
+        # width of the gaussian depending on the shell
+        # the denominators are bounded to avoid negative/infinite width
+        z = atom_num[idx]
+        s = torch.where(rank == 0, 1. / z,
+                        torch.where(rank < 5,
+                                    2. / (z - 2).clamp(min=1),
+                                    3. / (z - 10).clamp(min=1)))
+
+        pos = atom_coords[idx] + s.unsqueeze(-1) * torch.randn(
+            self.nwalkers, len(idx_ref), self.ndim, dtype=dtype,
+            device=self.device)
+
+        return pos.view(self.nwalkers, -1)
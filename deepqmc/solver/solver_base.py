@@ -3,6 +3,8 @@ from types import SimpleNamespace
 from tqdm import tqdm
 import numpy as np
 
+from deepqmc.sampler.parallel import ParallelSampler
+
 
 class SolverBase(object):
 
@@ -17,6 +19,8 @@ class SolverBase(object):
         """
         self.wf = wf
         self.sampler = sampler
+        if self.sampler.wf is None:
+            self.sampler.wf = wf
         self.opt = optimizer
         self.scheduler = scheduler
         self.cuda = False
@@ -24,6 +28,12 @@ class SolverBase(object):
         self.task = None
         self.obs_dict = {}
 
+        # values of the wf used to sample the current walkers
+        self.psi0 = None
+
+        # gradient of the atomic positions in geo_opt
+        self.forces = 'autograd'
+
         # penalty to orthogonalize the MO
         # see torch_utils.py
         self.ortho_mo = False
@@ -55,7 +65,8 @@ class SolverBase(object):
 
     def resampling(self, ntherm=-1, nstep=100, step_size=None,
                    resample_from_last=True,
-                   resample_every=1, tqdm=False):
+                   resample_every=1, tqdm=False,
+                   ess_threshold=None):
         """Configure the resampling.
 
         Keyword Arguments:
@@ -65,27 +76,47 @@ class SolverBase(object):
             resample_from_last {bool} -- Use previous positions as starting point (default: {True})
             resample_every {int} -- Number of optimization step between resampling (default: {1})
             tqdm {bool} -- use tqdm (default: {False})
+            ess_threshold {float} -- keep the walkers until the effective sample size of
+                                     the reweighting factors (psi/psi0)^2 drops below
+                                     ess_threshold * nwalkers, requires a weighted
+                                     loss (default: {None})
         """
 
         self.resample = SimpleNamespace()
         self.resample.ntherm = ntherm
         self.resample.resample = nstep
 
-        if step_size is not None:
-            self.resample.step_size = step_size
-        else:
-            self.resample.step_size = self.sampler.step_size
+        # if None the current step size of the sampler is used
+        # e.g. the one obtained by the adaptation of the step size
+        self.resample.step_size = step_size
 
         self.resample.resample_from_last = resample_from_last
         self.resample.resample_every = resample_every
         self.resample.tqdm = tqdm
+        self.resample.ess_threshold = ess_threshold
+        self.resample.ncall = 0
 
-    def configure(self, task='wf_opt', freeze=None):
+    def parallel_sampling(self, nprocs=None):
+        """Shard the walkers of the sampler across local processes.
+
+        The sampling of sample/_resample is then distributed
+        transparently over the worker processes, see ParallelSampler.
+
+        Keyword Arguments:
+            nprocs {int} -- number of processes, None for the number of cores (default: {None})
+        """
+        if not isinstance(self.sampler, ParallelSampler):
+            self.sampler = ParallelSampler(self.sampler, nprocs=nprocs)
+
+    def configure(self, task='wf_opt', freeze=None, forces='autograd'):
         """Configure the solver
 
         Keyword Arguments:
             task {str} -- task to perform (geo_opt, wf_opt) (default: {'wf_opt'})
             freeze {list} -- parameters to freeze (ao, mo, jastrow, ci) (default: {None})
+            forces {str} -- gradient of the atomic positions in geo_opt (default: {'autograd'})
+                            'autograd' : backpropagation through the local energy
+                            'hellmann-feynman' : analytic Hellmann-Feynman forces
 
         Raises:
             ValueError: if freeze does not good is
@@ -93,8 +124,15 @@ class SolverBase(object):
 
         self.task = task
 
+        if forces not in ['autograd', 'hellmann-feynman']:
+            raise ValueError(
+                "forces should be 'autograd' or 'hellmann-feynman'")
+        self.forces = forces
+
         if task == 'geo_opt':
-            self.wf.ao.atom_coords.requires_grad = True
+            # the hellmann-feynman forces are set as gradients
+            # without backpropagation through the local energy
+            self.wf.ao.atom_coords.requires_grad = forces == 'autograd'
 
             self.wf.ao.bas_coeffs.requires_grad = False
             self.wf.ao.bas_exp.requires_grad = False
@@ -137,7 +175,7 @@ class SolverBase(object):
 
         Keyword Arguments:
             ntherm {int} -- Number of MC steps needed to termalize (default: {-1})
-            ndecor {int} -- number of MC step for decorelation (default: {100})
+            ndecor {int or str} -- number of MC step for decorelation, 'auto' to use the autocorrelation time (default: {100})
         """
 
         self.initial_sample = SimpleNamespace()
@@ -175,7 +213,7 @@ class SolverBase(object):
 
         Keyword Arguments:
             ntherm {int} -- Number of MC step for thermalization (default: {-1})
-            ndecor {int} -- Number of MC step for decorelation (default: {100})
+            ndecor {int or str} -- Number of MC step for decorelation, 'auto' to use the autocorrelation time (default: {100})
             with_tqdm {bool} -- use tqdm (default: {True})
             pos {[type]} -- initial positions of the walkers (default: {None})
 
@@ -204,8 +242,8 @@ class SolverBase(object):
         if self.resample.resample_every is not None:
 
             # resample the data
-            if (n % self.resample.resample_every == 0) or (
-                    n == nepoch - 1):
+            if ((n % self.resample.resample_every == 0) or (
+                    n == nepoch - 1)) and self._need_resampling(pos):
 
                 if self.resample.resample_from_last:
                     pos = pos.clone().detach().to(self.device)
@@ -216,13 +254,72 @@ class SolverBase(object):
                     ntherm=self.resample.ntherm,
                     with_tqdm=self.resample.tqdm)
                 self.dataloader.dataset.data = pos
+                self.resample.ncall += 1
 
-            # update the weight of the loss if needed
-            if self.loss.use_weight:
-                self.loss.weight['psi0'] = None
+                # update the weight of the loss if needed
+                if self.loss.use_weight:
+                    self.loss.weight['psi0'] = None
+                    self.psi0 = None
 
         return pos
 
+    def _need_resampling(self, pos):
+        """Check if the walkers must be resampled
+
+        Without ess_threshold the walkers are always resampled. Otherwise
+        they are kept as long as the effective sample size of the
+        reweighting factors stays above the threshold.
+
+        Arguments:
+            pos {torch.tensor} -- positions of the walkers
+
+        Returns:
+            bool -- True if the walkers must be resampled
+        """
+        if self.resample.ess_threshold is None:
+            return True
+
+        if not self.loss.use_weight:
+            raise ValueError('ess_threshold requires a weighted loss')
+
+        if self.psi0 is None:
+            return True
+
+        ess = self.reweighting_ess(pos)
+        if self.resample.tqdm:
+            print('Reweighting effective sample size %1.3f' % ess)
+        return ess < self.resample.ess_threshold
+
+    def reweighting_ess(self, pos):
+        """Relative effective sample size of the reweighting factors
+
+        .. math::
+            ESS = \\frac{(\\sum_i w_i)^2}{N \\sum_i w_i^2}
+            \\quad w_i = (\\psi(x_i) / \\psi_0(x_i))^2
+
+        Arguments:
+            pos {torch.tensor} -- positions of the walkers
+
+        Returns:
+            float -- effective sample size divided by the number of walkers
+        """
+        w = (self._get_psi(self.wf, pos) / self.psi0)**2
+        return (w.sum()**2 / (w**2).sum() / len(w)).item()
+
+    @staticmethod
+    def _get_psi(wf, pos):
+        """Values of the wave function without graph
+
+        Arguments:
+            wf {WaveFunction} -- wave function
+            pos {torch.tensor} -- positions of the walkers
+
+        Returns:
+            torch.tensor -- values of the wave function
+        """
+        with torch.no_grad():
+            return wf(pos.detach())
+
     def get_observable(
             self,
             obs_dict,
@@ -244,6 +341,14 @@ class SolverBase(object):
         if self.wf.cuda and pos.device.type == 'cpu':
             pos = pos.to(self.device)
 
+        # observables computed in a single pass of the wave function
+        evaluated = {}
+        want = [obs for obs in self.obs_dict.keys()
+                if obs in getattr(self.wf, 'evaluate_keys', [])
+                and not (obs == 'local_energy' and local_energy is not None)]
+        if len(want) > 0:
+            evaluated = self.wf.evaluate(pos, want=want)
+
         for obs in self.obs_dict.keys():
 
             # store local energy
@@ -269,6 +374,11 @@ class SolverBase(object):
                     self.obs_dict[obs +
                                   '.grad'].append(torch.zeros_like(p.data))
 
+            # store the quantities computed by evaluate
+            elif obs in evaluated:
+                data = evaluated[obs].cpu().detach().numpy()
+                self.obs_dict[obs].append(data)
+
             # store any other defined method
             elif hasattr(self.wf, obs):
                 func = self.wf.__getattribute__(obs)
@@ -340,7 +450,7 @@ class SolverBase(object):
 
     def single_point(self, pos=None, prt=True,
                      with_tqdm=True, ntherm=-1, ndecor=100,
-                     no_grad=True):
+                     no_grad=True, batchsize=None):
         """Performs a single point calculation
 
         Keyword Arguments:
@@ -348,8 +458,11 @@ class SolverBase(object):
             prt {bool} -- print the value if true (default: {True})
             with_tqdm {bool} -- use tqdm(default: {True})
             ntherm {int} -- number of MC steps for thermalisation (default: {-1})
-            ndecor {int} -- number of MC step for decorelation (default: {100})
+            ndecor {int or str} -- number of MC step for decorelation, 'auto' to use the autocorrelation time (default: {100})
             no_grad {bool} -- compute gradient (default: {True})
+            batchsize {int} -- number of positions per evaluation of the
+                               local energy. If None, all at once unless the
+                               samples are stored on disk (default: {None})
 
         Returns:
             [type] -- [description]
@@ -360,16 +473,26 @@ class SolverBase(object):
         if no_grad and self.wf.kinetic != 'auto':
             _grad = torch.no_grad()
 
+        if batchsize is None and self.sampler.storage.on_disk:
+            batchsize = self.sampler.walkers.nwalkers
+
         with _grad:
 
             if pos is None:
                 pos = self.sample(ntherm=ntherm, ndecor=ndecor,
                                   with_tqdm=with_tqdm)
 
-            if self.wf.cuda and pos.device.type == 'cpu':
-                pos = pos.to(self.device)
+            if batchsize is None:
+
+                if self.wf.cuda and pos.device.type == 'cpu':
+                    pos = pos.to(self.device)
+
+                e, s, err = self.wf._energy_variance_error(pos)
 
-            e, s, err = self.wf._energy_variance_error(pos)
+            else:
+                eloc = self._local_energy_batch(pos, batchsize)
+                e, s = torch.mean(eloc), torch.var(eloc)
+                err = self.wf.sampling_error(eloc)
 
             if prt:
                 print('Energy   : ', e.detach().item(),
@@ -378,6 +501,24 @@ class SolverBase(object):
 
         return pos, e, s
 
+    def _local_energy_batch(self, pos, batchsize):
+        """Compute the local energies by batch of positions
+
+        Only the current batch of positions is read from the storage.
+
+        Arguments:
+            pos {torch.tensor} -- positions of the walkers
+            batchsize {int} -- number of positions per batch
+
+        Returns:
+            torch.tensor -- local energies
+        """
+        eloc = []
+        for ip in torch.split(pos, batchsize):
+            ip = ip.to(self.device)
+            eloc.append(self.wf.local_energy(ip).detach())
+        return torch.cat(eloc)
+
     def save_checkpoint(self, epoch, loss, filename):
         """Save a checkpoint file
 
@@ -393,10 +534,36 @@ class SolverBase(object):
             'epoch': epoch,
             'model_state_dict': self.wf.state_dict(),
             'optimzier_state_dict': self.opt.state_dict(),
-            'loss': loss
+            'loss': loss,
+            'sampler_snapshot': self.sampler.get_snapshot()
         }, filename)
         return loss
 
+    def load_checkpoint(self, filename, restore_rng=True):
+        """Load a checkpoint file
+
+        The wave function, the optimizer and the walkers are restored so
+        that the next sampling starts from the equilibrated walkers.
+
+        Arguments:
+            filename {str} -- name of the check point file
+
+        Keyword Arguments:
+            restore_rng {bool} -- restore the state of the random
+                                  number generators (default: {True})
+
+        Returns:
+            int, float -- epoch and loss
+        """
+        data = torch.load(filename)
+        self.wf.load_state_dict(data['model_state_dict'])
+        if self.opt is not None:
+            self.opt.load_state_dict(data['optimzier_state_dict'])
+        if 'sampler_snapshot' in data:
+            self.sampler.load_snapshot(data['sampler_snapshot'],
+                                       restore_rng=restore_rng)
+        return data['epoch'], data['loss']
+
     def _append_observable(self, key, data):
         """Append a new data point to observable key.
 
@@ -422,7 +589,8 @@ class SolverBase(object):
         p = pos.view(-1, self.sampler.nwalkers, ndim)
         el = []
         for ip in tqdm(p):
-            el.append(self.wf.local_energy(ip).detach().numpy())
+            ip = ip.to(self.device)
+            el.append(self.wf.local_energy(ip).detach().cpu().numpy())
         return {'local_energy': el, 'pos': p}
 
     def print_parameters(self, grad=False):
@@ -1,7 +1,10 @@
+import copy
 import torch
 from torch.utils.data import DataLoader
+from concurrent.futures import ThreadPoolExecutor
 
 from deepqmc.solver.solver_base import SolverBase
+from deepqmc.wavefunction.fast_update import FastUpdate
 from deepqmc.utils.torch_utils import (DataSet, Loss, OrthoReg)
 
 
@@ -21,7 +24,7 @@ class SolverOrbital(SolverBase):
         SolverBase.__init__(self, wf, sampler, optimizer)
 
     def run(self, nepoch, batchsize=None, loss='variance',
-            clip_loss=False, grad='auto'):
+            clip_loss=False, grad='auto', pipeline=False):
         """Run the optimization
 
         Arguments:
@@ -33,6 +36,9 @@ class SolverOrbital(SolverBase):
                           (energy, variance, weighted-energy, weighted-variance)
             clip_loss {bool} -- Remove points above/below 5 sigma of the mean (default: {False})
             grad {str} -- Method to compute the gradient (auto, manual) (default: {'auto'})
+            pipeline {bool} -- sample the next walkers in a background thread
+                               with a snapshot of the parameters while optimizing
+                               on the current ones, requires a weighted loss (default: {False})
         """
 
         if 'lpos_needed' not in self.opt.__dict__.keys():
@@ -57,7 +63,8 @@ class SolverOrbital(SolverBase):
         _step_size_save = self.sampler.step_size
 
         self.sampler.nstep = self.resample.resample
-        self.sampler.step_size = self.resample.step_size
+        if self.resample.step_size is not None:
+            self.sampler.step_size = self.resample.step_size
 
         # create the data loader
         self.dataset = DataSet(pos)
@@ -67,6 +74,15 @@ class SolverOrbital(SolverBase):
         # get the loss
         self.loss = Loss(self.wf, method=loss, clip=clip_loss)
 
+        # the weights of the loss correct for the lag
+        # between the sampled and the optimized parameters
+        if pipeline:
+            if not self.loss.use_weight:
+                raise ValueError(
+                    'pipelined sampling requires a weighted loss')
+            executor = ThreadPoolExecutor(max_workers=1)
+        self.psi0 = None
+
         # orthogonalization penalty for the MO coeffs
         self.ortho_loss = OrthoReg()
 
@@ -83,12 +99,23 @@ class SolverOrbital(SolverBase):
 
             cumulative_loss = 0
 
+            # sample the next walkers in the background
+            if pipeline:
+                future = self._submit_resample(executor, n, nepoch, pos)
+
             # loop over the batches
             for ibatch, data in enumerate(self.dataloader):
 
                 # port data to device
                 lpos = data.to(self.device)
 
+                # values of the wf used to sample the batch
+                if self.loss.use_weight:
+                    if self.psi0 is None:
+                        self.psi0 = self._get_psi(self.wf, pos)
+                    self.loss.weight['psi0'] = self.psi0[
+                        ibatch * batchsize:(ibatch + 1) * batchsize]
+
                 # get the gradient
                 loss, eloc = self.evaluate_gradient(grad, lpos)
                 cumulative_loss += loss
@@ -101,7 +128,9 @@ class SolverOrbital(SolverBase):
                                     local_energy=eloc, ibatch=ibatch)
 
             # save the model if necessary
-            if cumulative_loss < min_loss:
+            # the sampler is only saved once the background
+            # sampling of the pipeline is done
+            if not pipeline and cumulative_loss < min_loss:
                 min_loss = self.save_checkpoint(
                     n, cumulative_loss, self.save_model)
 
@@ -110,7 +139,17 @@ class SolverOrbital(SolverBase):
             print('----------------------------------------')
 
             # resample the data
-            pos = self._resample(n, nepoch, pos)
+            if not pipeline:
+                pos = self._resample(n, nepoch, pos)
+            else:
+                if future is not None:
+                    pos, self.psi0 = future.result()
+                    self.dataloader.dataset.data = pos
+                    self.resample.ncall += 1
+
+                if cumulative_loss < min_loss:
+                    min_loss = self.save_checkpoint(
+                        n, cumulative_loss, self.save_model)
 
             if self.task == 'geo_opt':
                 self.wf.update_mo_coeffs()
@@ -118,12 +157,77 @@ class SolverOrbital(SolverBase):
             if self.scheduler is not None:
                 self.scheduler.step()
 
+        if pipeline:
+            executor.shutdown()
+
         # restore the sampler number of step
+        # an adapted step size is kept for the next trajectories
         self.sampler.nstep = _nstep_save
-        self.sampler.step_size = _step_size_save
+        if not self.sampler.adaptive_step:
+            self.sampler.step_size = _step_size_save
         self.sampler.walkers.nwalkers = _nwalker_save
         self.sampler.nwalkers = _nwalker_save
 
+    def _submit_resample(self, executor, n, nepoch, pos):
+        """Start the sampling of the next walkers in the background
+        with a snapshot of the current parameters.
+
+        Arguments:
+            executor {ThreadPoolExecutor} -- executor of the sampling
+            n {int} -- current epoch value
+            nepoch {int} -- total number of epoch
+            pos {torch.tensor} -- positions of the walkers
+
+        Returns:
+            Future -- new positions and values of the snapshot wf, None if no resampling
+        """
+        if self.resample.resample_every is None:
+            return None
+
+        if (n % self.resample.resample_every != 0) and (n != nepoch - 1):
+            return None
+
+        wf = copy.deepcopy(self.wf)
+        if self.resample.resample_from_last:
+            pos = pos.clone().detach().to(self.device)
+        else:
+            pos = None
+
+        return executor.submit(self._sample_snapshot, wf, pos)
+
+    def _sample_snapshot(self, wf, pos):
+        """Sample a snapshot of the wave function
+
+        The sampler is modified by the background thread, it must not
+        be read (e.g. by save_checkpoint) until the sampling is done.
+
+        Arguments:
+            wf {WaveFunction} -- snapshot of the wave function
+            pos {torch.tensor} -- initial positions of the walkers
+
+        Returns:
+            torch.tensor, torch.tensor -- new positions, values of the snapshot wf
+        """
+        # the fast update of the sampler must also use the snapshot
+        fast_update = getattr(self.sampler, 'fast_update', None)
+        if fast_update is not None:
+            self.sampler.fast_update = FastUpdate(
+                wf, nrefresh=fast_update.nrefresh)
+
+        self.sampler.wf = wf
+        try:
+            pos = self.sampler.generate(
+                wf.pdf, ntherm=self.resample.ntherm,
+                with_tqdm=self.resample.tqdm, pos=pos)
+        finally:
+            self.sampler.wf = self.wf
+            if fast_update is not None:
+                self.sampler.fast_update = fast_update
+
+        psi = self._get_psi(wf, pos)
+        pos.requires_grad = True
+        return pos, psi
+
     def evaluate_gradient(self, grad, lpos):
         """Evaluate the gradient
 
@@ -135,7 +239,10 @@ class SolverOrbital(SolverBase):
         Returns:
             tuple -- (loss, local energy)
         """
-        if grad == 'auto':
+        if self.task == 'geo_opt' and self.forces == 'hellmann-feynman':
+            loss, eloc = self._evaluate_grad_forces(lpos)
+
+        elif grad == 'auto':
             loss, eloc = self._evaluate_grad_auto(lpos)
 
         elif grad == 'manual':
@@ -171,6 +278,26 @@ class SolverOrbital(SolverBase):
 
         return loss, eloc
 
+    def _evaluate_grad_forces(self, lpos):
+        """Set the gradient of the atomic positions from the
+        Hellmann-Feynman forces.
+
+        Arguments:
+            lpos {torch.tensor} -- positions of the walkers
+
+        Returns:
+            tuple -- (loss, local energy)
+        """
+
+        loss, eloc = self.loss(lpos, no_grad=True)
+        with torch.no_grad():
+            forces = self.wf.forces(lpos)
+
+        self.opt.zero_grad()
+        self.wf.ao.atom_coords.grad = -forces.mean(0)
+
+        return loss, eloc
+
     def _evaluate_grad_manual(self, lpos):
         """Evaluate the gradient using a low variance method
 
@@ -68,6 +68,27 @@ class Loss(nn.Module):
         if self.use_weight:
             self.weight = {'psi': None, 'psi0': None}
 
+    def _evaluate(self, pos):
+        """Local energies and values of the wave function needed by the loss
+
+        Arguments:
+            pos {torch.tensor} -- positions of the walkers in that batch
+
+        Returns:
+            dict -- local energies and, for weighted losses, values of psi
+        """
+        want = ['local_energy']
+        if self.use_weight:
+            want.append('psi')
+
+        if hasattr(self.wf, 'evaluate'):
+            return self.wf.evaluate(pos, want=want)
+
+        values = {'local_energy': self.wf.local_energy(pos)}
+        if self.use_weight:
+            values['psi'] = self.wf(pos)
+        return values
+
     def forward(self, pos, no_grad=False):
         """Computes the loss
 
@@ -88,8 +109,10 @@ class Loss(nn.Module):
 
         with _grad:
 
-            # compute local eneergies
-            local_energies = self.wf.local_energy(pos)
+            # compute local energies (and psi for the weights)
+            # in a single pass when the wave function allows it
+            values = self._evaluate(pos)
+            local_energies = values['local_energy']
 
             # mask the energies if necessary
             if self.clip:
@@ -118,7 +141,7 @@ class Loss(nn.Module):
             else:
 
                 # computes the weights
-                self.weight['psi'] = self.wf(pos)
+                self.weight['psi'] = values['psi']
 
                 if self.weight['psi0'] is None:
                     self.weight['psi0'] = self.weight['psi'].detach(
@@ -42,6 +42,10 @@ class AtomicOrbitals(nn.Module):
             self.nshells, dim=0)
         self.nbas = len(self.bas_coords)
 
+        # index of the atom of each bas
+        self.bas_atom = torch.arange(
+            self.natoms).repeat_interleave(self.nshells)
+
         # index for the contractions
         self.index_ctr = torch.tensor(mol.basis.index_ctr)
 
@@ -95,7 +99,7 @@ class AtomicOrbitals(nn.Module):
         self.device = torch.device('cuda')
         self.to(self.device)
         attrs = ['bas_n', 'bas_coeffs',
-                 'nshells', 'norm_cst', 'index_ctr']
+                 'nshells', 'norm_cst', 'index_ctr', 'bas_atom']
         for at in attrs:
             self.__dict__[at] = self.__dict__[at].to(self.device)
 
@@ -104,30 +108,43 @@ class AtomicOrbitals(nn.Module):
             input,
             derivative=0,
             jacobian=True,
-            one_elec=False):
+            one_elec=False,
+            geometry=None):
         """Computes the values of the atomic orbitals (or their derivatives)
         for the electrons positions in input.
 
         Args:
             input (torch.tensor): Positions of the electrons
                                   Size : Nbatch, Nelec x Ndim
-            derivative (int, optional): order of the derivative (0,1,2,).
+            derivative (int or list, optional): order of the derivative (0,1,2,).
+                                        A list of orders, e.g. [0, 1, 2],
+                                        returns the values of all the orders
+                                        computed from the same intermediates
+                                        with a single contraction.
                                         Defaults to 0.
             jacobian (bool, optional): Return the jacobian (i.e. the sum of
                                        the derivatives) or the individual
                                        terms. Defaults to True.
                                        False only for derivative=1
+                                       (or a list of orders)
 
             one_elec (bool, optional): if only one electron is in input
 
+            geometry (BatchGeometry, optional): geometry of the batch, the
+                                                electron-atom distances are
+                                                taken from it if present.
+                                                Defaults to None.
+
         Returns:
             torch.tensor: Value of the AO (or their derivatives)
                           size : Nbatch, Nelec, Norb (jacobian = True)
                           size : Nbatch, Nelec, Norb, Ndim (jacobian = False)
+                          tuple of tensors if derivative is a list
         """
 
+        fused = isinstance(derivative, list)
         if not jacobian:
-            assert(derivative == 1)
+            assert(derivative == 1 or fused)
 
         if one_elec:
             nelec_save = self.nelec
@@ -140,14 +157,23 @@ class AtomicOrbitals(nn.Module):
             self.nshells, dim=0)
 
         # get the x,y,z, distance component of each point from each RBF center
-        # -> (Nbatch,Nelec,Nbas,Ndim)
-        xyz = (input.view(-1, self.nelec, 1, self.ndim) -
-               self.bas_coords[None, ...])
-        # print('xyz : ', time()-t0)
+        # and the distance
+        # -> (Nbatch,Nelec,Nbas,Ndim), (Nbatch,Nelec,Nbas)
+        if geometry is not None and not one_elec:
+            xyz = geometry.elec_atom_vectors[:, :, self.bas_atom, :]
+            r = geometry.elec_atom_distances[:, :, self.bas_atom]
 
-        # compute the distance
-        # -> (Nbatch,Nelec,Nbas)
-        r = torch.sqrt((xyz**2).sum(3))
+        else:
+            xyz = (input.view(-1, self.nelec, 1, self.ndim) -
+                   self.bas_coords[None, ...])
+            r = torch.sqrt((xyz**2).sum(3))
+
+        # all the orders from the same intermediates
+        if fused:
+            ao = self._fused_forward(xyz, r, derivative, jacobian, nbatch)
+            if one_elec:
+                self.nelec = nelec_save
+            return ao
 
         # radial part
         # -> (Nbatch,Nelec,Nbas)
@@ -239,6 +265,76 @@ class AtomicOrbitals(nn.Module):
 
         return ao
 
+    def _fused_forward(self, xyz, r, derivative, jacobian, nbatch):
+        """Compute several orders of derivative of the AOs in one pass
+
+        The radial parts, the harmonics and their derivatives are computed
+        once and the bas values of all the orders are stacked to be
+        contracted with a single index_add_.
+
+        Args:
+            xyz (torch.tensor): electron-bas displacements
+                                Nbatch, Nelec, Nbas, Ndim
+            r (torch.tensor): electron-bas distances Nbatch, Nelec, Nbas
+            derivative (list): orders of the derivatives
+            jacobian (bool): sum the components of the gradient
+            nbatch (int): number of configurations
+
+        Returns:
+            tuple: values of the AOs for each order
+                   size : Nbatch, Nelec, Norb (order 0, 2 or jacobian)
+                   size : Nbatch, Nelec, Norb, Ndim (order 1)
+        """
+
+        need_grad = 1 in derivative or 2 in derivative
+        need_lap = 2 in derivative
+
+        # radial part and its derivatives
+        orders = [0] + [1] * need_grad + [2] * need_lap
+        radial = self.radial(r, self.bas_n, self.bas_exp, xyz=xyz,
+                             derivative=orders, jacobian=False)
+        R = radial[0]
+
+        # harmonics and their derivatives
+        Y = self.harmonics(xyz)
+        if need_grad:
+            dR = radial[1]
+            dY = self.harmonics(xyz, derivative=1, jacobian=False)
+        if need_lap:
+            d2R = radial[2]
+            d2Y = self.harmonics(xyz, derivative=2)
+
+        # -> (Nbatch,Nelec,Nbas,K)
+        bas = []
+        for der in derivative:
+            if der == 0:
+                bas.append((R * Y).unsqueeze(-1))
+
+            elif der == 1:
+                dbas = dR * Y.unsqueeze(-1) + R.unsqueeze(-1) * dY
+                if jacobian:
+                    dbas = dbas.sum(3, keepdim=True)
+                bas.append(dbas)
+
+            elif der == 2:
+                bas.append((d2R * Y + 2. * (dR * dY).sum(3) +
+                            R * d2Y).unsqueeze(-1))
+
+        sizes = [b.shape[-1] for b in bas]
+        bas = torch.cat(bas, dim=-1)
+
+        # product with coefficients and primitives norm
+        bas = (self.norm_cst * self.bas_coeffs).unsqueeze(-1) * bas
+
+        # single contraction of all the orders
+        # -> (Nbatch,Nelec,Norb,K)
+        ao = torch.zeros(nbatch, self.nelec, self.norb, bas.shape[-1],
+                         device=self.device)
+        ao.index_add_(2, self.index_ctr, bas)
+
+        return tuple(a.squeeze(-1) if a.shape[-1] == 1 else a
+                     for a in torch.split(ao, sizes, dim=-1))
+
     def update(self, ao, pos, idelec):
         """Update the AO matrix if only the idelec electron has been moved.
 
@@ -0,0 +1,87 @@
+import torch
+
+from deepqmc.wavefunction.electron_distance import ElectronDistance
+
+
+class BatchGeometry(object):
+
+    def __init__(self, pos, atom_coords, nelec, ndim=3, edist=None):
+        """Geometry of a batch of electronic configurations
+
+        The electron-atom displacements and distances and the
+        electron-electron distances (and their derivatives) are computed
+        on first use and cached, so that the AO layer, the jastrow factor
+        and the potentials share a single evaluation per batch.
+
+        Arguments:
+            pos {torch.tensor} -- positions of the electrons [nbatch, nelec*ndim]
+            atom_coords {torch.tensor} -- positions of the atoms [natom, ndim]
+            nelec {int} -- number of electrons
+
+        Keyword Arguments:
+            ndim {int} -- number of dimension per electron (default: {3})
+            edist {ElectronDistance} -- electron distance layer (default: {None})
+        """
+
+        self.pos = pos
+        self.atom_coords = atom_coords
+        self.nelec = nelec
+        self.ndim = ndim
+        self.nbatch = pos.shape[0]
+
+        if edist is None:
+            edist = ElectronDistance(nelec, ndim)
+        self.edist = edist
+
+        self._cache = {}
+
+    def is_valid(self, pos):
+        """Check that the geometry was built for these positions
+
+        Arguments:
+            pos {torch.tensor} -- positions of the electrons
+
+        Returns:
+            bool -- True if the geometry can be used for pos
+        """
+        return pos is self.pos
+
+    @property
+    def elec_atom_vectors(self):
+        """Displacements of the electrons from the atoms
+
+        Returns:
+            torch.tensor -- x_i - R_a [nbatch, nelec, natom, ndim]
+        """
+        if 'xyz' not in self._cache:
+            self._cache['xyz'] = (
+                self.pos.view(-1, self.nelec, 1, self.ndim) -
+                self.atom_coords[None, ...])
+        return self._cache['xyz']
+
+    @property
+    def elec_atom_distances(self):
+        """Distances between the electrons and the atoms
+
+        Returns:
+            torch.tensor -- |x_i - R_a| [nbatch, nelec, natom]
+        """
+        if 'r' not in self._cache:
+            self._cache['r'] = torch.sqrt(
+                (self.elec_atom_vectors**2).sum(3))
+        return self._cache['r']
+
+    def elec_elec_distances(self, derivative=0):
+        """Distances between the electrons or their derivatives
+
+        Keyword Arguments:
+            derivative {int} -- order of the derivative (default: {0})
+
+        Returns:
+            torch.tensor -- distance matrix [nbatch, nelec, nelec] or its
+                            derivatives [nbatch, ndim, nelec, nelec]
+        """
+        key = 'ree%d' % derivative
+        if key not in self._cache:
+            self._cache[key] = self.edist(self.pos, derivative=derivative)
+        return self._cache[key]
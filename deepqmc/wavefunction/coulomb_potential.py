@@ -0,0 +1,185 @@
+import torch
+
+
+class CoulombPotential(object):
+
+    def __init__(self, atomic_number, nelec, ndim=3, chunk_size=None):
+        """Vectorized Coulomb terms of the local energy
+
+        The electron-nuclear, electron-electron and nuclear-nuclear terms
+        are evaluated as batched tensor operations. Without the distances
+        of a BatchGeometry the configurations are processed in chunks of
+        chunk_size to bound the memory of the intermediate tensors.
+
+        Arguments:
+            atomic_number {list} -- atomic number of each atom
+            nelec {int} -- number of electrons
+
+        Keyword Arguments:
+            ndim {int} -- number of dimension per electron (default: {3})
+            chunk_size {int} -- number of configurations per chunk,
+                                None for a single chunk (default: {None})
+        """
+
+        self.atomic_number = atomic_number
+        self.nelec = nelec
+        self.ndim = ndim
+        self.chunk_size = chunk_size
+
+        # unique pairs of electrons
+        self.index_pairs = torch.triu_indices(nelec, nelec, offset=1)
+
+    def charges(self, like):
+        """Atomic numbers as a tensor
+
+        Arguments:
+            like {torch.tensor} -- tensor giving the dtype and device
+
+        Returns:
+            torch.tensor -- charges of the atoms [natom]
+        """
+        return torch.as_tensor(self.atomic_number, dtype=like.dtype,
+                               device=like.device)
+
+    def electron_nuclear(self, pos, atom_coords, geometry=None):
+        """Electron-nuclear term
+
+        .. math::
+            V_{en} = - \\sum_{i,a} \\frac{Z_a}{|x_i - R_a|}
+
+        Arguments:
+            pos {torch.tensor} -- positions of the electrons [nbatch, nelec*ndim]
+            atom_coords {torch.tensor} -- positions of the atoms [natom, ndim]
+
+        Keyword Arguments:
+            geometry {BatchGeometry} -- geometry of the batch (default: {None})
+
+        Returns:
+            torch.tensor -- electron-nuclear term [nbatch, 1]
+        """
+        Z = self.charges(pos)
+
+        if geometry is not None:
+            r = geometry.elec_atom_distances
+            return -(Z / r).sum((1, 2)).view(-1, 1)
+
+        out = []
+        for x in self._chunks(pos):
+            xyz = x.view(-1, self.nelec, 1, self.ndim) - atom_coords
+            r = torch.sqrt((xyz**2).sum(-1))
+            out.append(-(Z / r).sum((1, 2)))
+        return torch.cat(out).view(-1, 1)
+
+    def electron_electron(self, pos, geometry=None):
+        """Electron-electron term
+
+        .. math::
+            V_{ee} = \\sum_{i<j} \\frac{1}{|x_i - x_j|}
+
+        Arguments:
+            pos {torch.tensor} -- positions of the electrons [nbatch, nelec*ndim]
+
+        Keyword Arguments:
+            geometry {BatchGeometry} -- geometry of the batch (default: {None})
+
+        Returns:
+            torch.tensor -- electron-electron term [nbatch, 1]
+        """
+        i, j = self.index_pairs.to(pos.device)
+
+        if geometry is not None:
+            r = geometry.elec_elec_distances()
+            return (1. / r[:, i, j]).sum(1).view(-1, 1)
+
+        out = []
+        for x in self._chunks(pos):
+            x = x.view(-1, self.nelec, self.ndim)
+            r = torch.sqrt(((x[:, i] - x[:, j])**2).sum(-1))
+            out.append((1. / r).sum(1))
+        return torch.cat(out).view(-1, 1)
+
+    def nuclear_nuclear(self, atom_coords):
+        """Nuclear-nuclear repulsion
+
+        .. math::
+            V_{nn} = \\sum_{a<b} \\frac{Z_a Z_b}{|R_a - R_b|}
+
+        Arguments:
+            atom_coords {torch.tensor} -- positions of the atoms [natom, ndim]
+
+        Returns:
+            torch.tensor -- nuclear repulsion (0-dim tensor)
+        """
+        natom = atom_coords.shape[0]
+        if natom < 2:
+            return atom_coords.new_zeros(())
+
+        Z = self.charges(atom_coords)
+        a, b = torch.triu_indices(natom, natom, offset=1,
+                                  device=atom_coords.device)
+        r = torch.sqrt(((atom_coords[a] - atom_coords[b])**2).sum(-1))
+        return (Z[a] * Z[b] / r).sum()
+
+    def forces(self, pos, atom_coords, geometry=None):
+        """Hellmann-Feynman forces on the nuclei for each configuration
+
+        .. math::
+            F_a = Z_a \\sum_i \\frac{x_i - R_a}{|x_i - R_a|^3}
+                + \\sum_{b \\neq a} Z_a Z_b \\frac{R_a - R_b}{|R_a - R_b|^3}
+
+        The average over configurations sampled from |psi|^2 is an
+        estimate of -dE/dR_a that neglects the dependence of the wave
+        function on the positions of the nuclei.
+
+        Arguments:
+            pos {torch.tensor} -- positions of the electrons [nbatch, nelec*ndim]
+            atom_coords {torch.tensor} -- positions of the atoms [natom, ndim]
+
+        Keyword Arguments:
+            geometry {BatchGeometry} -- geometry of the batch (default: {None})
+
+        Returns:
+            torch.tensor -- forces [nbatch, natom, ndim]
+        """
+        with torch.no_grad():
+
+            Z = self.charges(pos).view(1, -1, 1)
+            atom_coords = atom_coords.detach()
+
+            if geometry is not None:
+                xyz = geometry.elec_atom_vectors.detach()
+                r = geometry.elec_atom_distances.detach()
+                fen = Z * (xyz / r.unsqueeze(-1)**3).sum(1)
+
+            else:
+                out = []
+                for x in self._chunks(pos.detach()):
+                    xyz = x.view(-1, self.nelec, 1, self.ndim) - atom_coords
+                    r = torch.sqrt((xyz**2).sum(-1, keepdim=True))
+                    out.append(Z * (xyz / r**3).sum(1))
+                fen = torch.cat(out)
+
+            # nuclear repulsion
+            rab = atom_coords.unsqueeze(1) - atom_coords.unsqueeze(0)
+            dab = torch.sqrt((rab**2).sum(-1, keepdim=True))
+            dab = dab + torch.eye(dab.shape[0],
+                                  device=dab.device).unsqueeze(-1)
+            ZZ = Z.view(-1, 1, 1) * Z.view(1, -1, 1)
+            ZZ = ZZ * (1. - torch.eye(ZZ.shape[0],
+                                      device=ZZ.device).unsqueeze(-1))
+            fnn = (ZZ * rab / dab**3).sum(1)
+
+        return fen + fnn
+
+    def _chunks(self, pos):
+        """Split the configurations in chunks
+
+        Arguments:
+            pos {torch.tensor} -- positions of the electrons [nbatch, nelec*ndim]
+
+        Returns:
+            list -- chunks of pos
+        """
+        if self.chunk_size is None or pos.shape[0] <= self.chunk_size:
+            return [pos]
+        return torch.split(pos, self.chunk_size, dim=0)
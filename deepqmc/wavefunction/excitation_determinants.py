@@ -0,0 +1,212 @@
+import torch
+
+from deepqmc.wavefunction.orbital_configurations import OrbitalConfigurations
+from deepqmc.wavefunction.lu_factorization import LUFactorization
+
+
+class ExcitationDeterminants(object):
+
+    def __init__(self, configs, mol, cuda=False):
+        """Evaluates the determinants of a CI expansion as excitations
+        of the ground state determinant.
+
+        Only the ground state slater matrix A of each spin channel is
+        factorized. With T = A^{-1} MO, a configuration with the holes h
+        and the particles p relative to the ground state has the determinant
+
+        .. math::
+            \\det A_c = \\pm \\det A \\det T_{hp}
+
+        where T_{hp} is a k x k matrix, k being the excitation rank.
+        The determinants are computed once per unique spin up and spin down
+        occupation, grouped by excitation rank so that all the determinants
+        of a given rank are computed in a single batch, and then gathered
+        for the configurations.
+
+        Arguments:
+            configs {list} -- configuration of the slater determinant
+            mol {Molecule} -- Molecule instance
+
+        Keyword Arguments:
+            cuda {bool} -- use cuda (default: {False})
+        """
+
+        self.configs = configs
+        self.nconfs = len(configs[0])
+        self.nup = mol.nup
+        self.ndown = mol.ndown
+
+        self.device = torch.device('cpu')
+        if cuda:
+            self.device = torch.device('cuda')
+
+        unique = OrbitalConfigurations.get_unique_configs(configs)
+        excitations = OrbitalConfigurations(mol).get_excitations(
+            [u for u, _ in unique])
+
+        self.channels = []
+        for exc, (_, index), rows, nocc in zip(excitations, unique,
+                                               [slice(0, self.nup),
+                                                slice(self.nup, None)],
+                                               [self.nup, self.ndown]):
+            if nocc > 0:
+                groups, order = self._get_groups(exc)
+                self.channels.append({'rows': rows, 'nocc': nocc,
+                                      'groups': groups,
+                                      'order': order[index.to(self.device)]})
+
+    def _get_groups(self, excitations):
+        """Group the configurations by excitation rank
+
+        Arguments:
+            excitations {list} -- (holes, particles, sign) of each occupation
+
+        Returns:
+            list, torch.LongTensor -- groups and the order of the
+                                      occupations in the concatenated groups
+        """
+        groups = []
+        for rank in sorted(set(len(e[0]) for e in excitations)):
+            index = [ic for ic, e in enumerate(excitations)
+                     if len(e[0]) == rank]
+            holes = [excitations[ic][0] for ic in index]
+            particles = [excitations[ic][1] for ic in index]
+            sign = [excitations[ic][2] for ic in index]
+            groups.append({
+                'rank': rank,
+                'index': torch.LongTensor(index),
+                'holes': torch.LongTensor(holes).view(
+                    len(index), rank).to(self.device),
+                'particles': torch.LongTensor(particles).view(
+                    len(index), rank).to(self.device),
+                'sign': torch.tensor(sign).type(
+                    torch.get_default_dtype()).to(self.device)})
+
+        order = torch.argsort(torch.cat([g['index'] for g in groups]))
+        return groups, order.to(self.device)
+
+    def factorize(self, mo):
+        """Factorize the ground state matrix of each spin channel
+
+        Arguments:
+            mo {torch.tensor} -- MO matrix [nbatch, nelec, nmo]
+
+        Returns:
+            list -- factorization of each spin channel
+        """
+        states = []
+        for channel in self.channels:
+
+            mo_spin = mo[:, channel['rows'], :]
+            lu = LUFactorization(mo_spin[..., :channel['nocc']])
+            sign, logdet = lu.slogdet()
+            tmat = lu.solve(mo_spin)
+
+            # k x k matrices of the excitations
+            # -> (Nbatch, Nconf_k, k, k)
+            thp = [tmat[:, g['holes'].unsqueeze(-1),
+                        g['particles'].unsqueeze(-2)]
+                   for g in channel['groups']]
+
+            states.append(dict(channel, sign=sign, logdet=logdet,
+                               lu=lu, tmat=tmat, thp=thp, thp_lu=None))
+        return states
+
+    def log_det(self, states):
+        """Sign and log of the determinants of all the configurations
+
+        Arguments:
+            states {list} -- output of factorize
+
+        Returns:
+            torch.tensor, torch.tensor -- sign and log|det| [nbatch, nconfs]
+        """
+        sign, logdet = 1., 0.
+        for st in states:
+
+            signs, logdets = [], []
+            for g, thp, lu in zip(st['groups'], st['thp'],
+                                  self._get_thp_lu(st)):
+                if g['rank'] == 0:
+                    sign_k = st['sign'].new_ones(thp.shape[:2])
+                    logdet_k = st['logdet'].new_zeros(thp.shape[:2])
+                else:
+                    sign_k, logdet_k = lu.slogdet()
+                signs.append(sign_k * g['sign'])
+                logdets.append(logdet_k)
+
+            sign = sign * st['sign'].unsqueeze(-1) * \
+                torch.cat(signs, dim=1)[:, st['order']]
+            logdet = logdet + st['logdet'].unsqueeze(-1) + \
+                torch.cat(logdets, dim=1)[:, st['order']]
+
+        return sign, logdet
+
+    def trace(self, states, op, per_electron=False):
+        """Jacobi terms tr(A_c^{-1} B_c) of all the configurations
+
+        With Y = A^{-1} (B - B_0 T), B_0 being the ground state columns
+        of B, the trace of an excited configuration is
+
+        .. math::
+            tr(A_c^{-1} B_c) = tr(A^{-1} B_0) + tr(T_{hp}^{-1} Y_{hp})
+
+        Arguments:
+            states {list} -- output of factorize
+            op {torch.tensor} -- operator applied to the MOs [nbatch, nelec, nmo]
+
+        Keyword Arguments:
+            per_electron {bool} -- return the contribution of each row
+                                   instead of the trace (default: {False})
+
+        Returns:
+            torch.tensor -- traces [nbatch, nconfs] or
+                            row contributions [nbatch, nconfs, nelec]
+        """
+        out = []
+        for st in states:
+
+            op_spin = op[:, st['rows'], :]
+            op_ref = op_spin[..., :st['nocc']]
+            op_exc = op_spin - op_ref @ st['tmat']
+
+            inv = st['lu'].inverse
+            ref = st['lu'].trace_rows(op_ref)
+            if not per_electron:
+                ref = ref.sum(-1)
+                yexc = inv @ op_exc
+
+            terms = []
+            for g, thp, lu in zip(st['groups'], st['thp'],
+                                  self._get_thp_lu(st)):
+
+                if g['rank'] == 0:
+                    shape = thp.shape[:2] + ref.shape[1:]
+                    terms.append(ref.new_zeros(shape))
+
+                elif per_electron:
+                    # -> (Nbatch, Nconf_k, Nelec, k)
+                    op_part = op_exc[:, :, g['particles']].transpose(1, 2)
+                    inv_holes = inv[:, g['holes'], :]
+                    terms.append(((op_part @ lu.inverse) *
+                                  inv_holes.transpose(-1, -2)).sum(-1))
+
+                else:
+                    yhp = yexc[:, g['holes'].unsqueeze(-1),
+                               g['particles'].unsqueeze(-2)]
+                    terms.append(lu.trace(yhp))
+
+            out.append(ref.unsqueeze(1) +
+                       torch.cat(terms, dim=1)[:, st['order']])
+
+        if per_electron:
+            return torch.cat(out, dim=-1)
+        return sum(out)
+
+    @staticmethod
+    def _get_thp_lu(st):
+        """Factorization of the k x k matrices, computed once per state."""
+        if st['thp_lu'] is None:
+            st['thp_lu'] = [None if g['rank'] == 0 else LUFactorization(thp)
+                            for g, thp in zip(st['groups'], st['thp'])]
+        return st['thp_lu']
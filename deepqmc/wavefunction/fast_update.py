@@ -0,0 +1,273 @@
+import torch
+
+
+class FastUpdate(object):
+
+    def __init__(self, wf, nrefresh=100):
+        """Incremental evaluation of an Orbital wave function after
+        single electron moves.
+
+        The AO rows, the MO matrices and the inverse of the spin up/down
+        slater matrices of all the walkers are kept in memory. After the
+        move of one electron per walker only the AO row of that electron is
+        recomputed and the ratio of the determinants is obtained with the
+        matrix determinant lemma. The inverses of the accepted moves are
+        then updated with the Sherman-Morrison formula.
+
+        Arguments:
+            wf {Orbital} -- wave function
+
+        Keyword Arguments:
+            nrefresh {int} -- number of updates between two full evaluations
+                              of the inverse matrices (default: {100})
+        """
+
+        self.wf = wf
+        self.nelec = wf.nelec
+        self.ndim = wf.ndim
+        self.nup = wf.mol.nup
+        self.ndown = wf.mol.ndown
+
+        self.cup = wf.active_configs[0]
+        self.cdown = wf.active_configs[1]
+        self.nconfs = len(self.cup)
+
+        self.nrefresh = nrefresh
+        self.nupdate = 0
+
+        self.pos = None
+        self.proposal = None
+
+    def initialize(self, pos):
+        """Compute all the quantities from scratch
+
+        Arguments:
+            pos {torch.tensor} -- positions of the walkers [nbatch, nelec*ndim]
+
+        Returns:
+            torch.tensor -- log of the pdf [nbatch]
+        """
+
+        with torch.no_grad():
+
+            nbatch = pos.shape[0]
+            self.pos = pos.clone().view(nbatch, self.nelec, self.ndim)
+
+            # ao/mo matrices
+            self.ao = self.wf.ao(pos)
+            self.mo = self.wf.ao2mo(self.ao)
+
+            # slater matrices
+            # -> (Nconf, Nbatch, Nup, Nup)
+            aup, adown = self.wf.pool(self.mo, return_matrix=True)
+            self.inv_up = torch.inverse(aup)
+            self.inv_down = torch.inverse(adown)
+            self.sign_up, self.logdet_up = torch.slogdet(aup)
+            self.sign_down, self.logdet_down = torch.slogdet(adown)
+
+            # jastrow
+            self.log_jast = None
+            if self.wf.use_jastrow:
+                self.log_jast = self.wf.jastrow.log_forward(pos).view(-1)
+
+            self.log_psi = self._get_log_psi(
+                self.sign_up, self.logdet_up,
+                self.sign_down, self.logdet_down, self.log_jast)
+
+        self.nupdate = 0
+        self.proposal = None
+
+        return 2 * self.log_psi
+
+    def propose(self, pos, index):
+        """Compute the pdf after the move of a single electron per walker
+
+        Arguments:
+            pos {torch.tensor} -- new positions of the walkers [nbatch, nelec*ndim]
+            index {torch.LongTensor} -- index of the moved electron
+                                        in each walker [nbatch]
+
+        Returns:
+            torch.tensor -- log of the pdf at the new positions [nbatch]
+        """
+
+        with torch.no_grad():
+
+            nbatch = pos.shape[0]
+            rng = torch.arange(nbatch, device=pos.device)
+
+            # new position of the moved electrons
+            # -> (Nbatch, Ndim)
+            epos = pos.view(nbatch, self.nelec, self.ndim)[rng, index]
+
+            # new ao/mo row of the moved electrons
+            # -> (Nbatch, Nao), (Nbatch, Nmo)
+            ao_row = self.wf.ao(epos, one_elec=True).squeeze(1)
+            mo_row = self.wf.ao2mo(ao_row)
+
+            # spin of the moved electrons
+            is_up = index < self.nup
+            iup = index.clamp(max=self.nup - 1)
+            idown = (index - self.nup).clamp(min=0)
+
+            # new rows of the slater matrices
+            # -> (Nconf, Nbatch, Nup)
+            row_up = mo_row[:, self.cup].transpose(0, 1)
+            row_down = mo_row[:, self.cdown].transpose(0, 1)
+
+            # determinant lemma
+            # -> (Nconf, Nbatch)
+            ratio_up = (row_up * self._get_column(self.inv_up, iup)).sum(-1)
+            ratio_up = torch.where(
+                is_up, ratio_up, torch.ones_like(ratio_up))
+
+            ratio_down = (
+                row_down * self._get_column(self.inv_down, idown)).sum(-1)
+            ratio_down = torch.where(
+                is_up, torch.ones_like(ratio_down), ratio_down)
+
+            # new determinants
+            sign_up = self.sign_up * torch.sign(ratio_up)
+            logdet_up = self.logdet_up + torch.log(torch.abs(ratio_up))
+            sign_down = self.sign_down * torch.sign(ratio_down)
+            logdet_down = self.logdet_down + torch.log(torch.abs(ratio_down))
+
+            # jastrow
+            log_jast = None
+            if self.wf.use_jastrow:
+                eold = self.pos[rng, index]
+                log_jast = self.log_jast + (
+                    self.wf.jastrow._get_one_elec_kernel(
+                        self.pos, epos, index) -
+                    self.wf.jastrow._get_one_elec_kernel(
+                        self.pos, eold, index)).sum(-1)
+
+            log_psi = self._get_log_psi(sign_up, logdet_up,
+                                        sign_down, logdet_down,
+                                        log_jast)
+
+            self.proposal = {'index': index, 'is_up': is_up,
+                             'iup': iup, 'idown': idown,
+                             'epos': epos, 'ao_row': ao_row,
+                             'mo_row': mo_row,
+                             'row_up': row_up, 'row_down': row_down,
+                             'ratio_up': ratio_up,
+                             'ratio_down': ratio_down,
+                             'sign_up': sign_up, 'logdet_up': logdet_up,
+                             'sign_down': sign_down,
+                             'logdet_down': logdet_down,
+                             'log_jast': log_jast, 'log_psi': log_psi}
+
+        return 2 * log_psi
+
+    def accept(self, mask):
+        """Update the state with the accepted moves of the last proposal
+
+        Arguments:
+            mask {torch.tensor} -- boolean mask of the accepted moves [nbatch]
+        """
+
+        p = self.proposal
+        with torch.no_grad():
+
+            sel = mask.nonzero().view(-1)
+            idx = p['index'][sel]
+
+            self.pos[sel, idx] = p['epos'][sel]
+            self.ao[sel, idx] = p['ao_row'][sel]
+            self.mo[sel, idx] = p['mo_row'][sel]
+
+            sel_up = (mask & p['is_up']).nonzero().view(-1)
+            sel_down = (mask & ~p['is_up']).nonzero().view(-1)
+
+            self.inv_up[:, sel_up] = self._sherman_morrison(
+                self.inv_up[:, sel_up], p['row_up'][:, sel_up],
+                p['iup'][sel_up], p['ratio_up'][:, sel_up])
+
+            self.inv_down[:, sel_down] = self._sherman_morrison(
+                self.inv_down[:, sel_down], p['row_down'][:, sel_down],
+                p['idown'][sel_down], p['ratio_down'][:, sel_down])
+
+            self.sign_up[:, sel] = p['sign_up'][:, sel]
+            self.logdet_up[:, sel] = p['logdet_up'][:, sel]
+            self.sign_down[:, sel] = p['sign_down'][:, sel]
+            self.logdet_down[:, sel] = p['logdet_down'][:, sel]
+
+            if self.wf.use_jastrow:
+                self.log_jast[sel] = p['log_jast'][sel]
+            self.log_psi[sel] = p['log_psi'][sel]
+
+        self.proposal = None
+        self.nupdate += 1
+
+        # recompute everything to avoid the
+        # accumulation of round off errors
+        if self.nupdate >= self.nrefresh:
+            self.initialize(self.pos.view(self.pos.shape[0], -1))
+
+    def _get_log_psi(self, sign_up, logdet_up, sign_down, logdet_down,
+                     log_jast=None):
+        """Assemble the log of the wave function from the determinants
+
+        Arguments:
+            sign_up {torch.tensor} -- sign of the up determinants [nconf, nbatch]
+            logdet_up {torch.tensor} -- log of the up determinants [nconf, nbatch]
+            sign_down {torch.tensor} -- sign of the down determinants [nconf, nbatch]
+            logdet_down {torch.tensor} -- log of the down determinants [nconf, nbatch]
+
+        Keyword Arguments:
+            log_jast {torch.tensor} -- log of the jastrow factor (default: {None})
+
+        Returns:
+            torch.tensor -- log|psi| [nbatch]
+        """
+        _, log_psi = self.wf._log_ci_sum(
+            (sign_up * sign_down).transpose(0, 1),
+            (logdet_up + logdet_down).transpose(0, 1))
+        log_psi = log_psi.view(-1)
+        if log_jast is not None:
+            log_psi = log_psi + log_jast
+        return log_psi
+
+    @staticmethod
+    def _get_column(inv, index):
+        """Extract one column of the inverse matrices per walker
+
+        Arguments:
+            inv {torch.tensor} -- inverse matrices [nconf, nbatch, n, n]
+            index {torch.LongTensor} -- index of the column [nbatch]
+
+        Returns:
+            torch.tensor -- columns [nconf, nbatch, n]
+        """
+        nconf, nbatch, n, _ = inv.shape
+        index = index.view(1, nbatch, 1, 1).expand(nconf, nbatch, n, 1)
+        return inv.gather(-1, index).squeeze(-1)
+
+    @staticmethod
+    def _sherman_morrison(inv, row, index, ratio):
+        """Update the inverse after the replacement of one row of the matrix
+
+        .. math::
+            A'^{-1} = A^{-1} - A^{-1} e_i (v^T A^{-1} - e_i^T) / R
+
+        with R = v^T A^{-1} e_i the ratio of the determinants.
+
+        Arguments:
+            inv {torch.tensor} -- inverse matrices [nconf, nbatch, n, n]
+            row {torch.tensor} -- new rows [nconf, nbatch, n]
+            index {torch.LongTensor} -- index of the new rows [nbatch]
+            ratio {torch.tensor} -- ratio of the determinants [nconf, nbatch]
+
+        Returns:
+            torch.tensor -- updated inverse matrices
+        """
+        nconf, nbatch, n, _ = inv.shape
+        if nbatch == 0:
+            return inv
+
+        col = FastUpdate._get_column(inv, index)
+        vinv = (row.unsqueeze(-2) @ inv).squeeze(-2)
+        vinv = vinv - torch.nn.functional.one_hot(index, n).type(inv.dtype)
+        return inv - col.unsqueeze(-1) * \
+            vinv.unsqueeze(-2) / ratio.unsqueeze(-1).unsqueeze(-1)
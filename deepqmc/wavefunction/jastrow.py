@@ -44,6 +44,10 @@ class TwoBodyJastrowFactor(nn.Module):
             (bup, bdown), dim=0).to(
             self.device)
 
+        # indexes of the unique pairs of electrons i<j
+        self.index_pairs = torch.triu_indices(
+            self.nelec, self.nelec, offset=1).to(self.device)
+
         self.edist = ElectronDistance(self.nelec, self.ndim)
 
     def _to_device(self):
@@ -51,16 +55,16 @@ class TwoBodyJastrowFactor(nn.Module):
 
         self.device = torch.device('cuda')
         self.to(self.device)
-        attrs = ['static_weight']
+        attrs = ['static_weight', 'index_pairs']
         for at in attrs:
             self.__dict__[at] = self.__dict__[at].to(self.device)
 
-    def forward(self, pos, derivative=0, jacobian=True):
+    def forward(self, pos, derivative=0, jacobian=True, geometry=None):
         """Compute the Jastrow factors as :
 
         .. math::
-            J = \Prod_{i<j} \exp(B_{ij}) with
-            B_{ij} = \frac{w_0 r_{i,j}}{1 + w r_{i,j}}
+            J = \\exp(\\sum_{i<j} B_{ij}) with
+            B_{ij} = \\frac{w_0 r_{i,j}}{1 + w r_{i,j}}
 
         Args:
             pos (torch.tensor): Positions of the electrons
@@ -71,6 +75,9 @@ class TwoBodyJastrowFactor(nn.Module):
                                        the derivatives) or the individual
                                        terms. Defaults to True.
                                        False only for derivative=1
+            geometry (BatchGeometry, optional): geometry of the batch, the
+                                                e-e distances are taken from
+                                                it if present. Defaults to None.
 
         Returns:
             torch.tensor: value of the jastrow parameter for all confs
@@ -80,88 +87,168 @@ class TwoBodyJastrowFactor(nn.Module):
 
         size = pos.shape
         assert size[1] == self.nelec * self.ndim
-        r = self.edist(pos)
-        jast = self._get_jastrow_elements(r)
+        edist = self._get_edist(pos, geometry)
+        r = edist(0)
+        jast = torch.exp(self._log_jastrow(r))
 
         if derivative == 0:
 
-            return self._prod_unique_pairs(jast)
+            return jast
 
         elif derivative == 1:
-            dr = self.edist(pos, derivative=1)
-            return self._jastrow_derivative(r, dr, jast, jacobian)
+            dr = edist(1)
+            grad = self._grad_log_jastrow(r, dr)
+            if jacobian:
+                return grad.sum(1) * jast
+            return grad * jast.unsqueeze(-1)
 
         elif derivative == 2:
-            dr = self.edist(pos, derivative=1)
-            d2r = self.edist(pos, derivative=2)
-            return self._jastrow_second_derivative(r, dr, d2r, jast)
+            dr = edist(1)
+            d2r = edist(2)
+            return self._laplacian_ratio(r, dr, d2r) * jast
+
+    def log_derivatives(self, pos, derivative=2, geometry=None):
+        """Compute the log of the Jastrow factor and its derivatives
+        divided by the value of the jastrow factor
+
+        .. math::
+            \\log J, \\quad \\frac{\\nabla_i J}{J} = \\nabla_i \\log J, \\quad
+            \\frac{\\Delta_i J}{J} = \\Delta_i \\log J + |\\nabla_i \\log J|^2
+
+        The value of the jastrow factor itself is never formed so that the
+        ratios remain finite when J under/overflows.
+
+        Args:
+            pos (torch.tensor): Positions of the electrons
+                                  Size : Nbatch, Nelec x Ndim
+            derivative (int, optional): highest order of the derivatives
+                                        (1 or 2). Defaults to 2.
+            geometry (BatchGeometry, optional): geometry of the batch.
+                                                Defaults to None.
+
+        Returns:
+            tuple: log J (Nbatch x 1), grad log J (Nbatch x Ndim x Nelec)
+                   and for derivative=2 laplacian J / J (Nbatch x Nelec)
+        """
+        edist = self._get_edist(pos, geometry)
+        r, dr = edist(0), edist(1)
+        out = (self._log_jastrow(r), self._grad_log_jastrow(r, dr))
+        if derivative == 2:
+            out += (self._laplacian_ratio(r, dr, edist(2)),)
+        return out
+
+    def _get_edist(self, pos, geometry=None):
+        """Get a callable returning the e-e distances or their derivatives
+
+        Args:
+            pos (torch.tensor): Positions of the electrons
+            geometry (BatchGeometry, optional): geometry of the batch.
+                                                Defaults to None.
+
+        Returns:
+            callable: derivative -> e-e distances (or derivatives)
+        """
+        if geometry is not None:
+            return geometry.elec_elec_distances
+        return lambda derivative: self.edist(pos, derivative=derivative)
+
+    def log_forward(self, pos, geometry=None):
+        """Compute the log of the Jastrow factor as the sum of the kernels :
+
+        .. math::
+            \\log J = \\sum_{i<j} B_{ij}
 
-    def _jastrow_derivative(self, r, dr, jast, jacobian):
-        """Compute the value of the derivative of the Jastrow factor
+        Args:
+            pos (torch.tensor): Positions of the electrons
+                                  Size : Nbatch, Nelec x Ndim
+            geometry (BatchGeometry, optional): geometry of the batch.
+                                                Defaults to None.
+
+        Returns:
+            torch.tensor: log of the jastrow factor Nbatch x 1
+        """
+        r = self._get_edist(pos, geometry)(0)
+        return self._log_jastrow(r)
+
+    def _log_jastrow(self, r):
+        """Sum of the kernels over the unique pairs
 
         Args:
             r (torch.tensor): ee distance matrix Nbatch x Nelec x Nelec
-            jast (torch.tensor): values of the ajstrow elements
-                                 Nbatch x Nelec x Nelec
 
         Returns:
-            torch.tensor: gradient of the jastrow factors
-                          Nbatch x Nelec x Ndim
+            torch.tensor: log of the jastrow factor Nbatch x 1
         """
-        if jacobian:
-            djast = self._get_der_jastrow_elements(r, dr).sum(1)
-            prod_val = self._prod_unique_pairs(jast)
+        i, j = self.index_pairs
+        kernel = self._compute_kernel(r[..., i, j], self.static_weight[i, j])
+        return kernel.sum(-1).view(-1, 1)
 
-        else:
-            djast = self._get_der_jastrow_elements(r, dr)
-            prod_val = self._prod_unique_pairs(jast).unsqueeze(-1)
+    def _grad_log_jastrow(self, r, dr):
+        """Compute the gradient of the log of the Jastrow factor
 
-        return (self._sum_unique_pairs(djast, axis=-1) -
-                self._sum_unique_pairs(djast, axis=-2)) * prod_val
+        .. math::
+            \\nabla_i \\log J = \\sum_{j>i} \\nabla_i B_{ij}
+                             - \\sum_{j<i} \\nabla_j B_{ji}
 
-    def _jastrow_second_derivative(self, r, dr, d2r, jast):
-        """Compute the value of the pure 2nd derivative of the Jastrow factor
+        Args:
+            r (torch.tensor): ee distance matrix Nbatch x Nelec x Nelec
+            dr (torch.tensor): derivative of the ee distances
+                               Nbatch x Ndim x Nelec x Nelec
+
+        Returns:
+            torch.tensor: gradient of log J Nbatch x Ndim x Nelec
+        """
+        return self._antisymmetrize(
+            self._get_der_jastrow_elements(r, dr)).sum(-1)
+
+    def _laplacian_ratio(self, r, dr, d2r):
+        """Compute the pure second derivatives of the Jastrow factor
+        divided by the jastrow factor
+
+        .. math::
+            \\frac{\\partial^2_{x_i} J}{J} = \\partial^2_{x_i} \\log J
+                + (\\partial_{x_i} \\log J)^2
 
         Args:
             r (torch.tensor): ee distance matrix Nbatch x Nelec x Nelec
-            jast (torch.tensor): values of the ajstrow elements
-                                 Nbatch x Nelec x Nelec
+            dr (torch.tensor): derivative of the ee distances
+                               Nbatch x Ndim x Nelec x Nelec
+            d2r (torch.tensor): 2nd derivative of the ee distances
+                               Nbatch x Ndim x Nelec x Nelec
 
         Returns:
-            torch.tensor: diagonal hessian of the jastrow factors
-                          Nbatch x Nelec x Ndim
+            torch.tensor: laplacian of J over J summed over the dimensions
+                          Nbatch x Nelec
         """
 
-        # pure second derivative terms
-        prod_val = self._prod_unique_pairs(jast)
-        d2jast = self._get_second_der_jastrow_elements(
-            r, dr, d2r).sum(1)
-        hess_jast = 0.5 * (self._sum_unique_pairs(d2jast, axis=-1)
-                           + self._sum_unique_pairs(d2jast, axis=-2))
+        # the pure second derivative of a kernel is
+        # the same for the two electrons of the pair
+        d2jast = torch.triu(self._get_second_der_jastrow_elements(
+            r, dr, d2r), diagonal=1)
+        d2jast = (d2jast + d2jast.transpose(-1, -2)).sum(-1)
+
+        grad = self._grad_log_jastrow(r, dr)
 
-        # mixed terms
-        djast = (self._get_der_jastrow_elements(r, dr))  # .sum(1)
-        hess_jast += self._partial_derivative(
-            djast, out_mat=hess_jast)
+        return (d2jast + grad**2).sum(1)
 
-        return hess_jast * prod_val
+    def _antisymmetrize(self, djast):
+        """Signed derivatives of the kernels of all the pairs of each electron
 
-    def _get_jastrow_elements(self, r):
-        """Get the elements of the jastrow matrix :
         .. math::
-            out_{i,j} = \exp{ \frac{b r_{i,j}}{1+b'r_{i,j}} }
+            M_{ij} = \\partial_{x_i} B_{ij} \\text{ for } i<j, \\quad
+            M_{ij} = -\\partial_{x_j} B_{ji} \\text{ for } j<i
 
         Args:
-            r (torch.tensor): matrix of the e-e distances
-                              Nbatch x Nelec x Nelec
+            djast (torch.tensor): derivative of the jastrow kernels
+                                  Nbatch x Ndim x Nelec x Nelec
 
         Returns:
-            torch.tensor: matrix fof the jastrow elements
-                          Nbatch x Nelec x Nelec
+            torch.tensor: antisymmetric matrix Nbatch x Ndim x Nelec x Nelec
         """
-        return torch.exp(self._compute_kernel(r))
+        upper = torch.triu(djast, diagonal=1)
+        return upper - upper.transpose(-1, -2)
 
-    def _compute_kernel(self, r):
+    def _compute_kernel(self, r, static_weight=None):
         """ Get the jastrow kernel.
         .. math::
             B_{ij} = \frac{b r_{i,j}}{1+b'r_{i,j}}
@@ -169,12 +256,37 @@ class TwoBodyJastrowFactor(nn.Module):
         Args:
             r (torch.tensor): matrix of the e-e distances
                               Nbatch x Nelec x Nelec
+            static_weight (torch.tensor, optional): static weights matching
+                                                    r. Defaults to the full
+                                                    Nelec x Nelec matrix.
 
         Returns:
             torch.tensor: matrix of the jastrow kernels
                           Nbatch x Nelec x Nelec
         """
-        return self.static_weight * r / (1.0 + self.weight * r)
+        if static_weight is None:
+            static_weight = self.static_weight
+        return static_weight * r / (1.0 + self.weight * r)
+
+    def _get_one_elec_kernel(self, pos, epos, index):
+        """Get the jastrow kernels between a single electron per walker
+        and all the other electrons.
+
+        Args:
+            pos (torch.tensor): positions of the electrons
+                                Nbatch x Nelec x Ndim
+            epos (torch.tensor): position of the selected electron
+                                 Nbatch x Ndim
+            index (torch.LongTensor): index of the selected electron
+                                      Nbatch
+
+        Returns:
+            torch.tensor: kernels of the selected electron
+                          Nbatch x Nelec (0 for the electron itself)
+        """
+        r = torch.sqrt(((pos - epos.unsqueeze(1))**2).sum(-1))
+        kernel = self.static_weight[index] * r / (1.0 + self.weight * r)
+        return kernel.scatter(1, index.view(-1, 1), 0.)
 
     def _get_der_jastrow_elements(self, r, dr):
         """Get the elements of the derivative of the jastrow kernels
@@ -236,91 +348,7 @@ class TwoBodyJastrowFactor(nn.Module):
         c = - self.static_weight * self.weight * r_ * d2r * denom2
         d = 2 * self.static_weight * self.weight**2 * r_ * dr_square * denom**3
 
-        e = self._get_der_jastrow_elements(r, dr)
-
-        return a + b + c + d + e**2
-
-    def _partial_derivative(self, djast, out_mat=None):
-        """Get the product of the mixed second deriative terms.
-
-        .. math ::
-
-            d B_{ij} / d x_i * d B_{kl} / d x_k
-
-        Args:
-            djast (torch.tensor): first derivative of the jastrow kernels
-            out_mat (torch.tensor, optional): output matrix. Defaults to None.
-
-        Returns:
-            torch.tensor:
-        """
-
-        if out_mat is None:
-            nbatch = djast.shape[0]
-            out_mat = torch.zeros(nbatch, self.nelec)
-
-        for idx in range(self.nelec):
-
-            index_pairs = [(idx, j, 1) for j in range(
-                idx + 1, self.nelec)] + [(j, idx, -1) for j in range(0, idx)]
-
-            for p1 in range(len(index_pairs) - 1):
-                i1, j1, w1 = index_pairs[p1]
-                for p2 in range(p1 + 1, len(index_pairs)):
-                    i2, j2, w2 = index_pairs[p2]
-
-                    d1 = djast[..., i1, j1] * w1
-                    d2 = djast[..., i2, j2] * w2
-
-                    out_mat[..., idx] += (d1 * d2).sum(1)
-
-        return out_mat
-
-    def _prod_unique_pairs(self, mat, not_el=None):
-        """Compute the product of the lower mat elements
-
-        Args:
-            mat (torch.tensor): input matrix [..., N x N]
-            not_el (tuple(i,j), optional):
-                single element(s) to exclude of the product.
-                Defaults to None.
-
-        Returns:
-            torch.tensor : value of the product
-        """
-
-        mat_cpy = mat.clone()
-        if not_el is not None:
-
-            if not isinstance(not_el, list):
-                not_el = [not_el]
-
-            for _el in not_el:
-                i, j = _el
-                mat_cpy[..., i, j] = 1
-
-        return mat_cpy[..., torch.tril(torch.ones(
-            self.nelec, self.nelec)) == 0].prod(1).view(-1, 1)
-
-    def _sum_unique_pairs(self, mat, axis=None):
-        """Sum the unique pairs of the lower triangluar matrix
-
-        Args:
-            mat (torch.tensor): input matrix [..., N x N]
-            axis (int, optional): index of the axis to sum. Defaults to None.
-
-        Returns:
-            torch.tensor:
-        """
-
-        mat_cpy = mat.clone()
-        mat_cpy[..., torch.tril(torch.ones(
-            self.nelec, self.nelec)) == 1] = 0
-
-        if axis is None:
-            return mat_cpy.sum()
-        else:
-            return mat_cpy.sum(axis)
+        return a + b + c + d
 
 
 if __name__ == "__main__":
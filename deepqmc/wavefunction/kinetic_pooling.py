@@ -1,7 +1,7 @@
 import torch
 from torch import nn
 
-from deepqmc.wavefunction.orbital_projector import OrbitalProjector
+from deepqmc.wavefunction.slater_pooling import SlaterPooling
 
 
 def btrace(M):
@@ -14,7 +14,8 @@ def bproj(M, P):
 
 class KineticPooling(nn.Module):
 
-    def __init__(self, configs, mol, cuda=False):
+    def __init__(self, configs, mol, cuda=False, use_excitations=None,
+                 pool=None):
         """Layer that computes the kinetic energy using the jacobi formula (trace trick)
 
         Arguments:
@@ -23,6 +24,13 @@ class KineticPooling(nn.Module):
 
         Keyword Arguments:
             cuda {bool} -- use cuda (default: {False})
+            use_excitations {bool} -- compute the determinants as excitations
+                                      of the ground state, None to use them
+                                      for multiple configurations
+                                      (default: {None})
+            pool {SlaterPooling} -- pooling layer of the wave function whose
+                                    factorization is shared, a new one is
+                                    created if None (default: {None})
         """
         super(KineticPooling, self).__init__()
 
@@ -33,14 +41,13 @@ class KineticPooling(nn.Module):
         self.ndown = mol.ndown
         self.nelec = self.nup + self.ndown
 
-        self.orb_proj = OrbitalProjector(configs, mol)
+        # determinants and traces from a single factorization
+        if pool is None:
+            pool = SlaterPooling(configs, mol, cuda, use_excitations)
+        self.pool = pool
+        self.use_excitations = self.pool.use_excitations
 
-        if cuda:
-            self.device = torch.device('cuda')
-            self.orb_proj.Pup = self.orb_proj.Pup.to(self.device)
-            self.orb_proj.Pdown = self.orb_proj.Pdown.to(self.device)
-
-    def forward(self, MO, d2MO, dJdMO=None, d2JMO=None):
+    def forward(self, MO, d2MO, dJdMO=None, d2JMO=None, state=None):
         """ Compute the kinetic energy using the trace trick
         for a product of spin up/down determinant
         .. math::
@@ -57,33 +64,23 @@ class KineticPooling(nn.Module):
             d2MO : matrix of \Delta MO vals (Nbatch, Nelec, Nmo)
             dJdMO : matrix of the \frac{\nabla J}{J} \nabla MO
             d2JMO : matrix of the \frac{\Delta J}{J} MO
-            return_local_energy : divide the contrbutions by det(MO) to get
-                                  local energy instead of kinetic energy
+            state : factorization of the MO matrix given by
+                    SlaterPooling.factorize, computed if None
         Return:
             K : T Psi (Nbatch, Ndet)
         """
 
-        # shortcut up/down matrices
-        Aup, Adown = self.orb_proj.split_orbitals(MO)
-        if dJdMO is None and d2JMO is None:
-            Bup, Bdown = self.orb_proj.split_orbitals(d2MO)
-        else:
-            Bup, Bdown = self.orb_proj.split_orbitals(
-                d2MO + 2 * dJdMO + d2JMO)
+        if dJdMO is not None or d2JMO is not None:
+            d2MO = d2MO + 2 * dJdMO + d2JMO
 
-        # inverse of MO matrices
-        iAup = torch.inverse(Aup)
-        iAdown = torch.inverse(Adown)
+        if state is None:
+            state = self.pool.factorize(MO)
 
         # determinant product
-        det_prod = torch.det(Aup) * torch.det(Adown)
+        sign, logdet = self.pool.log_det(state)
+        det_prod = sign * torch.exp(logdet)
 
         # kinetic terms
-        kinetic = -0.5 * (btrace(iAup@Bup) +
-                          btrace(iAdown@Bdown)) * det_prod
-
-        # reshape
-        kinetic = kinetic.transpose(0, 1)
-        det_prod = det_prod.transpose(0, 1)
+        kinetic = -0.5 * self.pool.trace(state, d2MO) * det_prod
 
         return kinetic, det_prod
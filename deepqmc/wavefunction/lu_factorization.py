@@ -0,0 +1,89 @@
+import torch
+
+
+class LUFactorization(object):
+
+    def __init__(self, mat):
+        """LU factorization of a batch of square matrices
+
+        The factorization is computed once and gives the sign and log of the
+        determinants, the solutions of linear systems and the inverse
+        (computed on first use and cached).
+
+        Arguments:
+            mat {torch.tensor} -- matrices [..., N, N]
+        """
+        self.shape = mat.shape
+        if mat.shape[-1] == 0:
+            self.lu = mat
+            self.pivots = torch.zeros(mat.shape[:-1], dtype=torch.int32,
+                                      device=mat.device)
+        elif hasattr(torch, 'linalg') and hasattr(torch.linalg, 'lu_factor'):
+            self.lu, self.pivots = torch.linalg.lu_factor(mat)
+        else:
+            self.lu, self.pivots = torch.lu(mat)
+        self._inverse = None
+
+    def slogdet(self):
+        """Sign and log of the absolute value of the determinants
+
+        Returns:
+            torch.tensor, torch.tensor -- sign and log|det| [...]
+        """
+        diag = torch.diagonal(self.lu, dim1=-2, dim2=-1)
+
+        # parity of the row interchanges of the factorization
+        rows = torch.arange(1, diag.shape[-1] + 1,
+                            dtype=self.pivots.dtype, device=diag.device)
+        swaps = (self.pivots != rows).sum(-1)
+        sign = (1. - 2. * (swaps % 2).type(diag.dtype)) * \
+            torch.sign(diag).prod(-1)
+
+        return sign, torch.log(torch.abs(diag)).sum(-1)
+
+    def solve(self, rhs):
+        """Solve the linear systems A X = B
+
+        Arguments:
+            rhs {torch.tensor} -- right hand sides B [..., N, K]
+
+        Returns:
+            torch.tensor -- solutions X [..., N, K]
+        """
+        if self.shape[-1] == 0:
+            return rhs
+        rhs = rhs.expand(self.shape[:-1] + rhs.shape[-1:])
+        if hasattr(torch, 'linalg') and hasattr(torch.linalg, 'lu_solve'):
+            return torch.linalg.lu_solve(self.lu, self.pivots, rhs)
+        return torch.lu_solve(rhs, self.lu, self.pivots)
+
+    @property
+    def inverse(self):
+        """Inverse of the matrices [..., N, N]"""
+        if self._inverse is None:
+            eye = torch.eye(self.shape[-1], dtype=self.lu.dtype,
+                            device=self.lu.device)
+            self._inverse = self.solve(eye)
+        return self._inverse
+
+    def trace(self, mat):
+        """Traces tr(A^{-1} B) computed element-wise as sum(A^{-T} * B)
+
+        Arguments:
+            mat {torch.tensor} -- matrices B [..., N, N]
+
+        Returns:
+            torch.tensor -- traces [...]
+        """
+        return self.trace_rows(mat).sum(-1)
+
+    def trace_rows(self, mat):
+        """Contribution of each row of B to tr(A^{-1} B)
+
+        Arguments:
+            mat {torch.tensor} -- matrices B [..., N, N]
+
+        Returns:
+            torch.tensor -- contributions [..., N]
+        """
+        return (mat * self.inverse.transpose(-1, -2)).sum(-1)
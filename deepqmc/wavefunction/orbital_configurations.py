@@ -179,6 +179,117 @@ class OrbitalConfigurations(object):
         nvirt = norb - nocc
         return nocc, nvirt
 
+    def get_active_orbitals(self, configs):
+        """Orbitals referenced by the configurations
+
+        The occupied orbitals of the ground state are always part of the
+        active orbitals so that they keep their indexes in the
+        remapped configurations.
+
+        Args:
+            configs (tuple(torch.LongTensor,torch.LongTensor)): the spin
+                up/spin down electronic confs
+
+        Returns:
+            torch.LongTensor, tuple(torch.LongTensor,torch.LongTensor):
+                sorted indexes of the active orbitals and the configurations
+                expressed as indexes of the active orbitals
+        """
+        nocc = max(self.mol.nup, self.mol.ndown)
+        active = torch.unique(torch.cat(
+            [torch.arange(nocc)] + [c.reshape(-1) for c in configs]))
+
+        index = torch.zeros(int(active.max()) + 1, dtype=torch.long)
+        index[active] = torch.arange(len(active))
+
+        return active, (index[configs[0]], index[configs[1]])
+
+    @staticmethod
+    def get_unique_configs(configs):
+        """Unique spin up and spin down occupations of the configurations
+
+        The configurations can then be assembled from the unique
+        occupations as (unique_up[index_up], unique_down[index_down]).
+
+        Args:
+            configs (tuple(torch.LongTensor,torch.LongTensor)): the spin
+                up/spin down electronic confs
+
+        Returns:
+            list: for each spin the unique occupations [nunique, nocc]
+                  and the index of each conf in them [nconfs]
+        """
+        out = []
+        for confs in configs:
+            if confs.shape[1] == 0:
+                out.append((confs[:1], torch.zeros(
+                    confs.shape[0], dtype=torch.long)))
+            else:
+                out.append(torch.unique(confs, dim=0, return_inverse=True))
+        return out
+
+    def get_excitations(self, configs):
+        """Express the configurations as excitations of the ground state
+
+        The orbitals of the ground state missing from a configuration are
+        the holes and the orbitals added are the particles. Replacing the
+        holes by the particles in the ground state gives the configuration
+        up to a permutation of its orbitals whose parity is returned as sign.
+
+        Args:
+            configs (tuple(torch.LongTensor,torch.LongTensor)): the spin
+                up/spin down electronic confs
+
+        Raises:
+            ValueError: if a configuration has not one orbital per electron
+
+        Returns:
+            list: for each spin a list of (holes, particles, sign) per conf
+        """
+
+        excitations = []
+        for confs, nocc in zip(configs, [self.mol.nup, self.mol.ndown]):
+
+            ground_state = list(range(nocc))
+            exc = []
+            for conf in confs.tolist():
+
+                holes = [i for i in ground_state if i not in conf]
+                particles = sorted(i for i in conf if i not in ground_state)
+                if len(set(conf)) != nocc or len(holes) != len(particles):
+                    raise ValueError(
+                        'Invalid configuration %s for %d electrons'
+                        % (conf, nocc))
+
+                _xt = ground_state.copy()
+                for ih, ip in zip(holes, particles):
+                    _xt[ih] = ip
+                perm = [_xt.index(i) for i in conf]
+                exc.append((holes, particles,
+                            self._permutation_sign(perm)))
+
+            excitations.append(exc)
+
+        return excitations
+
+    @staticmethod
+    def _permutation_sign(perm):
+        """Parity of a permutation
+
+        Args:
+            perm (list): permutation of range(len(perm))
+
+        Returns:
+            int: +1 for an even permutation, -1 for an odd one
+        """
+        perm, sign = list(perm), 1
+        for i in range(len(perm)):
+            while perm[i] != i:
+                j = perm[i]
+                perm[i], perm[j] = perm[j], perm[i]
+                sign = -sign
+        return sign
+
     @staticmethod
     def _create_excitation(conf, iocc, ivirt):
         """promote an electron from iocc to ivirt
@@ -1,11 +1,16 @@
 import torch
 
+from deepqmc.wavefunction.orbital_configurations import OrbitalConfigurations
+
 
 class OrbitalProjector(object):
 
     def __init__(self, configs, mol):
         """Porjects the MO matrix in different matrices corresponding to the Slater Determinant.
 
+        The slater matrices are gathered from the columns of the MO matrix
+        given by the occupations of the configurations.
+
         Arguments:
             configs {list} -- configuration of the slater determinant
             mol {Molecule} -- Molecule instance
@@ -17,28 +22,30 @@ class OrbitalProjector(object):
         self.nup = mol.nup
         self.ndown = mol.ndown
 
-        self.Pup, self.Pdown = self.get_projectors()
-
-    def get_projectors(self):
-        """Get the projectors of the conf in the CI expansion
-
-        Returns:
-            torch.tensor, torch.tensor : projectors
-        """
-
-        Pup = torch.zeros(self.nconfs, self.nmo, self.nup)
-        Pdown = torch.zeros(self.nconfs, self.nmo, self.ndown)
+        # occupied orbitals of the configurations
+        self.occ_up = torch.as_tensor(configs[0], dtype=torch.long)
+        self.occ_down = torch.as_tensor(configs[1], dtype=torch.long)
 
-        for ic, (cup, cdown) in enumerate(
-                zip(self.configs[0], self.configs[1])):
+        # unique spin up/down occupations and index of the configurations
+        (self.unique_occ_up, self.index_up), \
+            (self.unique_occ_down, self.index_down) = \
+            OrbitalConfigurations.get_unique_configs(
+                (self.occ_up, self.occ_down))
 
-            for _id, imo in enumerate(cup):
-                Pup[ic][imo, _id] = 1.
+    @property
+    def unique_configs(self):
+        """Unique spin up and spin down occupations."""
+        return self.unique_occ_up, self.unique_occ_down
 
-            for _id, imo in enumerate(cdown):
-                Pdown[ic][imo, _id] = 1.
+    def to(self, device):
+        """Export the occupations and the index maps to the device
 
-        return Pup.unsqueeze(1), Pdown.unsqueeze(1)
+        Arguments:
+            device {torch.device} -- target device
+        """
+        for at in ['occ_up', 'occ_down', 'unique_occ_up', 'unique_occ_down',
+                   'index_up', 'index_down']:
+            self.__dict__[at] = self.__dict__[at].to(device)
 
     def split_orbitals(self, mo):
         """Split the orbital  matrix in multiple slater matrices
@@ -49,5 +56,34 @@ class OrbitalProjector(object):
         Returns:
             torch.tensor -- all slater matrices
         """
-        return mo[:, :self.nup, :] @ self.Pup, mo[:,
-                                                  self.nup:, :] @ self.Pdown
+        return self._gather(mo[:, :self.nup, :], self.occ_up), \
+            self._gather(mo[:, self.nup:, :], self.occ_down)
+
+    def split_unique_orbitals(self, mo):
+        """Split the orbital matrix in the slater matrices of the
+        unique spin up and spin down occupations
+
+        The matrices of the configurations are obtained with
+        index_up and index_down.
+
+        Arguments:
+            mo {torch.tensor} -- molecular orbital matrix
+
+        Returns:
+            torch.tensor -- unique spin up and spin down slater matrices
+        """
+        return self._gather(mo[:, :self.nup, :], self.unique_occ_up), \
+            self._gather(mo[:, self.nup:, :], self.unique_occ_down)
+
+    @staticmethod
+    def _gather(mo, occ):
+        """Select the occupied columns of the MO matrix
+
+        Arguments:
+            mo {torch.tensor} -- MO matrix of one spin [nbatch, nelec, nmo]
+            occ {torch.LongTensor} -- occupied orbitals [nconfs, nelec]
+
+        Returns:
+            torch.tensor -- slater matrices [nconfs, nbatch, nelec, nelec]
+        """
+        return mo[..., occ].permute(2, 0, 1, 3)
@@ -17,36 +17,44 @@ def radial_slater(
 
     Keyword Arguments:
         xyz {torch.tensor} -- positions of the electrons (needed for derivative) (default: {None})
-        derivative {int} -- degree of the derivative (default: {0})
+        derivative {int or list} -- degree of the derivative, a list returns the
+                                    requested orders computed from the same
+                                    intermediates (default: {0})
         jacobian {bool} -- return the jacobian, i.e the sum of the gradients (default: {True})
 
     Returns:
         torch.tensor -- values of each orbital radial part at each position
+                        (list of tensors if derivative is a list)
     """
 
-    if derivative == 0:
-        return R**bas_n * torch.exp(-bas_exp * R)
+    if not isinstance(derivative, list):
+        if derivative == 0:
+            return R**bas_n * torch.exp(-bas_exp * R)
+        return radial_slater(R, bas_n, bas_exp, xyz,
+                             [derivative], jacobian)[0]
 
-    elif derivative > 0:
+    rn = R**(bas_n)
+    er = torch.exp(-bas_exp * R)
 
-        rn = R**(bas_n)
+    if max(derivative) > 0:
         nabla_rn = (bas_n * R**(bas_n - 2)).unsqueeze(-1) * xyz
-
-        er = torch.exp(-bas_exp * R)
         nabla_er = -(bas_exp * er).unsqueeze(-1) * \
             xyz / R.unsqueeze(-1)
 
-        if derivative == 1:
+    out = []
+    for der in derivative:
+
+        if der == 0:
+            out.append(rn * er)
 
+        elif der == 1:
             if jacobian:
-                nabla_rn = nabla_rn.sum(3)
-                nabla_er = nabla_er.sum(3)
-                return nabla_rn * er + rn * nabla_er
+                out.append(nabla_rn.sum(3) * er + rn * nabla_er.sum(3))
             else:
-                return nabla_rn * \
-                    er.unsqueeze(-1) + rn.unsqueeze(-1) * nabla_er
+                out.append(nabla_rn *
+                           er.unsqueeze(-1) + rn.unsqueeze(-1) * nabla_er)
 
-        elif derivative == 2:
+        elif der == 2:
 
             sum_xyz2 = (xyz**2).sum(3)
 
@@ -56,8 +64,10 @@ def radial_slater(
             lap_er = bas_exp**2 * er * sum_xyz2 / R**2 \
                 - 2 * bas_exp * er * sum_xyz2 / R**3
 
-            return lap_rn * er + 2 * \
-                (nabla_rn * nabla_er).sum(3) + rn * lap_er
+            out.append(lap_rn * er + 2 *
+                       (nabla_rn * nabla_er).sum(3) + rn * lap_er)
+
+    return out
 
 
 def radial_gaussian(
@@ -76,39 +86,52 @@ def radial_gaussian(
 
     Keyword Arguments:
         xyz {torch.tensor} -- positions of the electrons (needed for derivative) (default: {None})
-        derivative {int} -- degree of the derivative (default: {0})
+        derivative {int or list} -- degree of the derivative, a list returns the
+                                    requested orders computed from the same
+                                    intermediates (default: {0})
         jacobian {bool} -- return the jacobian, i.e the sum of the gradients (default: {True})
 
     Returns:
         torch.tensor -- values of each orbital radial part at each position
+                        (list of tensors if derivative is a list)
     """
-    if derivative == 0:
-        return R**bas_n * torch.exp(-bas_exp * R**2)
+    if not isinstance(derivative, list):
+        if derivative == 0:
+            return R**bas_n * torch.exp(-bas_exp * R**2)
+        return radial_gaussian(R, bas_n, bas_exp, xyz,
+                               [derivative], jacobian)[0]
 
-    elif derivative > 0:
+    rn = R**(bas_n)
+    er = torch.exp(-bas_exp * R**2)
 
-        rn = R**(bas_n)
+    if max(derivative) > 0:
         nabla_rn = (bas_n * R**(bas_n - 2)).unsqueeze(-1) * xyz
-
-        er = torch.exp(-bas_exp * R**2)
         nabla_er = -2 * (bas_exp * er).unsqueeze(-1) * xyz
 
-        if derivative == 1:
+    out = []
+    for der in derivative:
+
+        if der == 0:
+            out.append(rn * er)
+
+        elif der == 1:
             if jacobian:
-                nabla_rn = nabla_rn.sum(3)
-                nabla_er = nabla_er.sum(3)
-                return nabla_rn * er + rn * nabla_er
+                out.append(nabla_rn.sum(3) * er + rn * nabla_er.sum(3))
             else:
-                return nabla_rn * \
-                    er.unsqueeze(-1) + rn.unsqueeze(-1) * nabla_er
+                out.append(nabla_rn *
+                           er.unsqueeze(-1) + rn.unsqueeze(-1) * nabla_er)
+
+        elif der == 2:
 
-        elif derivative == 2:
+            sum_xyz2 = (xyz**2).sum(3)
 
             lap_rn = bas_n * (3 * R**(bas_n - 2)
-                              + (xyz**2).sum(3) * (bas_n - 2) * R**(bas_n - 4))
+                              + sum_xyz2 * (bas_n - 2) * R**(bas_n - 4))
 
-            lap_er = 4 * bas_exp**2 * (xyz**2).sum(3) * er \
+            lap_er = 4 * bas_exp**2 * sum_xyz2 * er \
                 - 6 * bas_exp * er
 
-            return lap_rn * er + 2 * \
-                (nabla_rn * nabla_er).sum(3) + rn * lap_er
+            out.append(lap_rn * er + 2 *
+                       (nabla_rn * nabla_er).sum(3) + rn * lap_er)
+
+    return out
@@ -4,13 +4,15 @@ from torch import nn
 from torch.autograd import Variable
 
 from deepqmc.wavefunction.orbital_projector import OrbitalProjector
+from deepqmc.wavefunction.excitation_determinants import ExcitationDeterminants
+from deepqmc.wavefunction.lu_factorization import LUFactorization
 
 
 class SlaterPooling(nn.Module):
 
     """Applies a slater determinant pooling in the active space."""
 
-    def __init__(self, configs, mol, cuda=False):
+    def __init__(self, configs, mol, cuda=False, use_excitations=None):
         """Layer that computes all the slater determinant from the MO matrix.
 
         Arguments:
@@ -19,6 +21,10 @@ class SlaterPooling(nn.Module):
 
         Keyword Arguments:
             cuda {bool} -- use cuda (default: {False})
+            use_excitations {bool} -- compute the determinants as excitations
+                                      of the ground state, None to use them
+                                      for multiple configurations
+                                      (default: {None})
         """
         super(SlaterPooling, self).__init__()
 
@@ -31,10 +37,15 @@ class SlaterPooling(nn.Module):
 
         self.orb_proj = OrbitalProjector(configs, mol)
 
+        if use_excitations is None:
+            use_excitations = self.nconfs > 1
+        self.use_excitations = use_excitations
+        if self.use_excitations:
+            self.excitations = ExcitationDeterminants(configs, mol, cuda)
+
         if cuda:
             self.device = torch.device('cuda')
-            self.orb_proj.Pup = self.orb_proj.Pup.to(self.device)
-            self.orb_proj.Pdown = self.orb_proj.Pdown.to(self.device)
+            self.orb_proj.to(self.device)
 
     def forward(self, input, return_matrix=False):
         """Computes the SD values
@@ -49,13 +60,91 @@ class SlaterPooling(nn.Module):
             torch.tensor -- slater matrices or determinant depending on return_matrix
         """
 
-        mo_up, mo_down = self.orb_proj.split_orbitals(input)
         if return_matrix:
-            return mo_up, mo_down
-        else:
-            return (
-                torch.det(mo_up) *
-                torch.det(mo_down)).transpose(0, 1)
+            return self.orb_proj.split_orbitals(input)
+
+        sign, logdet = self.log_det(self.factorize(input))
+        return sign * torch.exp(logdet)
+
+    def log_forward(self, input):
+        """Computes the sign and the log of the absolute value of the SDs
+
+        Arguments:
+            input {torch.tensor} -- MO matrices nbatch x nelec x nmo
+
+        Returns:
+            torch.tensor, torch.tensor -- signs and log values of the
+                                          determinants nbatch x nconfs
+        """
+
+        return self.log_det(self.factorize(input))
+
+    def factorize(self, input):
+        """Factorize the slater matrices
+
+        Each matrix is LU factorized once. The determinants, the traces and
+        the drift are then all obtained from that factorization.
+        With excitations only the ground state matrices are factorized,
+        otherwise the matrices of the unique spin up and spin down
+        occupations are used.
+
+        Arguments:
+            input {torch.tensor} -- MO matrices nbatch x nelec x nmo
+
+        Returns:
+            object -- factorization used by log_det and trace
+        """
+        if self.use_excitations:
+            return self.excitations.factorize(input)
+
+        mo_up, mo_down = self.orb_proj.split_unique_orbitals(input)
+        return {'up': LUFactorization(mo_up), 'down': LUFactorization(mo_down)}
+
+    def log_det(self, state):
+        """Sign and log of the determinants
+
+        Arguments:
+            state {object} -- output of factorize
+
+        Returns:
+            torch.tensor, torch.tensor -- signs and log values of the
+                                          determinants nbatch x nconfs
+        """
+        if self.use_excitations:
+            return self.excitations.log_det(state)
+
+        iup, idown = self.orb_proj.index_up, self.orb_proj.index_down
+        sign_up, logdet_up = state['up'].slogdet()
+        sign_down, logdet_down = state['down'].slogdet()
+        return (sign_up[iup] * sign_down[idown]).transpose(0, 1), \
+            (logdet_up[iup] + logdet_down[idown]).transpose(0, 1)
+
+    def trace(self, state, input, per_electron=False):
+        """Jacobi terms tr(A^{-1} B) of the determinants
+
+        Arguments:
+            state {object} -- output of factorize
+            input {torch.tensor} -- operator applied to the MOs
+                                    nbatch x nelec x nmo
+
+        Keyword Arguments:
+            per_electron {bool} -- return the contribution of each electron
+                                   instead of the trace (default: {False})
+
+        Returns:
+            torch.tensor -- traces nbatch x nconfs or
+                            contributions nbatch x nconfs x nelec
+        """
+        if self.use_excitations:
+            return self.excitations.trace(state, input, per_electron)
+
+        bup, bdown = self.orb_proj.split_unique_orbitals(input)
+        tup = state['up'].trace_rows(bup)[self.orb_proj.index_up]
+        tdown = state['down'].trace_rows(bdown)[self.orb_proj.index_down]
+
+        if per_electron:
+            return torch.cat((tup, tdown), dim=-1).transpose(0, 1)
+        return (tup.sum(-1) + tdown.sum(-1)).transpose(0, 1)
 
 
 if __name__ == "__main__":
@@ -32,6 +32,43 @@ class WaveFunction(nn.Module):
 
         raise NotImplementedError()
 
+    def log_forward(self, x):
+        ''' Compute the sign and the log of the absolute value of
+        the wave function.
+
+        Args:
+            x: position of the electrons
+
+        Returns: sign of psi, log|psi|
+        '''
+        out = self.forward(x)
+        return torch.sign(out), torch.log(torch.abs(out))
+
+    def log_psi_and_grad(self, x, return_sign=False):
+        ''' Compute log|psi| and the gradient of log|psi| wrt
+        the positions of the electrons.
+
+        Generic version relying on autograd, the values
+        are detached from the graph.
+
+        Args:
+            x: position of the electrons
+            return_sign: also return the sign of psi
+
+        Returns: (sign of psi [nbatch]), log|psi| [nbatch],
+                 grad log|psi| [nbatch, nelec*ndim]
+        '''
+        with torch.enable_grad():
+            x = x.detach().requires_grad_(True)
+            sign, log_psi = self.log_forward(x)
+            grad_log_psi = grad(log_psi, x,
+                                grad_outputs=torch.ones_like(log_psi),
+                                only_inputs=True)[0]
+        if return_sign:
+            return sign.detach().view(-1), log_psi.detach().view(-1), \
+                grad_log_psi.detach()
+        return log_psi.detach().view(-1), grad_log_psi.detach()
+
     def electronic_potential(self, pos):
         '''Compute the potential of the wf points
         Args:
@@ -185,3 +222,7 @@ class WaveFunction(nn.Module):
     def pdf(self, pos):
         '''density of the wave function.'''
         return (self.forward(pos)**2).reshape(-1)
+
+    def log_pdf(self, pos):
+        '''log of the density of the wave function.'''
+        return 2 * self.log_forward(pos)[1].reshape(-1)
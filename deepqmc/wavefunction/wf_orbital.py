@@ -5,16 +5,23 @@ from time import time
 
 from deepqmc.wavefunction.atomic_orbitals import AtomicOrbitals
 from deepqmc.wavefunction.slater_pooling import SlaterPooling
-from deepqmc.wavefunction.kinetic_pooling import KineticPooling
 from deepqmc.wavefunction.orbital_configurations import OrbitalConfigurations
 from deepqmc.wavefunction.wf_base import WaveFunction
 from deepqmc.wavefunction.jastrow import TwoBodyJastrowFactor
+from deepqmc.wavefunction.batch_geometry import BatchGeometry
+from deepqmc.wavefunction.coulomb_potential import CoulombPotential
 
 
 class Orbital(WaveFunction):
 
+    # quantities that can be computed by evaluate
+    evaluate_keys = ['psi', 'sign', 'log_psi', 'drift', 'kinetic_energy',
+                     'nuclear_potential', 'electronic_potential',
+                     'nuclear_repulsion', 'local_energy']
+
     def __init__(self, mol, configs='ground_state',
-                 kinetic='jacobi', use_jastrow=True, cuda=False):
+                 kinetic='jacobi', use_jastrow=True, cuda=False,
+                 chunk_size=None):
         """Network to compute a wave function
 
         Arguments:
@@ -30,6 +37,8 @@ class Orbital(WaveFunction):
             kinetic {str} -- method to compute the kinetic energy (jacobi, auto, fd) (default: {'jacobi'})
             use_jastrow {bool} -- use a jastrow factor (default: {True})
             cuda {bool} -- use cuda (default: {False})
+            chunk_size {int} -- number of configurations per chunk in the
+                                potentials (default: {None})
 
         Raises:
             ValueError: if cuda requested and not available
@@ -49,6 +58,10 @@ class Orbital(WaveFunction):
         # define the atomic orbital layer
         self.ao = AtomicOrbitals(mol, cuda)
 
+        # coulomb terms of the local energy
+        self.coulomb = CoulombPotential(mol.atomic_number, mol.nelec,
+                                        3, chunk_size)
+
         # define the mo layer
         self.mo_scf = nn.Linear(
             mol.basis.nao, mol.basis.nmo, bias=False)
@@ -74,14 +87,18 @@ class Orbital(WaveFunction):
         self.configs = self.orb_confs.get_configs(configs)
         self.nci = len(self.configs[0])
 
+        # only the orbitals used by the configurations are computed
+        # the pooling layers work with the indexes of these orbitals
+        self.active_orbitals, self.active_configs = \
+            self.orb_confs.get_active_orbitals(self.configs)
+        if self.cuda:
+            self.active_orbitals = self.active_orbitals.to(self.device)
+
         #  define the SD pooling layer
+        #  its factorization also gives the kinetic energies
+        #  via the Jacobi formula
         self.pool = SlaterPooling(
-            self.configs, mol, cuda)
-
-        # pooling operation to directly compute
-        # the kinetic energies via Jacobi formula
-        self.kinpool = KineticPooling(
-            self.configs, mol, cuda)
+            self.active_configs, mol, cuda)
 
         # define the linear layer
         self.fc = nn.Linear(self.nci, 1, bias=False)
@@ -117,7 +134,25 @@ class Orbital(WaveFunction):
         self.mol.atom_coords = self.ao.atom_coords.detach().numpy().tolist()
         self.mo.weight = self.get_mo_coeffs()
 
-    def forward(self, x, ao=None):
+    def batch_geometry(self, x):
+        """Build the geometry shared by the layers for a batch of positions
+
+        Arguments:
+            x {torch.tensor} -- positions of the electrons [nbatch, nelec*ndim]
+
+        Returns:
+            BatchGeometry -- electron-atom and electron-electron distances
+        """
+        return BatchGeometry(x, self.ao.atom_coords, self.nelec,
+                             self.ndim, self.jastrow.edist)
+
+    def _get_geometry(self, x, geometry):
+        """Check the geometry given as input or build a new one."""
+        if geometry is None or not geometry.is_valid(x):
+            geometry = self.batch_geometry(x)
+        return geometry
+
+    def forward(self, x, ao=None, geometry=None):
         """Compute the value of the wave function for a multiple conformation of the electrons
 
         Arguments:
@@ -128,26 +163,26 @@ class Orbital(WaveFunction):
                                 if present used as input of the MO.
                                 usefull when updating the waeve function after a 1 elec move
                                  (default: {None})
+            geometry {BatchGeometry} -- geometry of the batch (default: {None})
 
         Returns:
             torch.tensor -- value of the wave function for the configurations
         """
 
+        geometry = self._get_geometry(x, geometry)
+
         if self.use_jastrow:
-            J = self.jastrow(x)
+            J = self.jastrow(x, geometry=geometry)
 
         # atomic orbital
         if ao is None:
-            x = self.ao(x)
+            x = self.ao(x, geometry=geometry)
 
         else:
             x = ao
 
         # molecular orbitals
-        x = self.mo_scf(x)
-
-        # mix the mos
-        x = self.mo(x)
+        x = self.ao2mo(x)
 
         # pool the mos
         x = self.pool(x)
@@ -158,140 +193,423 @@ class Orbital(WaveFunction):
         else:
             return self.fc(x)
 
-    def _get_mo_vals(self, x, derivative=0):
-        """Get the values of MOs
+    def log_forward(self, x, ao=None, geometry=None):
+        """Compute the sign and the log of the absolute value of the wave function
+
+        The determinants are computed with slogdet and the jastrow factor
+        in log space so that large systems do not under/overflow.
 
         Arguments:
             x {torch.tensor} -- positions of the electrons [nbatch, nelec*ndim]
 
         Keyword Arguments:
-            derivative {int} -- order of the derivative (default: {0})
+            ao {torch.tensor} -- AO matrix [nbatch, nelec,nao] (default: {None})
+            geometry {BatchGeometry} -- geometry of the batch (default: {None})
 
         Returns:
-            torch.tensor -- MO matrix [nbatch, nelec, nmo]
+            torch.tensor, torch.tensor -- sign and log|psi| [nbatch, 1]
         """
-        return self.mo(self.mo_scf(self.ao(x, derivative=derivative)))
 
-    def local_energy_jacobi(self, pos):
-        """Computes the local energy using the jacobi formula (trace trick)
-        for the kinetic energy
+        geometry = self._get_geometry(x, geometry)
+
+        if self.use_jastrow:
+            log_jast = self.jastrow.log_forward(x, geometry=geometry)
+
+        # atomic orbital
+        if ao is None:
+            x = self.ao(x, geometry=geometry)
+        else:
+            x = ao
+
+        # molecular orbitals
+        x = self.ao2mo(x)
+
+        # sign and log of the determinants
+        sign, logdet = self.pool.log_forward(x)
+
+        # sum the configurations
+        sign, log_psi = self._log_ci_sum(sign, logdet)
+
+        if self.use_jastrow:
+            log_psi = log_psi + log_jast
+
+        return sign, log_psi
+
+    def log_psi_and_grad(self, x, return_sign=False):
+        """Compute log|psi| and its gradient in a single pass
+
+        The gradients of the determinants are obtained with the Jacobi formula
+
+        .. math::
+            \\nabla_i \\log D = \\sum_k \\nabla_i A_{ik} A^{-1}_{ki}
+
+        and combined with the weights of the CI expansion.
+        The gradient of the jastrow factor is added to get the full gradient.
+
+        Arguments:
+            x {torch.tensor} -- positions of the electrons [nbatch, nelec*ndim]
+
+        Keyword Arguments:
+            return_sign {bool} -- also return the sign of psi (default: {False})
+
+        Returns:
+            torch.tensor, torch.tensor -- (sign [nbatch]), log|psi| [nbatch] and
+                                          grad log|psi| [nbatch, nelec*ndim]
+        """
+
+        out = self.evaluate(x, want=['sign', 'log_psi', 'drift'])
+        if return_sign:
+            return out['sign'].view(-1), out['log_psi'].view(-1), \
+                out['drift']
+        return out['log_psi'].view(-1), out['drift']
+
+    def evaluate(self, pos, want=('psi', 'local_energy')):
+        """Compute several quantities of the wave function in a single pass
+
+        The AO, MO, slater matrices and jastrow factor are computed once
+        and shared by all the requested quantities. The results are cached
+        for the batch when the gradients are disabled: a second call with
+        the same positions tensor and the same parameters only computes the
+        missing quantities. Values computed with the gradients enabled carry
+        their graph and are never cached. Changes made through the .data
+        attribute of the parameters are not tracked, call clear_cache after
+        such changes.
+
+        Possible entries of want:
+            psi -- value of the wave function [nbatch, 1]
+            sign -- sign of the wave function [nbatch, 1]
+            log_psi -- log|psi| [nbatch, 1]
+            drift -- grad log|psi| [nbatch, nelec*ndim]
+            kinetic_energy -- kinetic energy [nbatch, 1]
+            nuclear_potential -- electron-nuclear term [nbatch, 1]
+            electronic_potential -- electron-electron term [nbatch, 1]
+            nuclear_repulsion -- nuclear-nuclear term
+            local_energy -- local energy [nbatch, 1]
 
         Arguments:
             pos {torch.tensor} -- positions of the electrons [nbatch, nelec*ndim]
 
+        Keyword Arguments:
+            want {list} -- quantities to compute (default: {('psi', 'local_energy')})
+
+        Raises:
+            ValueError: if a quantity is not known
+
         Returns:
-            torch.tensor -- value of the local energy [nbatch]
+            dict -- requested quantities
         """
 
-        ke = self.kinetic_energy_jacobi(pos)
+        if isinstance(want, str):
+            want = [want]
 
-        return ke \
-            + self.nuclear_potential(pos) \
-            + self.electronic_potential(pos) \
-            + self.nuclear_repulsion()
+        unknown = set(want) - set(self.evaluate_keys)
+        if len(unknown) > 0:
+            raise ValueError('Cannot evaluate %s, possible values are %s'
+                             % (', '.join(unknown),
+                                ', '.join(self.evaluate_keys)))
 
-    def kinetic_energy_jacobi(self, x, **kwargs):
-        """Compute the value of the kinetic enery using
-        the Jacobi formula for derivative of determinant.
+        # values that carry a graph are not kept on the module
+        if torch.is_grad_enabled():
+            return self._evaluate(pos, want)
+
+        key = self._evaluate_key(pos)
+        cache = getattr(self, '_evaluate_cache', None)
+        if cache is None or cache['pos'] is not pos or cache['key'] != key:
+            cache = {'pos': pos, 'key': key, 'values': {}}
+            self._evaluate_cache = cache
+
+        missing = [w for w in want if w not in cache['values']]
+        if len(missing) > 0:
+            cache['values'].update(self._evaluate(pos, missing))
+
+        return {w: cache['values'][w] for w in want}
+
+    def _evaluate_key(self, pos):
+        """State of the inputs that invalidates the cache of evaluate."""
+        return (pos._version,
+                tuple(p._version for p in self.parameters()))
+
+    def clear_cache(self):
+        """Remove the values stored by evaluate."""
+        self._evaluate_cache = None
+
+    def __getstate__(self):
+        """Copies and pickles of the wave function do not carry the cache."""
+        state = self.__dict__.copy()
+        state['_evaluate_cache'] = None
+        return state
+
+    def _evaluate(self, pos, want, geometry=None, kinetic=None):
+        """Shared forward pass of evaluate
+
+        Arguments:
+            pos {torch.tensor} -- positions of the electrons [nbatch, nelec*ndim]
+            want {list} -- quantities to compute
+
+        Keyword Arguments:
+            geometry {BatchGeometry} -- geometry of the batch (default: {None})
+            kinetic {str} -- method of the kinetic energy,
+                             None for self.kinetic (default: {None})
+
+        Returns:
+            dict -- requested quantities
+        """
+
+        want = set(want)
+        out = {}
+        nbatch = pos.shape[0]
+        geometry = self._get_geometry(pos, geometry)
+        kinetic = self.kinetic if kinetic is None else kinetic
+
+        need_energy = len(want & {'kinetic_energy', 'local_energy'}) > 0
+        need_jacobi = need_energy and kinetic == 'jacobi'
+        need_grad = 'drift' in want or (need_jacobi and self.use_jastrow)
+        need_wf = need_jacobi or len(
+            want & {'psi', 'sign', 'log_psi', 'drift'}) > 0
+
+        if need_wf:
+
+            # mo values and derivatives in one pass
+            # -> (Nbatch, Nelec, Nmo), (Nbatch, Nelec, Nmo, Ndim)
+            orders = [0] + [1] * need_grad + [2] * need_jacobi
+            mos = self._ao2mo(*self.ao(pos, derivative=orders,
+                                       jacobian=False, geometry=geometry))
+            mo = mos[0]
+
+            # factorization of the slater matrices
+            # and log of the CI sum
+            state = self.pool.factorize(mo)
+            sign, logdet = self.pool.log_det(state)
+            sign_psi, log_det = self._log_ci_sum(sign, logdet)
+            log_psi = log_det
+
+            # jastrow factor and its derivatives divided by its value
+            if self.use_jastrow:
+                if need_grad:
+                    jast = self.jastrow.log_derivatives(
+                        pos, derivative=1 + need_jacobi, geometry=geometry)
+                    log_jast, djast = jast[0], jast[1].transpose(1, 2)
+                else:
+                    log_jast = self.jastrow.log_forward(
+                        pos, geometry=geometry)
+                log_psi = log_psi + log_jast
+
+            out['sign'] = sign_psi
+            out['log_psi'] = log_psi
+            out['psi'] = sign_psi * torch.exp(log_psi)
+
+        if need_grad or need_jacobi:
+
+            # contribution of each determinant to psi
+            # -> (Nbatch, Nconf)
+            weight = self.fc.weight * sign * sign_psi * \
+                torch.exp(logdet - log_det)
+
+        if 'drift' in want:
+
+            # jacobi formula for each dimension
+            # -> (Nbatch, Nelec, Ndim)
+            dmo = mos[1]
+            drift = []
+            for idim in range(self.ndim):
+                gdet = self.pool.trace(state, dmo[..., idim],
+                                       per_electron=True)
+                drift.append((weight.unsqueeze(-1) * gdet).sum(1))
+            drift = torch.stack(drift, dim=-1)
+            if self.use_jastrow:
+                drift = drift + djast
+            out['drift'] = drift.reshape(nbatch, -1)
+
+        if need_jacobi:
+
+            # trace trick with the jastrow terms in the second derivative
+            d2mo = mos[-1]
+            if self.use_jastrow:
+                d2jast = jast[2]
+                d2mo = d2mo + 2 * (djast.unsqueeze(2) * mos[1]).sum(-1) \
+                    + d2jast.unsqueeze(-1) * mo
+
+            kin = -0.5 * self.pool.trace(state, d2mo)
+            out['kinetic_energy'] = (weight * kin).sum(1, keepdim=True)
+
+        elif need_energy:
+            out['kinetic_energy'] = self.kinetic_energy(pos)
+
+        if len(want & {'nuclear_potential', 'local_energy'}) > 0:
+            out['nuclear_potential'] = self.nuclear_potential(
+                pos, geometry=geometry)
+
+        if len(want & {'electronic_potential', 'local_energy'}) > 0:
+            out['electronic_potential'] = self.electronic_potential(
+                pos, geometry=geometry)
+
+        if len(want & {'nuclear_repulsion', 'local_energy'}) > 0:
+            out['nuclear_repulsion'] = self.nuclear_repulsion()
+
+        if 'local_energy' in want:
+            out['local_energy'] = out['kinetic_energy'] \
+                + out['nuclear_potential'] \
+                + out['electronic_potential'] \
+                + out['nuclear_repulsion']
+
+        return out
+
+    def _log_ci_sum(self, sign, logdet):
+        """Sum the determinants of the CI expansion in log space
+
+        Arguments:
+            sign {torch.tensor} -- sign of the determinants [nbatch, nconfs]
+            logdet {torch.tensor} -- log of the determinants [nbatch, nconfs]
+
+        Returns:
+            torch.tensor, torch.tensor -- sign and log of the sum [nbatch, 1]
+        """
+        lmax = logdet.max(1, keepdim=True)[0].detach()
+        lmax = torch.where(torch.isinf(lmax), torch.zeros_like(lmax), lmax)
+        val = self.fc(sign * torch.exp(logdet - lmax))
+        return torch.sign(val), lmax + torch.log(torch.abs(val))
+
+    def ao2mo(self, ao):
+        """Compute the values of the active MOs from the AO values
+
+        The mo_scf and mo layers are fused in a single weight restricted
+        to the active orbitals.
+
+        Arguments:
+            ao {torch.tensor} -- AO values [..., nao]
+
+        Returns:
+            torch.tensor -- values of the active MOs [..., nactive]
+        """
+        return nn.functional.linear(ao, self._active_mo_weight())
+
+    def _active_mo_weight(self):
+        """Fused weight of the mo_scf and mo layers for the active orbitals
+
+        Returns:
+            torch.tensor -- effective MO coefficients [nactive, nao]
+        """
+        return self.mo.weight[self.active_orbitals] @ self.mo_scf.weight
+
+    def _ao2mo(self, *aos):
+        """Transform several AO tensors to MO with a single product
+
+        Arguments:
+            aos {torch.tensor} -- AO values [nbatch, nelec, nao] or
+                                  gradients [nbatch, nelec, nao, ndim]
+
+        Returns:
+            tuple -- MO tensors with the same shapes as the inputs
+        """
+        # -> (Nbatch, Nelec, K, Nao)
+        stack = [a.unsqueeze(2) if a.dim() == 3 else a.transpose(2, 3)
+                 for a in aos]
+        sizes = [a.shape[2] for a in stack]
+        mo = self.ao2mo(torch.cat(stack, dim=2))
+
+        out = []
+        for a, m in zip(aos, torch.split(mo, sizes, dim=2)):
+            out.append(m.squeeze(2) if a.dim() == 3 else m.transpose(2, 3))
+        return tuple(out)
+
+    def _get_mo_vals(self, x, derivative=0, geometry=None):
+        """Get the values of MOs
 
         Arguments:
             x {torch.tensor} -- positions of the electrons [nbatch, nelec*ndim]
 
+        Keyword Arguments:
+            derivative {int} -- order of the derivative (default: {0})
+            geometry {BatchGeometry} -- geometry of the batch (default: {None})
+
         Returns:
-            torch.tensor -- value of the kinetic energy [nbatch]
+            torch.tensor -- MO matrix [nbatch, nelec, nactive]
         """
+        return self.ao2mo(
+            self.ao(x, derivative=derivative, geometry=geometry))
+
+    def local_energy_jacobi(self, pos):
+        """Computes the local energy using the jacobi formula (trace trick)
+        for the kinetic energy
 
-        mo = self._get_mo_vals(x)
-        d2mo = self._get_mo_vals(x, derivative=2)
-        djast_dmo, d2jast_mo = None, None
+        Arguments:
+            pos {torch.tensor} -- positions of the electrons [nbatch, nelec*ndim]
 
-        if self.use_jastrow:
+        Returns:
+            torch.tensor -- value of the local energy [nbatch]
+        """
+        return self._evaluate(pos, ['local_energy'],
+                              kinetic='jacobi')['local_energy']
 
-            jast = self.jastrow(x)
-            djast = self.jastrow(x, derivative=1, jacobian=False)
-            djast = djast.transpose(1, 2) / jast.unsqueeze(-1)
+    def kinetic_energy_jacobi(self, x, geometry=None, **kwargs):
+        """Compute the value of the kinetic enery using
+        the Jacobi formula for derivative of determinant.
 
-            dao = self.ao(
-                x,
-                derivative=1,
-                jacobian=False).transpose(
-                2,
-                3)
-            dmo = self.mo(self.mo_scf(dao)).transpose(2, 3)
-            djast_dmo = (djast.unsqueeze(2) * dmo).sum(-1)
+        The determinants are factorized once and combined in log space
+        (see _evaluate) so that the ratio remains finite for large systems.
 
-            d2jast = self.jastrow(x, derivative=2) / jast
-            d2jast_mo = d2jast.unsqueeze(-1) * mo
+        Arguments:
+            x {torch.tensor} -- positions of the electrons [nbatch, nelec*ndim]
 
-        kin, psi = self.kinpool(mo, d2mo, djast_dmo, d2jast_mo)
+        Keyword Arguments:
+            geometry {BatchGeometry} -- geometry of the batch (default: {None})
 
-        return self.fc(kin) / self.fc(psi)
+        Returns:
+            torch.tensor -- value of the kinetic energy [nbatch]
+        """
+        return self._evaluate(x, ['kinetic_energy'], geometry=geometry,
+                              kinetic='jacobi')['kinetic_energy']
 
-    def nuclear_potential(self, pos):
+    def nuclear_potential(self, pos, geometry=None):
         """Computes the electron-nuclear term
 
         Arguments:
             pos {torch.tensor} -- positions of the electrons [nbatch, nelec*ndim]
 
+        Keyword Arguments:
+            geometry {BatchGeometry} -- geometry of the batch (default: {None})
+
         Returns:
             torch.tensor -- value of the electron-nuclear term [nbatch]
-
-        TODO : vectorize that !!
         """
+        return self.coulomb.electron_nuclear(
+            pos, self.ao.atom_coords, geometry)
 
-        p = torch.zeros(pos.shape[0], device=self.device)
-        for ielec in range(self.nelec):
-            pelec = pos[:, (ielec * self.ndim):(ielec + 1) * self.ndim]
-            for iatom in range(self.natom):
-                patom = self.ao.atom_coords[iatom, :]
-                Z = self.ao.atomic_number[iatom]
-                r = torch.sqrt(((pelec - patom)**2).sum(1))  # + 1E-12
-                p += -Z / r
-        return p.view(-1, 1)
-
-    def electronic_potential(self, pos):
+    def electronic_potential(self, pos, geometry=None):
         """Computes the electron-electron term
 
         Arguments:
             pos {torch.tensor} -- positions of the electrons [nbatch, nelec*ndim]
 
+        Keyword Arguments:
+            geometry {BatchGeometry} -- geometry of the batch (default: {None})
+
         Returns:
             torch.tensor -- value of the el-el repulsion [nbatch]
-
-        TODO : vectorize that !!
         """
-
-        pot = torch.zeros(pos.shape[0], device=self.device)
-
-        for ielec1 in range(self.nelec - 1):
-            epos1 = pos[:, ielec1 *
-                        self.ndim:(ielec1 + 1) * self.ndim]
-            for ielec2 in range(ielec1 + 1, self.nelec):
-                epos2 = pos[:, ielec2 *
-                            self.ndim:(ielec2 + 1) * self.ndim]
-                r = torch.sqrt(((epos1 - epos2)**2).sum(1))  # + 1E-12
-                pot += (1. / r)
-        return pot.view(-1, 1)
+        return self.coulomb.electron_electron(pos, geometry)
 
     def nuclear_repulsion(self):
         """Computes the nuclear-nuclear repulsion term
 
         Returns:
             torch.tensor -- value of the nuclear repulsion
-
-        TODO : vectorize that !!
         """
+        return self.coulomb.nuclear_nuclear(self.ao.atom_coords)
 
-        vnn = 0.
-        for at1 in range(self.natom - 1):
-            c0 = self.ao.atom_coords[at1, :]
-            Z0 = self.ao.atomic_number[at1]
-            for at2 in range(at1 + 1, self.natom):
-                c1 = self.ao.atom_coords[at2, :]
-                Z1 = self.ao.atomic_number[at2]
-                rnn = torch.sqrt(((c0 - c1)**2).sum())
-                vnn += Z0 * Z1 / rnn
-        return vnn
+    def forces(self, pos, geometry=None):
+        """Hellmann-Feynman forces on the atoms for each configuration
+
+        Arguments:
+            pos {torch.tensor} -- positions of the electrons [nbatch, nelec*ndim]
+
+        Keyword Arguments:
+            geometry {BatchGeometry} -- geometry of the batch (default: {None})
+
+        Returns:
+            torch.tensor -- forces [nbatch, natom, ndim]
+        """
+        return self.coulomb.forces(pos, self.ao.atom_coords, geometry)
 
     def geometry(self, pos):
         """Return the current geometry of the molecule
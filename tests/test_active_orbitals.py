@@ -0,0 +1,42 @@
+import torch
+
+from deepqmc.wavefunction.wf_orbital import Orbital
+from deepqmc.wavefunction.molecule import Molecule
+
+import unittest
+
+
+class TestActiveOrbitals(unittest.TestCase):
+
+    def setUp(self):
+
+        torch.manual_seed(0)
+        torch.set_default_tensor_type(torch.DoubleTensor)
+
+        self.mol = Molecule(atom='Li 0 0 0; H 0 0 3.015',
+                            calculator='pyscf',
+                            basis='sto-3g',
+                            unit='bohr')
+
+        self.wf = Orbital(self.mol, configs='single(2,2)',
+                          use_jastrow=True)
+        self.wf.mo.weight.data += 0.1 * torch.rand(self.wf.mo.weight.shape)
+
+        self.pos = torch.rand(10, self.wf.nelec * 3)
+
+    def test_active_mo(self):
+        """Fused active MOs compared with the full MO layers."""
+
+        active = self.wf.active_orbitals
+        assert len(active) < self.mol.basis.nmo
+
+        ao = self.wf.ao(self.pos)
+        mo = self.wf.mo(self.wf.mo_scf(ao))
+        assert torch.allclose(self.wf.ao2mo(ao), mo[..., active])
+
+        for cfg, cfg_active in zip(self.wf.configs, self.wf.active_configs):
+            assert torch.equal(active[cfg_active], cfg)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -68,6 +68,16 @@ class TestAOvalues(unittest.TestCase):
 
         # assert np.allclose(i2p_aovals[:,0,self.iorb],i2p_aovals_ref)
 
+    def test_ao_fused(self):
+
+        ao, dao, d2ao = self.wf.ao(
+            self.pos, derivative=[0, 1, 2], jacobian=False)
+
+        assert torch.allclose(ao, self.wf.ao(self.pos))
+        assert torch.allclose(
+            dao, self.wf.ao(self.pos, derivative=1, jacobian=False))
+        assert torch.allclose(d2ao, self.wf.ao(self.pos, derivative=2))
+
 
 if __name__ == "__main__":
     # unittest.main()
@@ -0,0 +1,48 @@
+import torch
+
+from deepqmc.sampler.autocorrelation import Autocorrelation
+from deepqmc.sampler.metropolis import Metropolis
+
+import unittest
+
+
+class TestAutocorrelation(unittest.TestCase):
+
+    def setUp(self):
+        torch.manual_seed(0)
+        torch.set_default_tensor_type(torch.DoubleTensor)
+
+    def test_ar1(self):
+        """AR(1) process with tau = (1+phi)/(1-phi)"""
+
+        phi, nwalkers = 0.8, 200
+        ac = Autocorrelation(maxlag=100)
+        ac.reset(nwalkers)
+
+        x = torch.randn(nwalkers)
+        for _ in range(2000):
+            x = phi * x + (1 - phi**2)**0.5 * torch.randn(nwalkers)
+            ac.update(x)
+
+        tau = ac.integrated_time()
+        assert abs(tau - (1 + phi) / (1 - phi)) < 1.
+        assert ac.integrated_time(per_walker=True).shape == (nwalkers,)
+
+    def test_auto_ndecor(self):
+
+        def pdf(pos):
+            return torch.exp(-(pos**2).sum(1))
+
+        sampler = Metropolis(nwalkers=50, nstep=300, step_size=0.2,
+                             nelec=1, ndim=3, init={'min': -1, 'max': 1},
+                             move={'type': 'all-elec', 'proba': 'normal'})
+
+        pos = sampler.generate(pdf, ntherm=200, ndecor='auto',
+                               with_tqdm=False)
+        assert sampler.nblock > 0
+        assert pos.shape == (50 * sampler.nblock, 3)
+        assert 0 < sampler.ess <= pos.shape[0]
+
+
+if __name__ == "__main__":
+    unittest.main()
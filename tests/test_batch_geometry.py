@@ -0,0 +1,64 @@
+import torch
+
+from deepqmc.wavefunction.wf_orbital import Orbital
+from deepqmc.wavefunction.molecule import Molecule
+
+import unittest
+
+
+class TestBatchGeometry(unittest.TestCase):
+
+    def setUp(self):
+
+        torch.manual_seed(0)
+        torch.set_default_tensor_type(torch.DoubleTensor)
+
+        self.mol = Molecule(atom='Li 0 0 0; H 0 0 3.015',
+                            calculator='pyscf',
+                            basis='sto-3g',
+                            unit='bohr')
+
+        self.wf = Orbital(self.mol, configs='cas(2,2)',
+                          use_jastrow=True)
+
+        self.pos = torch.rand(10, self.wf.nelec * 3)
+        self.geometry = self.wf.batch_geometry(self.pos)
+
+    def test_layers(self):
+        """AO and jastrow values with and without the shared geometry."""
+
+        for der in [0, 1, 2]:
+            assert torch.allclose(
+                self.wf.ao(self.pos, derivative=der),
+                self.wf.ao(self.pos, derivative=der,
+                           geometry=self.geometry))
+            assert torch.allclose(
+                self.wf.jastrow(self.pos, derivative=der),
+                self.wf.jastrow(self.pos, derivative=der,
+                                geometry=self.geometry))
+
+    def test_potentials(self):
+        """Potentials compared with the explicit sums over the pairs."""
+
+        pos = self.pos.view(-1, self.wf.nelec, 3)
+
+        ven = torch.zeros(pos.shape[0])
+        for iat in range(self.wf.natom):
+            Z = self.wf.ao.atomic_number[iat]
+            patom = self.wf.ao.atom_coords[iat]
+            ven -= (Z / torch.norm(pos - patom, dim=-1)).sum(1)
+
+        vee = torch.zeros(pos.shape[0])
+        for i in range(self.wf.nelec):
+            for j in range(i + 1, self.wf.nelec):
+                vee += 1. / torch.norm(pos[:, i] - pos[:, j], dim=-1)
+
+        assert torch.allclose(
+            self.wf.nuclear_potential(self.pos, self.geometry).view(-1), ven)
+        assert torch.allclose(
+            self.wf.electronic_potential(self.pos, self.geometry).view(-1),
+            vee)
+
+
+if __name__ == "__main__":
+    unittest.main()
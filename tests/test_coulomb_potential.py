@@ -0,0 +1,55 @@
+import torch
+from torch.autograd import grad
+
+from deepqmc.wavefunction.coulomb_potential import CoulombPotential
+from deepqmc.wavefunction.batch_geometry import BatchGeometry
+
+import unittest
+
+
+class TestCoulombPotential(unittest.TestCase):
+
+    def setUp(self):
+
+        torch.manual_seed(0)
+        torch.set_default_tensor_type(torch.DoubleTensor)
+
+        self.nelec = 4
+        self.atom_coords = torch.tensor([[0., 0., 0.],
+                                         [0., 0., 1.5],
+                                         [1., 0.5, 0.]])
+        self.coulomb = CoulombPotential([3, 1, 2], self.nelec,
+                                        chunk_size=7)
+        self.pos = torch.rand(20, self.nelec * 3)
+        self.geometry = BatchGeometry(self.pos, self.atom_coords,
+                                      self.nelec)
+
+    def test_chunks(self):
+        """Chunked evaluation and evaluation from the geometry."""
+
+        assert torch.allclose(
+            self.coulomb.electron_nuclear(self.pos, self.atom_coords),
+            self.coulomb.electron_nuclear(self.pos, self.atom_coords,
+                                          self.geometry))
+        assert torch.allclose(
+            self.coulomb.electron_electron(self.pos),
+            self.coulomb.electron_electron(self.pos, self.geometry))
+        assert torch.allclose(
+            self.coulomb.forces(self.pos, self.atom_coords),
+            self.coulomb.forces(self.pos, self.atom_coords,
+                                self.geometry))
+
+    def test_forces(self):
+        """Hellmann-Feynman forces compared with autograd."""
+
+        atom_coords = self.atom_coords.clone().requires_grad_(True)
+        pot = self.coulomb.electron_nuclear(self.pos[:1], atom_coords) + \
+            self.coulomb.nuclear_nuclear(atom_coords)
+        ref = -grad(pot.sum(), atom_coords)[0]
+
+        forces = self.coulomb.forces(self.pos[:1], self.atom_coords)
+        assert torch.allclose(forces[0], ref)
+
+
+if __name__ == "__main__":
+    unittest.main()
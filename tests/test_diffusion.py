@@ -0,0 +1,89 @@
+import torch
+
+from deepqmc.wavefunction.wf_orbital import Orbital
+from deepqmc.wavefunction.molecule import Molecule
+from deepqmc.sampler.diffusion import Diffusion
+
+import unittest
+
+
+class TestDiffusion(unittest.TestCase):
+
+    def setUp(self):
+
+        torch.manual_seed(0)
+        torch.set_default_tensor_type(torch.DoubleTensor)
+
+        self.mol = Molecule(atom='H 0 0 -0.69; H 0 0 0.69',
+                            calculator='pyscf',
+                            basis='sto-3g',
+                            unit='bohr')
+
+        self.wf = Orbital(self.mol, configs='ground_state',
+                          use_jastrow=True)
+
+        self.sampler = Diffusion(nwalkers=100, nstep=200, step_size=0.01,
+                                 nelec=self.wf.nelec, ndim=3,
+                                 init=self.mol.domain('atomic'),
+                                 wf=self.wf)
+
+    def test_branch(self):
+        """Walkers of weight 0 die and walkers of weight 2 are duplicated."""
+
+        weight = torch.zeros(self.sampler.capacity)
+        weight[:10] = 2.
+        alive = torch.zeros(self.sampler.capacity, dtype=torch.bool)
+        alive[:20] = True
+        x = torch.arange(self.sampler.capacity).double()
+
+        (x,), alive, weight = self.sampler._branch(weight, alive, [x])
+        assert alive.sum() == 20
+        assert (weight[alive] == 1.).all()
+        assert (x[alive] < 10).all()
+
+    def test_branch_weight(self):
+        """The number of copies is the weight on average."""
+
+        weight = torch.full((self.sampler.capacity,), 1.37)
+        alive = torch.zeros(self.sampler.capacity, dtype=torch.bool)
+        alive[:self.sampler.target_walkers] = True
+
+        nalive = []
+        for _ in range(100):
+            _, new_alive, new_weight = self.sampler._branch(
+                weight, alive, [weight])
+            assert (new_weight == new_alive.double()).all()
+            nalive.append(new_alive.sum().item())
+        nalive = torch.tensor(nalive).double()
+        assert ((nalive >= 100) & (nalive <= 200)).all()
+        assert abs(nalive.mean() - 137) < 3 * nalive.std() / 10
+
+    def test_move_type(self):
+        """Per-electron sweeps are not supported."""
+
+        with self.assertRaises(ValueError):
+            Diffusion(nwalkers=10, nelec=self.wf.nelec, ndim=3,
+                      init=self.mol.domain('atomic'), wf=self.wf,
+                      move={'type': 'all-elec-iter'})
+
+    def test_dmc(self):
+        """The population stays within the capacity around its target."""
+
+        pos = self.sampler.generate(ntherm=100, ndecor=10,
+                                    with_tqdm=False)
+        assert pos.shape[1] == self.wf.nelec * 3
+
+        pop = torch.tensor(self.sampler.population).double()
+        assert (pop <= self.sampler.capacity).all()
+        assert abs(pop[100:].mean() - 100) < 30
+
+        # mixed estimator over the steps after the equilibration
+        assert len(self.sampler.population) == 200
+        assert len(self.sampler.energies) == 100
+        assert abs(self.sampler.energy -
+                   torch.tensor(self.sampler.energies).mean()) < 1E-8
+        assert self.sampler.energy_error > 0
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+import copy
+import torch
+import torch.optim as optim
+
+from deepqmc.wavefunction.wf_orbital import Orbital
+from deepqmc.wavefunction.molecule import Molecule
+from deepqmc.solver.solver_orbital import SolverOrbital
+from deepqmc.sampler.metropolis import Metropolis
+
+import unittest
+
+
+class TestEvaluate(unittest.TestCase):
+
+    def setUp(self):
+
+        torch.manual_seed(0)
+        torch.set_default_tensor_type(torch.DoubleTensor)
+
+        self.mol = Molecule(atom='Li 0 0 0; H 0 0 3.015',
+                            calculator='pyscf',
+                            basis='sto-3g',
+                            unit='bohr')
+
+        self.wf = Orbital(self.mol, configs='cas(2,2)',
+                          use_jastrow=True)
+        self.wf.fc.weight.data = torch.rand(1, self.wf.nci)
+
+        self.pos = torch.rand(10, self.wf.nelec * 3)
+
+    def test_values(self):
+        """Single pass values compared with the individual methods."""
+
+        out = self.wf.evaluate(self.pos, want=self.wf.evaluate_keys)
+
+        assert torch.allclose(out['psi'], self.wf(self.pos))
+        assert torch.allclose(out['local_energy'],
+                              self.wf.local_energy(self.pos))
+
+        wf_auto = Orbital(self.mol, configs='cas(2,2)',
+                          kinetic='auto', use_jastrow=True)
+        wf_auto.load_state_dict(self.wf.state_dict())
+        pos = self.pos.clone().requires_grad_(True)
+        assert torch.allclose(out['kinetic_energy'],
+                              wf_auto.kinetic_energy(pos))
+
+        pos = self.pos.clone().requires_grad_(True)
+        _, log_psi = self.wf.log_forward(pos)
+        drift = torch.autograd.grad(log_psi.sum(), pos)[0]
+        assert torch.allclose(out['log_psi'], log_psi.view(-1, 1))
+        assert torch.allclose(out['drift'], drift)
+
+    def test_cache(self):
+        """The values are reused until the positions or parameters change."""
+
+        with torch.no_grad():
+            psi = self.wf.evaluate(self.pos, want=['psi'])['psi']
+            assert self.wf.evaluate(self.pos, want='psi')['psi'] is psi
+
+            self.wf.mo.weight.add_(0.01)
+            assert self.wf.evaluate(self.pos, want='psi')['psi'] is not psi
+
+    def test_no_graph_in_cache(self):
+        """Values with a graph are not cached and the wf can be copied."""
+
+        pos = self.pos.clone().requires_grad_(True)
+        psi = self.wf.evaluate(pos, want='psi')['psi']
+        assert psi.requires_grad
+        assert self.wf.evaluate(pos, want='psi')['psi'] is not psi
+
+        with torch.no_grad():
+            self.wf.evaluate(self.pos, want='psi')
+        wf = copy.deepcopy(self.wf)
+        assert wf._evaluate_cache is None
+
+    def test_pipeline(self):
+        """Pipelined optimization over several epochs."""
+
+        sampler = Metropolis(nwalkers=20, nstep=20, step_size=0.2,
+                             ndim=self.wf.ndim, nelec=self.wf.nelec,
+                             init=self.mol.domain('atomic'),
+                             move={'type': 'all-elec', 'proba': 'normal'})
+        opt = optim.Adam(self.wf.parameters(), lr=0.01)
+        solver = SolverOrbital(wf=self.wf, sampler=sampler, optimizer=opt)
+        solver.configure(task='wf_opt')
+        solver.initial_sampling(ntherm=-1, ndecor=1)
+        solver.resampling(nstep=5, ntherm=-1)
+        solver.run(3, loss='weighted-energy', pipeline=True)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+import torch
+
+from deepqmc.wavefunction.wf_orbital import Orbital
+from deepqmc.wavefunction.molecule import Molecule
+from deepqmc.wavefunction.slater_pooling import SlaterPooling
+
+import unittest
+
+
+class TestExcitations(unittest.TestCase):
+
+    def setUp(self):
+
+        torch.manual_seed(0)
+        torch.set_default_tensor_type(torch.DoubleTensor)
+
+        self.mol = Molecule(atom='Li 0 0 0; H 0 0 3.015',
+                            calculator='pyscf',
+                            basis='sto-3g',
+                            unit='bohr')
+
+        self.wf = Orbital(self.mol, configs='single_double(2,4)',
+                          use_jastrow=True)
+        self.wf.fc.weight.data = torch.rand(1, self.wf.nci)
+
+        self.pool = SlaterPooling(self.wf.active_configs, self.mol,
+                                  use_excitations=False)
+
+        self.pos = torch.rand(10, self.wf.nelec * 3)
+        self.mo = self.wf._get_mo_vals(self.pos)
+
+    def test_determinants(self):
+        """Excited determinants compared with the full matrices."""
+
+        assert self.wf.pool.use_excitations
+        assert torch.allclose(self.wf.pool(self.mo), self.pool(self.mo))
+
+        sign, logdet = self.wf.pool.log_forward(self.mo)
+        sign_ref, logdet_ref = self.pool.log_forward(self.mo)
+        assert torch.allclose(sign, sign_ref)
+        assert torch.allclose(logdet, logdet_ref)
+
+    def test_traces(self):
+        """Jacobi terms compared with the full matrices."""
+
+        op = torch.rand_like(self.mo)
+        state = self.wf.pool.factorize(self.mo)
+        state_ref = self.pool.factorize(self.mo)
+
+        assert torch.allclose(self.wf.pool.trace(state, op),
+                              self.pool.trace(state_ref, op))
+        assert torch.allclose(
+            self.wf.pool.trace(state, op, per_electron=True),
+            self.pool.trace(state_ref, op, per_electron=True))
+
+    def test_kinetic(self):
+        """Kinetic energy compared with automatic differentiation."""
+
+        wf_auto = Orbital(self.mol, configs='single_double(2,4)',
+                          kinetic='auto', use_jastrow=True)
+        wf_auto.load_state_dict(self.wf.state_dict())
+
+        pos = self.pos.clone().requires_grad_(True)
+        assert torch.allclose(self.wf.kinetic_energy_jacobi(pos),
+                              wf_auto.kinetic_energy(pos))
+
+    def test_unique_configs(self):
+        """Configurations assembled from the unique spin occupations."""
+
+        wf = Orbital(self.mol, configs='cas(2,4)', use_jastrow=False)
+        proj = wf.pool.orb_proj
+        unique_up, unique_down = proj.unique_configs
+
+        assert len(unique_up) ** 2 == wf.nci
+        assert torch.equal(unique_up[proj.index_up], wf.active_configs[0])
+        assert torch.equal(unique_down[proj.index_down],
+                           wf.active_configs[1])
+
+        aup, adown = wf.pool(self.mo, return_matrix=True)
+        det_ref = (torch.det(aup) * torch.det(adown)).transpose(0, 1)
+        pool = SlaterPooling(wf.active_configs, self.mol,
+                             use_excitations=False)
+        assert torch.allclose(pool(self.mo), det_ref)
+        assert torch.allclose(wf.pool(self.mo), det_ref)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+import copy
+import torch
+import torch.optim as optim
+from deepqmc.wavefunction.wf_orbital import Orbital
+from deepqmc.wavefunction.molecule import Molecule
+from deepqmc.wavefunction.fast_update import FastUpdate
+from deepqmc.sampler.metropolis import Metropolis
+from deepqmc.solver.solver_orbital import SolverOrbital
+
+import unittest
+
+
+class TestFastUpdate(unittest.TestCase):
+
+    def setUp(self):
+
+        torch.manual_seed(0)
+        torch.set_default_tensor_type(torch.DoubleTensor)
+
+        self.mol = Molecule(atom='Li 0 0 0; H 0 0 3.015',
+                            calculator='pyscf',
+                            basis='sto-3g',
+                            unit='bohr')
+
+        self.wf = Orbital(self.mol, configs='single(2,2)',
+                          use_jastrow=True)
+        self.wf.fc.weight.data = torch.rand(1, self.wf.nci)
+
+        self.nbatch = 10
+        self.pos = torch.rand(self.nbatch, self.wf.nelec * 3)
+
+    def test_ratio(self):
+        """Compare the incremental pdf with the full evaluation."""
+
+        fu = FastUpdate(self.wf)
+        fu.initialize(self.pos)
+
+        for _ in range(5):
+
+            index = torch.LongTensor(self.nbatch).random_(
+                0, self.wf.nelec)
+            new_pos = fu.pos.clone()
+            new_pos[range(self.nbatch), index, :] += 0.1 * \
+                torch.randn(self.nbatch, 3)
+            new_pos = new_pos.view(self.nbatch, -1)
+
+            log_pdf = fu.propose(new_pos, index)
+            log_pdf_ref = self.wf.log_pdf(new_pos).detach()
+            assert torch.allclose(log_pdf, log_pdf_ref)
+            assert torch.allclose(torch.exp(log_pdf),
+                                  self.wf.pdf(new_pos).detach())
+
+            mask = torch.rand(self.nbatch) > 0.5
+            fu.accept(mask)
+
+        aup, adown = self.wf.pool(
+            self.wf._get_mo_vals(fu.pos.view(self.nbatch, -1)),
+            return_matrix=True)
+        assert torch.allclose(fu.inv_up, torch.inverse(aup).detach())
+        assert torch.allclose(fu.inv_down, torch.inverse(adown).detach())
+
+    def test_sampling(self):
+        """Sample with the fast update."""
+
+        sampler = Metropolis(nwalkers=10, nstep=20, step_size=0.5,
+                             nelec=self.wf.nelec, ndim=self.wf.ndim,
+                             init=self.mol.domain('normal'),
+                             move={'type': 'all-elec-iter',
+                                   'proba': 'normal',
+                                   'update': 'fast'},
+                             wf=self.wf)
+
+        pos = sampler.generate(self.wf.pdf, ntherm=-1, ndecor=10,
+                               with_tqdm=False)
+        assert pos.shape == (10, self.wf.nelec * 3)
+
+    def test_snapshot(self):
+        """Pipelined sampling uses a fast update of the snapshot."""
+
+        sampler = Metropolis(nwalkers=10, nstep=20, step_size=0.5,
+                             nelec=self.wf.nelec, ndim=self.wf.ndim,
+                             init=self.mol.domain('normal'),
+                             move={'type': 'one-elec',
+                                   'proba': 'normal',
+                                   'update': 'fast'},
+                             wf=self.wf)
+        solver = SolverOrbital(wf=self.wf, sampler=sampler,
+                               optimizer=optim.SGD(self.wf.parameters(),
+                                                   lr=0.01))
+        fast_update = sampler.fast_update
+
+        snapshot = copy.deepcopy(self.wf)
+        pos, psi = solver._sample_snapshot(snapshot, None)
+        assert sampler.fast_update is fast_update
+        assert fast_update.pos is None
+        assert torch.allclose(psi.view(-1), snapshot(pos).detach().view(-1))
+
+
+if __name__ == "__main__":
+    unittest.main()
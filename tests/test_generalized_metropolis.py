@@ -0,0 +1,45 @@
+import torch
+
+from deepqmc.sampler.generalized_metropolis import GeneralizedMetropolis
+
+import unittest
+
+
+def pdf(pos):
+    return torch.exp(-(pos**2).sum(1))
+
+
+class TestGeneralizedMetropolis(unittest.TestCase):
+
+    def setUp(self):
+        torch.manual_seed(0)
+        torch.set_default_tensor_type(torch.DoubleTensor)
+
+    def sample(self, move_type):
+        sampler = GeneralizedMetropolis(nwalkers=200, nstep=200,
+                                        step_size=0.3, nelec=2, ndim=3,
+                                        init={'min': -1, 'max': 1},
+                                        move={'type': move_type})
+        return sampler.generate(pdf, ntherm=100, ndecor=5,
+                                with_tqdm=False)
+
+    def test_moves(self):
+        """The variance of exp(-x^2) is 0.5 per coordinate."""
+        for move_type in ['one-elec', 'all-elec', 'all-elec-iter']:
+            pos = self.sample(move_type)
+            assert pos.shape == (200 * 20, 6)
+            assert abs((pos**2).mean() - 0.5) < 0.05
+
+    def test_buffer(self):
+        """Single electron moves only buffer the noise of one electron."""
+        for move_type, nelec in [('one-elec', 1), ('all-elec', 2)]:
+            sampler = GeneralizedMetropolis(nwalkers=10, nelec=2, ndim=3,
+                                            move={'type': move_type},
+                                            nbuffer=100)
+            sampler.buffer_size = 10 * nelec * 3 * 20
+            assert sampler._gaussian().shape == (10, nelec, 3)
+            assert sampler._buffer.shape == (20, 10, nelec, 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
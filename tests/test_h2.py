@@ -119,6 +119,25 @@ class TestH2(unittest.TestCase):
         assert(e > 2 * self.ground_state_energy and e < 0.)
         assert(v > 0 and v < 2.)
 
+    def test_reweighting_ess(self):
+
+        pos = torch.rand(100, self.wf.nelec * 3)
+        self.solver.psi0 = self.solver._get_psi(self.wf, pos)
+        assert abs(self.solver.reweighting_ess(pos) - 1.) < 1E-6
+
+        self.wf.mo.weight.data += 0.1 * torch.rand(self.wf.mo.weight.shape)
+        assert self.solver.reweighting_ess(pos) < 1.
+
+    def test_wf_opt_pipeline(self):
+
+        self.solver.configure(task='wf_opt')
+        self.solver.resampling(nstep=20, ntherm=-1)
+        self.solver.run(5, loss='weighted-energy', pipeline=True)
+
+        _, e, v = self.solver.single_point()
+        assert(e > 2 * self.ground_state_energy and e < 0.)
+        assert(v > 0 and v < 5.)
+
 
 if __name__ == "__main__":
     # unittest.main()
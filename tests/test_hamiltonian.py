@@ -0,0 +1,55 @@
+import torch
+
+from deepqmc.sampler.hamiltonian import Hamiltonian
+
+import unittest
+
+
+class TestHamiltonian(unittest.TestCase):
+
+    def setUp(self):
+        torch.manual_seed(0)
+        torch.set_default_tensor_type(torch.DoubleTensor)
+        self.sigma = torch.tensor([0.5, 1., 2.])
+
+    def pdf(self, pos):
+        return torch.exp(-0.5 * ((pos / self.sigma)**2).sum(1))
+
+    def test_adaptation(self):
+        """Step size, mass matrix and trajectory lengths."""
+
+        sampler = Hamiltonian(nwalkers=100, nstep=300, nelec=1, ndim=3,
+                              step_size=0.1, init={'min': -1, 'max': 1},
+                              L='auto', adapt=True, mass_matrix='diag')
+        pos = sampler.generate(self.pdf, ntherm=200, ndecor=5,
+                               with_tqdm=False)
+
+        # the mass matrix follows the variance of the target
+        ratio = sampler.inv_mass.view(-1) / self.sigma**2
+        assert ((ratio > 0.5) & (ratio < 2.)).all()
+        assert sampler.traj_lengths is not None
+
+        # variance of the samples
+        var = pos.var(0) / self.sigma**2
+        assert ((var > 0.8) & (var < 1.2)).all()
+
+    def test_default(self):
+        """Without adaptation the step size and the metric are kept."""
+
+        sampler = Hamiltonian(nwalkers=10, nstep=20, nelec=1, ndim=3,
+                              step_size=0.2, init={'min': -1, 'max': 1})
+        sampler.generate(self.pdf, ntherm=10, with_tqdm=False)
+        assert sampler.step_size == 0.2
+        assert (sampler.inv_mass == 1.).all()
+
+    def test_ntherm(self):
+        """The thermalization must be shorter than the trajectory."""
+
+        sampler = Hamiltonian(nwalkers=10, nstep=20, nelec=1, ndim=3,
+                              init={'min': -1, 'max': 1})
+        with self.assertRaises(ValueError):
+            sampler.generate(self.pdf, ntherm=20, with_tqdm=False)
+
+
+if __name__ == "__main__":
+    unittest.main()
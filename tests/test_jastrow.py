@@ -72,6 +72,41 @@ class TestJastrow(unittest.TestCase):
             self.nbatch, self.nelec, 3).sum(2))
         assert(torch.allclose(d2val.sum(), d2val_grad.sum()))
 
+    def test_log_derivatives(self):
+
+        log_jast, dlog_jast, d2jast = self.jastrow.log_derivatives(self.pos)
+        jast = self.jastrow(self.pos)
+        djast = self.jastrow(self.pos, derivative=1, jacobian=False)
+        dlog_grad = grad(log_jast, self.pos,
+                         grad_outputs=torch.ones_like(log_jast))[0]
+
+        assert torch.allclose(torch.exp(log_jast), jast)
+        assert torch.allclose(dlog_jast * jast.unsqueeze(-1), djast)
+        assert torch.allclose(dlog_jast.transpose(1, 2).reshape(
+            self.nbatch, -1), dlog_grad)
+        assert torch.allclose(d2jast * jast,
+                              self.jastrow(self.pos, derivative=2))
+
+    def test_large_float32(self):
+
+        jastrow = TwoBodyJastrowFactor(50, 50)
+        pos = 10 * torch.rand(2, 300, dtype=torch.float32)
+        jastrow.float()
+        jastrow.static_weight = jastrow.static_weight.float()
+
+        log_jast, dlog_jast, d2jast = jastrow.log_derivatives(pos)
+        assert torch.isfinite(log_jast).all()
+        assert torch.isfinite(dlog_jast).all()
+        assert torch.isfinite(d2jast).all()
+
+    def test_state_dict(self):
+        """Only the weight is saved, older checkpoints still load."""
+
+        assert list(self.jastrow.state_dict().keys()) == ['weight']
+        jastrow = TwoBodyJastrowFactor(self.nup, self.ndown)
+        jastrow.load_state_dict({'weight': torch.tensor([2.])})
+        assert torch.allclose(jastrow.weight, torch.tensor([2.]))
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,56 @@
+import torch
+from deepqmc.wavefunction.wf_orbital import Orbital
+from deepqmc.wavefunction.molecule import Molecule
+from deepqmc.wavefunction.wf_base import WaveFunction
+
+import unittest
+
+
+class TestLogPdf(unittest.TestCase):
+
+    def setUp(self):
+
+        torch.manual_seed(0)
+        torch.set_default_tensor_type(torch.DoubleTensor)
+
+        self.mol = Molecule(atom='H 0 0 -0.69; H 0 0 0.69',
+                            calculator='pyscf',
+                            basis='sto-3g',
+                            unit='bohr')
+
+        self.wf = Orbital(self.mol, configs='cas(2,2)',
+                          use_jastrow=True)
+        self.wf.fc.weight.data = torch.rand(1, self.wf.nci) - 0.5
+
+        self.pos = torch.rand(10, self.wf.nelec * 3)
+
+    def test_log_forward(self):
+        """Compare sign/log|psi| with the direct evaluation."""
+
+        psi = self.wf(self.pos)
+        sign, log_psi = self.wf.log_forward(self.pos)
+
+        assert torch.allclose(sign * torch.exp(log_psi), psi)
+        assert torch.allclose(self.wf.log_pdf(self.pos),
+                              torch.log(self.wf.pdf(self.pos)))
+
+    def test_log_psi_and_grad(self):
+        """Compare the analytic gradient of log|psi| with autograd."""
+
+        log_psi, grad_log_psi = self.wf.log_psi_and_grad(self.pos)
+        log_psi_ref, grad_ref = WaveFunction.log_psi_and_grad(
+            self.wf, self.pos)
+
+        assert torch.allclose(log_psi, log_psi_ref)
+        assert torch.allclose(grad_log_psi, grad_ref)
+
+    def test_log_jastrow(self):
+        """Compare the log jastrow with the product of exponentials."""
+
+        jast = self.wf.jastrow(self.pos)
+        log_jast = self.wf.jastrow.log_forward(self.pos)
+        assert torch.allclose(torch.exp(log_jast), jast)
+
+
+if __name__ == "__main__":
+    unittest.main()
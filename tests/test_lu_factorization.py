@@ -0,0 +1,38 @@
+import torch
+
+from deepqmc.wavefunction.lu_factorization import LUFactorization
+
+import unittest
+
+
+class TestLUFactorization(unittest.TestCase):
+
+    def setUp(self):
+
+        torch.manual_seed(0)
+        torch.set_default_tensor_type(torch.DoubleTensor)
+
+        self.mat = torch.rand(3, 10, 4, 4)
+        self.lu = LUFactorization(self.mat)
+
+    def test_slogdet(self):
+
+        sign, logdet = self.lu.slogdet()
+        sign_ref, logdet_ref = torch.slogdet(self.mat)
+        assert torch.allclose(sign, sign_ref)
+        assert torch.allclose(logdet, logdet_ref)
+
+    def test_inverse_trace(self):
+
+        rhs = torch.rand(3, 10, 4, 4)
+        assert torch.allclose(self.lu.inverse, torch.inverse(self.mat))
+        assert torch.allclose(self.lu.solve(rhs),
+                              torch.inverse(self.mat) @ rhs)
+
+        trace = torch.diagonal(torch.inverse(self.mat) @ rhs,
+                               dim1=-2, dim2=-1).sum(-1)
+        assert torch.allclose(self.lu.trace(rhs), trace)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+import torch
+
+from deepqmc.wavefunction.wf_orbital import Orbital
+from deepqmc.wavefunction.molecule import Molecule
+from deepqmc.sampler.metropolis import Metropolis
+from deepqmc.sampler.parallel import ParallelSampler
+
+import unittest
+
+
+class TestParallelSampler(unittest.TestCase):
+
+    def setUp(self):
+
+        torch.manual_seed(0)
+        torch.set_default_tensor_type(torch.DoubleTensor)
+
+        self.mol = Molecule(atom='H 0 0 -0.69; H 0 0 0.69',
+                            calculator='pyscf',
+                            basis='sto-3g',
+                            unit='bohr')
+
+        self.wf = Orbital(self.mol, configs='ground_state',
+                          use_jastrow=True)
+
+        sampler = Metropolis(nwalkers=20, nstep=20, step_size=0.5,
+                             nelec=self.wf.nelec, ndim=3,
+                             init=self.mol.domain('normal'),
+                             move={'type': 'all-elec', 'proba': 'normal'},
+                             wf=self.wf)
+        self.sampler = ParallelSampler(sampler, nprocs=2)
+
+    def tearDown(self):
+        self.sampler.close()
+
+    def test_generate(self):
+        """Samples of all the shards and parameters of the main process."""
+
+        pos = self.sampler.generate(self.wf.pdf, ntherm=10, ndecor=5,
+                                    with_tqdm=False)
+        assert pos.shape == (2 * 20, self.wf.nelec * 3)
+
+        # the log pdf of the walkers is computed with the
+        # parameters of the wave function of the main process
+        self.wf.fc.weight.data *= 2.
+        self.sampler.generate(self.wf.pdf, ntherm=-1, ndecor=5,
+                              with_tqdm=False)
+        assert torch.allclose(self.sampler.walkers.log_pdf,
+                              self.wf.log_pdf(self.sampler.walkers.pos))
+
+    def test_gather_samples(self):
+        """The samples are ordered as in a serial run."""
+
+        shards = self.sampler._get_shards(5)
+        samples = [torch.arange(2 * (s.stop - s.start)).view(-1, 1)
+                   + 10 * s.start for s in shards]
+        out = self.sampler._gather_samples(samples, shards)
+        assert out.shape == (10, 1)
+        assert out[:5].view(-1).tolist() == [0, 1, 20, 21, 22]
+
+
+if __name__ == "__main__":
+    unittest.main()
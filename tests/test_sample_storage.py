@@ -0,0 +1,73 @@
+import os
+import tempfile
+import torch
+
+from deepqmc.sampler.sample_storage import (SampleStorage, NumpyStorage,
+                                            load_samples)
+from deepqmc.sampler.metropolis import Metropolis
+
+import unittest
+
+
+class TestSampleStorage(unittest.TestCase):
+
+    def setUp(self):
+        torch.manual_seed(0)
+        self.data = [torch.rand(5, 6) for _ in range(7)]
+
+    def test_memory(self):
+
+        storage = SampleStorage()
+        storage.allocate(7, 5, 6)
+        for d in self.data:
+            storage.append(d)
+        assert torch.allclose(storage.get(), torch.cat(self.data))
+
+    def test_numpy(self):
+
+        fname = os.path.join(tempfile.mkdtemp(), 'samples.npy')
+        storage = NumpyStorage(fname, chunk=3)
+        storage.allocate(7, 5, 6)
+        for d in self.data:
+            storage.append(d)
+        assert torch.allclose(storage.get(), torch.cat(self.data))
+        assert torch.allclose(load_samples(fname), torch.cat(self.data))
+
+    def test_numpy_reallocate(self):
+
+        fname = os.path.join(tempfile.mkdtemp(), 'samples.npy')
+        storage = NumpyStorage(fname, chunk=3)
+
+        storage.allocate(7, 5, 6)
+        for d in self.data:
+            storage.append(d)
+        first = storage.get()
+
+        storage.allocate(7, 5, 6)
+        for d in self.data:
+            storage.append(2 * d)
+        second = storage.get()
+
+        assert storage.path != fname
+        assert torch.allclose(first, torch.cat(self.data))
+        assert torch.allclose(second, 2 * torch.cat(self.data))
+        assert torch.allclose(load_samples(storage.path), second)
+
+    def test_sampler(self):
+
+        def pdf(pos):
+            return torch.exp(-(pos**2).sum(1))
+
+        sampler = Metropolis(nwalkers=10, nstep=100, step_size=0.5,
+                             nelec=2, ndim=3, init={'min': -1, 'max': 1},
+                             move={'type': 'all-elec', 'proba': 'normal'})
+
+        sampler.storage = NumpyStorage(
+            os.path.join(tempfile.mkdtemp(), 'traj.npy'))
+        pos = sampler.generate(pdf, ntherm=20, ndecor=10,
+                               with_tqdm=False)
+        assert pos.shape == (80, 6)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,45 @@
+import os
+import tempfile
+import torch
+
+from deepqmc.sampler.metropolis import Metropolis
+
+import unittest
+
+
+def pdf(pos):
+    return torch.exp(-(pos**2).sum(1))
+
+
+class TestSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        torch.manual_seed(0)
+
+    def get_sampler(self):
+        return Metropolis(nwalkers=10, nstep=20, step_size=0.5,
+                          nelec=2, ndim=3, init={'min': -1, 'max': 1},
+                          move={'type': 'all-elec', 'proba': 'normal'})
+
+    def test_resume(self):
+
+        sampler = self.get_sampler()
+        sampler.generate(pdf, ntherm=-1, ndecor=1, with_tqdm=False)
+
+        fname = os.path.join(tempfile.mkdtemp(), 'snapshot.pth')
+        sampler.save_snapshot(fname)
+        ref = sampler.generate(pdf, ntherm=0, ndecor=1,
+                               pos=sampler.walkers.pos,
+                               with_tqdm=False)
+
+        # a new sampler resumes from the snapshot
+        # and reproduces the same trajectory
+        new_sampler = self.get_sampler()
+        new_sampler.load_snapshot(fname)
+        pos = new_sampler.generate(pdf, ntherm=0, ndecor=1,
+                                   with_tqdm=False)
+        assert torch.allclose(pos, ref)
+
+
+if __name__ == "__main__":
+    unittest.main()
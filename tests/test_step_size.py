@@ -0,0 +1,57 @@
+import torch
+
+from deepqmc.sampler.metropolis import Metropolis
+from deepqmc.sampler.hamiltonian import Hamiltonian
+
+import unittest
+
+
+def pdf(pos):
+    return torch.exp(-(pos**2).sum(1))
+
+
+class TestStepSize(unittest.TestCase):
+
+    def setUp(self):
+        torch.manual_seed(0)
+
+    def test_global(self):
+
+        sampler = Metropolis(nwalkers=100, nstep=500, step_size=10.,
+                             nelec=2, ndim=3, init={'min': -1, 'max': 1},
+                             move={'type': 'all-elec', 'proba': 'uniform'})
+        sampler.set_adaptive_step(target=0.5, mode='global')
+        sampler.generate(pdf, ntherm=400, ndecor=10, with_tqdm=False)
+        assert sampler.step_size < 10.
+
+    def test_electron(self):
+
+        sampler = Metropolis(nwalkers=100, nstep=200, step_size=0.01,
+                             nelec=2, ndim=3, init={'min': -1, 'max': 1},
+                             move={'type': 'one-elec', 'proba': 'normal'})
+        sampler.set_adaptive_step(target=0.5, mode='electron')
+        sampler.generate(pdf, ntherm=-1, ndecor=10, with_tqdm=False)
+        assert sampler.step_size.shape == (2,)
+        assert (sampler.step_size > 0.01).all()
+
+    def test_electron_all_elec(self):
+
+        sampler = Metropolis(nwalkers=10, nstep=20, step_size=0.1,
+                             nelec=2, ndim=3, init={'min': -1, 'max': 1},
+                             move={'type': 'all-elec', 'proba': 'normal'})
+        with self.assertRaises(ValueError):
+            sampler.set_adaptive_step(mode='electron')
+
+    def test_walker(self):
+
+        sampler = Hamiltonian(nwalkers=20, nstep=50, step_size=0.1,
+                              nelec=2, ndim=3, init={'min': -1, 'max': 1},
+                              L=5)
+        sampler.set_adaptive_step(target=0.6, mode='walker')
+        pos = sampler.generate(pdf, ntherm=-1, ndecor=10, with_tqdm=False)
+        assert sampler.step_size.shape == (20, 1)
+        assert pos.shape == (20, 6)
+
+
+if __name__ == "__main__":
+    unittest.main()
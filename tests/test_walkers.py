@@ -0,0 +1,30 @@
+import torch
+
+from deepqmc.sampler.walkers import Walkers
+
+import unittest
+
+
+class TestWalkers(unittest.TestCase):
+
+    def test_atomic(self):
+
+        torch.manual_seed(0)
+        init = {'atom_coords': [[0., 0., 0.], [0., 0., 3.]],
+                'atom_num': [10, 10],
+                'atom_nelec': [3, 1]}
+
+        walkers = Walkers(nwalkers=1000, nelec=4, ndim=3, init=init)
+        walkers.initialize()
+
+        pos = walkers.pos.view(1000, 4, 3)
+        assert pos.dtype == torch.get_default_dtype()
+
+        # one electron per walker on the second atom
+        dist = (pos - torch.tensor([0., 0., 3.])).norm(dim=-1)
+        close = (dist < 1.5).sum(1).float()
+        assert torch.allclose(close, torch.ones(1000))
+
+
+if __name__ == "__main__":
+    unittest.main()